@@ -0,0 +1,208 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from generate_trades import generate_trade_history
+from instrumentation import current_rss, max_rss
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+BENCHMARK_DIR = PROJECT_ROOT / 'output' / 'benchmarks'
+
+STAGES = ['load_data', 'calculate_position_type', 'analyze_all_portfolios',
+          'get_top_portfolios', 'generate_summary_report', 'save_results']
+# Stages that read the memoized portfolio results; they are timed cold
+RESULTS_STAGES = {'get_top_portfolios', 'generate_summary_report', 'save_results'}
+
+
+class RssSampler:
+    """
+    Samples RSS on a background thread to get the peak within one stage
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_pipeline(data_file: Path, workers: int = 1, use_cache: bool = False) -> List[Dict]:
+    """
+    Run the main.py pipeline stage by stage, timing each one. The results memo
+    is dropped (untimed) before every stage in RESULTS_STAGES, so each row is
+    the stage's full cost rather than a cache hit; their sum therefore exceeds
+    one main.py run, which analyzes the portfolios once.
+    """
+    from trading_analyzer import TradingAnalyzer
+
+    # data_file's grandparent receives reports/ from generate_summary_report
+    analyzer = TradingAnalyzer(data_file)
+    output_path = BENCHMARK_DIR / 'top_portfolios.csv'
+    stages = {
+        'load_data': lambda: analyzer.load_data(data_file, workers=workers, use_cache=use_cache),
+        'calculate_position_type': analyzer.calculate_position_type,
+        'analyze_all_portfolios': analyzer.analyze_all_portfolios,
+        'get_top_portfolios': analyzer.get_top_portfolios,
+        'generate_summary_report': analyzer.generate_summary_report,
+        'save_results': lambda: analyzer.save_results(output_path),
+    }
+
+    timings = []
+    for name in STAGES:
+        if name in RESULTS_STAGES:
+            analyzer.invalidate_results()
+        start_cpu = time.process_time()
+        start = time.perf_counter()
+        with RssSampler() as sampler:
+            result = stages[name]()
+        timings.append({
+            'stage': name,
+            'wall_seconds': round(time.perf_counter() - start, 4),
+            'cpu_seconds': round(time.process_time() - start_cpu, 4),
+            'peak_rss_mb': round(sampler.peak / 1e6, 1),
+            'trade_rows': len(analyzer.trade_data),
+            'rows_out': len(result) if isinstance(result, pd.DataFrame) else None,
+        })
+    return timings
+
+
+def summarize(runs: List[List[Dict]]) -> List[Dict]:
+    """
+    Best (minimum) wall and CPU time per stage over repeated runs
+    """
+    summary = []
+    for i, name in enumerate(STAGES):
+        stage_runs = [run[i] for run in runs]
+        summary.append({
+            'stage': name,
+            'wall_seconds': min(r['wall_seconds'] for r in stage_runs),
+            'cpu_seconds': min(r['cpu_seconds'] for r in stage_runs),
+            'peak_rss_mb': max(r['peak_rss_mb'] for r in stage_runs),
+            'trade_rows': stage_runs[-1]['trade_rows'],
+            'rows_out': stage_runs[-1]['rows_out'],
+        })
+    return summary
+
+
+def compare(current: Dict, baseline_path: Path) -> None:
+    """
+    Print per-stage wall time ratios against an earlier results file
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {s['stage']: s for s in baseline['stages']}
+    # Older results timed these stages on memoized results
+    warm = RESULTS_STAGES - set(baseline.get('cold_stages', []))
+    print(f"\nCompared with {baseline_path.name} ({baseline.get('git_revision')}):")
+    for stage in current['stages']:
+        old = before.get(stage['stage'])
+        if old is None or old['wall_seconds'] == 0:
+            continue
+        if stage['stage'] in warm:
+            print(f"  {stage['stage']:<25} skipped: timed on memoized results in the baseline")
+            continue
+        ratio = stage['wall_seconds'] / old['wall_seconds']
+        print(f"  {stage['stage']:<25} {old['wall_seconds']:>9.3f}s -> {stage['wall_seconds']:>9.3f}s  ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trade analysis pipeline stage by stage")
+    parser.add_argument('--data', help="Existing trade_history.csv (default: generate one)")
+    parser.add_argument('--portfolios', type=int, default=1000)
+    parser.add_argument('--trades', type=int, default=1000, help="Mean trades per portfolio")
+    parser.add_argument('--symbols', type=int, default=10)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help="Parser worker processes (0 = all cores)")
+    parser.add_argument('--cache', action='store_true', help="Allow load_data to use the trade cache")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per stage; the best time is kept")
+    parser.add_argument('--output', help="Results JSON path (default: output/benchmarks/<time>-<rev>.json)")
+    parser.add_argument('--compare', help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger(__name__)
+
+    parameters = {key: getattr(args, key) for key in
+                  ('portfolios', 'trades', 'symbols', 'days', 'seed', 'workers', 'cache', 'repeat')}
+    if args.data:
+        data_file = Path(args.data).resolve()
+        parameters['data'] = str(data_file)
+    else:
+        name = f"p{args.portfolios}-t{args.trades}-s{args.symbols}-d{args.days}-seed{args.seed}"
+        data_file = BENCHMARK_DIR / 'data' / name / 'data' / 'trade_history.csv'
+        if not data_file.exists():
+            start = time.perf_counter()
+            generate_trade_history(data_file, args.portfolios, args.trades, args.symbols,
+                                   days=args.days, seed=args.seed, logger=logger)
+            logger.info(f"Generated {data_file} in {time.perf_counter() - start:.1f}s")
+
+    runs = [run_pipeline(data_file, args.workers, args.cache) for _ in range(args.repeat)]
+    results = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'cpu_count': os.cpu_count(),
+        'parameters': parameters,
+        'input_bytes': data_file.stat().st_size,
+        'stages': summarize(runs),
+        'cold_stages': sorted(RESULTS_STAGES),
+        'runs': runs,
+        'total_wall_seconds': round(sum(s['wall_seconds'] for s in summarize(runs)), 4),
+        'peak_rss_mb': round(max_rss() / 1e6, 1),
+    }
+
+    output_path = Path(args.output) if args.output else BENCHMARK_DIR / (
+        f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{results['git_revision'] or 'nogit'}.json")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for stage in results['stages']:
+        print(f"{stage['stage']:<25} {stage['wall_seconds']:>9.3f}s wall {stage['cpu_seconds']:>9.3f}s cpu "
+              f"{stage['peak_rss_mb']:>9.1f} MB peak  {stage['trade_rows']:>10,} trades")
+    print(f"Total {results['total_wall_seconds']:.3f}s, peak RSS {results['peak_rss_mb']:.1f} MB -> {output_path}")
+
+    if args.compare:
+        compare(results, Path(args.compare))
+
+
+if __name__ == "__main__":
+    main()
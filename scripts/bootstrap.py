@@ -0,0 +1,139 @@
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trade_schema import POSITION_CODES, position_codes
+
+_NS_PER_DAY = 86_400 * 1_000_000_000
+
+BOOTSTRAP_COLUMNS = ['Port_ID', 'Sharpe_Ratio_Low', 'Sharpe_Ratio_High', 'Win_Rate_Low', 'Win_Rate_High']
+
+# Portfolios per task sent to a worker process
+_CHUNK_PORTFOLIOS = 256
+
+
+def daily_outcomes(trade_data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per (portfolio, day) realized PnL, winning trades and closed positions.
+
+    Returns (port_ids, offsets, stats) where stats is a (days x 3) array laid out
+    contiguously by portfolio; portfolio i owns rows offsets[i]:offsets[i + 1].
+    Trades without a timestamp have no day and are left out.
+    """
+    codes, port_ids = pd.factorize(trade_data['Port_ID'])
+    ts = trade_data['timestamp'].to_numpy(dtype='datetime64[ns]')
+    keep = (codes >= 0) & ~np.isnat(ts)
+
+    profit = trade_data['realizedProfit'].to_numpy(dtype=np.float64)[keep]
+    position_type = position_codes(trade_data['position_type'])[keep]
+    is_close = (position_type == POSITION_CODES['long_close']) | (position_type == POSITION_CODES['short_close'])
+
+    days = ts[keep].view(np.int64) // _NS_PER_DAY
+    daily = pd.DataFrame({
+        'pnl': profit,
+        'wins': (profit > 0).astype(np.int64),
+        'closes': is_close.astype(np.int64),
+    }).groupby([codes[keep], days], sort=True).sum()
+
+    day_groups = daily.index.get_level_values(0).to_numpy()
+    offsets = np.searchsorted(day_groups, np.arange(len(port_ids) + 1))
+    return np.asarray(port_ids), offsets, daily.to_numpy(dtype=np.float64)
+
+
+def portfolio_seed(seed: int, port_id) -> np.random.SeedSequence:
+    """
+    Seed derived from the run seed and the Port_ID, independent of chunking and workers
+    """
+    return np.random.SeedSequence([seed, zlib.crc32(str(port_id).encode())])
+
+
+def resample_statistics(stats: np.ndarray, n_resamples: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sharpe ratio and win rate (%) of n_resamples bootstrap samples of one
+    portfolio's days, computed from a (resamples x days) index matrix
+    """
+    n = len(stats)
+    index = rng.integers(0, n, size=(n_resamples, n))
+    # Turn the index matrix into per-sample day counts so every statistic is one matmul
+    counts = np.bincount((index + n * np.arange(n_resamples)[:, None]).ravel(),
+                         minlength=n_resamples * n).reshape(n_resamples, n)
+
+    pnl = stats[:, 0]
+    centered = pnl - pnl.mean()
+    totals = counts @ np.column_stack([centered, centered ** 2, stats[:, 1], stats[:, 2]])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if n > 1:
+            mean = totals[:, 0] / n
+            var = np.maximum(totals[:, 1] - totals[:, 0] * mean, 0.0) / (n - 1)
+            std = np.sqrt(var)
+            # Same rules as calculate_metrics: one day or zero std gives 0
+            flat = var <= 1e-12 * totals[:, 1] / (n - 1)
+            sharpe = np.where(flat, 0.0, np.sqrt(252) * (mean + pnl.mean()) / std)
+        else:
+            sharpe = np.zeros(n_resamples)
+        win_rate = np.where(totals[:, 3] == 0, 0.0, totals[:, 2] / totals[:, 3] * 100)
+    return sharpe, win_rate
+
+
+def bootstrap_chunk(port_ids: np.ndarray, offsets: np.ndarray, stats: np.ndarray,
+                    n_resamples: int, confidence: float, seed: int) -> np.ndarray:
+    """
+    Confidence bounds (sharpe low/high, win rate low/high) for a chunk of portfolios
+    """
+    tail = (1 - confidence) / 2 * 100
+    bounds = np.zeros((len(port_ids), 4))
+    for i, port_id in enumerate(port_ids):
+        days = stats[offsets[i]:offsets[i + 1]]
+        if len(days) == 0:
+            continue
+        rng = np.random.default_rng(portfolio_seed(seed, port_id))
+        sharpe, win_rate = resample_statistics(days, n_resamples, rng)
+        bounds[i, :2] = np.percentile(sharpe, [tail, 100 - tail])
+        bounds[i, 2:] = np.percentile(win_rate, [tail, 100 - tail])
+    return bounds
+
+
+def bootstrap_confidence_intervals(trade_data: pd.DataFrame, n_resamples: int = 2000,
+                                   confidence: float = 0.95, seed: int = 0,
+                                   workers: int = 1) -> pd.DataFrame:
+    """
+    Percentile bootstrap intervals for Sharpe ratio and win rate per portfolio,
+    resampling whole trading days. Results only depend on the seed, not on workers.
+    """
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+
+    port_ids, offsets, stats = daily_outcomes(trade_data)
+    tasks: List[Dict] = []
+    for start in range(0, len(port_ids), _CHUNK_PORTFOLIOS):
+        end = min(start + _CHUNK_PORTFOLIOS, len(port_ids))
+        tasks.append({
+            'port_ids': port_ids[start:end],
+            'offsets': offsets[start:end + 1] - offsets[start],
+            'stats': stats[offsets[start]:offsets[end]],
+            'n_resamples': n_resamples,
+            'confidence': confidence,
+            'seed': seed,
+        })
+
+    if workers == 1 or len(tasks) <= 1:
+        chunks = [bootstrap_chunk(**task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(bootstrap_chunk, **task) for task in tasks]
+            chunks = [future.result() for future in futures]
+
+    bounds = np.vstack(chunks) if chunks else np.zeros((0, 4))
+    bounds = np.round(bounds, 2)
+    return pd.DataFrame({
+        'Port_ID': port_ids,
+        'Sharpe_Ratio_Low': bounds[:, 0],
+        'Sharpe_Ratio_High': bounds[:, 1],
+        'Win_Rate_Low': bounds[:, 2],
+        'Win_Rate_High': bounds[:, 3],
+    })[BOOTSTRAP_COLUMNS]
@@ -0,0 +1,588 @@
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
+import csv
+import datetime
+import glob
+import json
+import logging
+import os
+import sys
+from contextlib import contextmanager
+
+# Only the standard library is imported at module level: pandas, matplotlib and
+# fpdf are imported inside the subcommands that need them, so short jobs such as
+# `cli.py rank` served from saved results start without them.
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_FILE = os.path.join(PROJECT_ROOT, 'data', 'trade_history.csv')
+OUTPUT_DIR = os.path.join(PROJECT_ROOT, 'output')
+RESULTS_FILE = os.path.join(OUTPUT_DIR, 'top_portfolios.csv')
+RESULTS_META_FILE = os.path.join(OUTPUT_DIR, 'top_portfolios.meta.json')
+RANKED_FILE = os.path.join(OUTPUT_DIR, 'ranked_portfolios.csv')
+TIMINGS_FILE = os.path.join(OUTPUT_DIR, 'cli_timings.jsonl')
+
+# Directories each subcommand writes to, created once before it runs
+COMMAND_DIRECTORIES = {
+    'ingest': ['logs', 'output/cache'],
+    'analyze': ['logs', 'output', 'reports', 'reports/plots'],
+    'rank': ['logs', 'output'],
+    'lookup': ['logs', 'output/row_index'],
+    'fetch': ['logs', 'output'],
+    'serve': ['logs', 'output/cache'],
+    'plot': ['logs', 'output', 'reports/plots'],
+    'report': ['logs', 'output', 'reports'],
+}
+
+RANK_COLUMNS = ['Port_ID', 'ROI', 'PnL', 'Sharpe_Ratio', 'MDD', 'Win_Rate', 'Total_Positions', 'total_score']
+LOOKUP_COLUMNS = ['Port_ID', 'ROI', 'PnL', 'Sharpe_Ratio', 'MDD', 'Win_Rate', 'Total_Positions', 'Profit_Factor']
+
+
+class StartupTimer:
+    """
+    Splits a CLI run into time spent importing heavy modules and total time
+    """
+
+    def __init__(self):
+        self.import_seconds = 0.0
+        self.modules = []
+
+    @contextmanager
+    def imports(self, *modules):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.import_seconds += time.perf_counter() - start
+            self.modules.extend(modules)
+
+    def record(self, command, status, extra=None):
+        """
+        Append this run's timings to output/cli_timings.jsonl
+        """
+        entry = {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'command': command,
+            'status': status,
+            'modules': self.modules,
+            'import_seconds': round(self.import_seconds, 4),
+            'total_seconds': round(time.perf_counter() - _STARTED, 4),
+        }
+        entry.update(extra or {})
+        try:
+            os.makedirs(os.path.dirname(TIMINGS_FILE), exist_ok=True)
+            with open(TIMINGS_FILE, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            logging.warning(f"Could not record CLI timings: {str(e)}")
+        return entry
+
+
+def setup_project_structure(command):
+    """
+    Create the directories the subcommand writes to
+    """
+    for directory in COMMAND_DIRECTORIES[command]:
+        os.makedirs(os.path.join(PROJECT_ROOT, directory), exist_ok=True)
+
+
+def setup_logging():
+    """
+    Set up logging configuration (after logs/ exists)
+    """
+    log_file = os.path.join(PROJECT_ROOT, 'logs', 'trading_analysis.log')
+    logging.basicConfig(filename=log_file, level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def resolve_input(source):
+    """
+    The trade history file, or the sorted CSV shards of a directory or glob pattern.
+    Returns (paths, sharded).
+    """
+    if os.path.isfile(source):
+        return [source], False
+    pattern = os.path.join(source, '*.csv') if os.path.isdir(source) else source
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path)), True
+
+
+def verify_input(source):
+    paths, sharded = resolve_input(source)
+    if not paths:
+        logging.error(f"Trade history not found at: {source}")
+        print(f"Trade history not found at: {source} (expected a CSV file, a directory of shards or a glob)")
+        sys.exit(1)
+    return paths, sharded
+
+
+def source_fingerprint(paths):
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.append({'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+    return fingerprint
+
+
+def write_results_meta(paths, lower_bound, resamples, max_correlation=None):
+    """
+    Record which input and options produced top_portfolios.csv, so `rank` can reuse it
+    """
+    meta = {
+        'source': source_fingerprint(paths),
+        'results_mtime_ns': os.stat(RESULTS_FILE).st_mtime_ns,
+        'lower_bound': lower_bound,
+        'resamples': resamples if lower_bound else None,
+        'max_correlation': max_correlation,
+    }
+    with open(RESULTS_META_FILE, 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+def saved_ranking(paths, n, lower_bound, resamples, max_correlation=None):
+    """
+    Rows of top_portfolios.csv if it was written from the current input with the
+    same options and holds at least n portfolios, else None
+    """
+    try:
+        with open(RESULTS_META_FILE) as f:
+            meta = json.load(f)
+        if (meta['source'] != source_fingerprint(paths)
+                or meta['results_mtime_ns'] != os.stat(RESULTS_FILE).st_mtime_ns
+                or meta['lower_bound'] != lower_bound
+                or (lower_bound and meta['resamples'] != resamples)
+                or meta.get('max_correlation') != max_correlation):
+            return None
+        with open(RESULTS_FILE, newline='') as f:
+            rows = list(csv.DictReader(f))
+    except (OSError, ValueError, KeyError):
+        return None
+    return rows[:n] if len(rows) >= n else None
+
+
+def print_ranking(rows, columns):
+    """
+    Print ranked rows (dicts of column -> value) as a fixed-width table
+    """
+    def fmt(column, value):
+        if column == 'Port_ID' or value in ('', None):
+            return str(value)
+        try:
+            return f"{float(value):.4g}"
+        except ValueError:
+            return str(value)
+
+    columns = [c for c in columns if rows and c in rows[0]]
+    cells = [[fmt(c, row[c]) for c in columns] for row in rows]
+    widths = [max([len(c)] + [len(r[i]) for r in cells]) for i, c in enumerate(columns)]
+    print('  '.join(c.rjust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print('  '.join(v.rjust(w) for v, w in zip(r, widths)))
+
+
+def load_analyzer(args, timer, use_cache=True, compact=False, compact_fills=False):
+    """
+    Import TradingAnalyzer and load the trade data with position types, or reduce
+    the shards straight to portfolio metrics when the input is a directory or glob.
+    With --out-of-core the trades go to memory-mapped column files instead.
+    """
+    paths, sharded = verify_input(args.data)
+    with timer.imports('trading_analyzer'):
+        from trading_analyzer import TradingAnalyzer
+    analyzer = TradingAnalyzer(PROJECT_ROOT, trace_memory=getattr(args, 'trace_memory', False), setup_dirs=False)
+
+    if sharded:
+        analyzer.analyze_shards(paths, workers=args.workers, use_cache=use_cache)
+        logging.info(f"Analyzed {len(paths)} shards")
+        return analyzer
+
+    if getattr(args, 'out_of_core', False):
+        analyzer.load_data(paths[0], workers=args.workers, use_cache=use_cache, out_of_core=True,
+                           memory_budget=args.memory_budget * 2**20)
+    else:
+        analyzer.load_data(paths[0], workers=args.workers, use_cache=use_cache)
+    logging.info("Data loaded successfully")
+
+    if compact_fills:
+        report = analyzer.compact_fills()
+        print(f"Compacted {report['fills']:,} fills into {report['orders']:,} orders "
+              f"(compression ratio {report['compression_ratio']:.2f}x)")
+
+    if compact:
+        analyzer.compact_trade_data()
+
+    analyzer.calculate_position_type()
+    logging.info("Position types calculated")
+    return analyzer
+
+
+def require_trade_table(args, *options):
+    """
+    Exit if an option that needs the full in-memory trade table is used with
+    sharded input or --out-of-core
+    """
+    used = [option for option in options if getattr(args, option.lstrip('-').replace('-', '_'), None) not in (None, False)]
+    sharded = resolve_input(args.data)[1]
+    if getattr(args, 'out_of_core', False) and sharded:
+        print("--out-of-core needs a single trade history file, not shards")
+        sys.exit(2)
+    if used and sharded:
+        print(f"{', '.join(used)} need(s) a single trade history file, not shards")
+        sys.exit(2)
+    if used and getattr(args, 'out_of_core', False):
+        print(f"{', '.join(used)} need(s) the in-memory trade table and cannot be used with --out-of-core")
+        sys.exit(2)
+
+
+def ingest(args, timer):
+    """
+    Parse trade_history.csv (or every shard) into the columnar trade cache
+    """
+    require_trade_table(args)
+    analyzer = load_analyzer(args, timer, use_cache=True)
+    if analyzer.column_store is not None:
+        store = analyzer.column_store
+        print(f"Ingested {store.trades:,} fills for {len(store):,} portfolios (column store: {store.store_dir})")
+        return {'rows': store.trades}
+    if analyzer.shard_state is not None:
+        state = analyzer.shard_state
+        print(f"Ingested {state.trades:,} fills for {len(state):,} portfolios from {len(state.sources)} shard(s)")
+        return {'rows': state.trades, 'shards': len(state.sources)}
+    trades = analyzer.trade_data
+    print(f"Ingested {len(trades):,} fills for {trades['Port_ID'].nunique():,} portfolios "
+          f"(cache: {analyzer.cache.cache_dir})")
+    return {'rows': len(trades)}
+
+
+def analyze(args, timer):
+    """
+    Full pipeline: metrics, ranking, top_portfolios.csv and the summary report
+    """
+    require_trade_table(args, '--compact', '--compact-fills', '--lower-bound', '--rolling', '--round-trips',
+                        '--correlations', '--max-correlation')
+    with timer.imports('instrumentation'):
+        from instrumentation import cprofile_to
+    profile_path = os.path.join(OUTPUT_DIR, 'run_profile.prof') if args.profile else None
+
+    with cprofile_to(profile_path):
+        analyzer = load_analyzer(args, timer, use_cache=not args.no_cache, compact=args.compact,
+                                 compact_fills=args.compact_fills)
+
+        if args.lower_bound:
+            analyzer.save_results(RESULTS_FILE, lower_bound=True, max_correlation=args.max_correlation,
+                                  ranked_path=RANKED_FILE, n_resamples=args.resamples, workers=args.workers)
+        else:
+            analyzer.save_results(RESULTS_FILE, max_correlation=args.max_correlation, ranked_path=RANKED_FILE)
+        write_results_meta(resolve_input(args.data)[0], args.lower_bound, args.resamples, args.max_correlation)
+
+        if args.rolling is not None:
+            from rolling_metrics import DEFAULT_WINDOWS
+            rolling_path = os.path.join(OUTPUT_DIR, 'rolling_metrics.csv')
+            analyzer.save_rolling_metrics(rolling_path, args.rolling or DEFAULT_WINDOWS)
+
+        if args.round_trips:
+            analyzer.save_round_trips(OUTPUT_DIR)
+
+        if args.correlations:
+            analyzer.save_correlations(OUTPUT_DIR, args.peers, args.cluster_threshold)
+
+    # Per-stage timings and counters next to top_portfolios.csv
+    analyzer.write_run_profile(os.path.join(OUTPUT_DIR, 'run_profile.json'))
+    if profile_path:
+        logging.info(f"cProfile stats saved to: {profile_path}")
+
+    logging.info("Analysis completed successfully!")
+    logging.info(f"Results saved to: {RESULTS_FILE}")
+    if analyzer.trade_data is not None:
+        return {'rows': len(analyzer.trade_data)}
+    state = analyzer.shard_state if analyzer.shard_state is not None else analyzer.column_store
+    return {'rows': state.trades}
+
+
+def rank(args, timer):
+    """
+    Print the top N portfolios, from top_portfolios.csv when it is still current
+    """
+    require_trade_table(args, '--lower-bound', '--max-correlation')
+    paths, _ = verify_input(args.data)
+    rows = None if args.refresh else saved_ranking(paths, args.n, args.lower_bound, args.resamples,
+                                                   args.max_correlation)
+    if rows is not None:
+        print_ranking(rows, RANK_COLUMNS)
+        return {'results_cache': 'hit'}
+
+    analyzer = load_analyzer(args, timer)
+    if args.lower_bound:
+        top = analyzer.get_top_portfolios(args.n, lower_bound=True, max_correlation=args.max_correlation,
+                                          n_resamples=args.resamples, workers=args.workers)
+    else:
+        top = analyzer.get_top_portfolios(args.n, max_correlation=args.max_correlation)
+    print_ranking(top.to_dict('records'), RANK_COLUMNS)
+    return {'results_cache': 'miss'}
+
+
+def lookup(args, timer):
+    """
+    Metrics of the given portfolios, parsing only their rows via the byte-offset index
+    """
+    paths, sharded = verify_input(args.data)
+    if sharded:
+        print("lookup needs a single trade history file, not shards")
+        sys.exit(2)
+    with timer.imports('trading_analyzer'):
+        from trading_analyzer import TradingAnalyzer
+    analyzer = TradingAnalyzer(PROJECT_ROOT, setup_dirs=False)
+    analyzer.load_data(paths[0], port_ids=args.port_ids)
+    analyzer.calculate_position_type()
+    results = analyzer.analyze_all_portfolios()
+    print_ranking(results.to_dict('records'), LOOKUP_COLUMNS)
+    return {'rows': len(analyzer.trade_data), 'portfolios': len(results)}
+
+
+def fetch(args, timer):
+    """
+    Fetch trade histories from the exchange API into the trade table and print
+    the fetch throughput and the top N portfolios
+    """
+    with timer.imports('trading_analyzer'):
+        from exchange_fetcher import ExchangeFetcher, StandInExchange
+        from trading_analyzer import TradingAnalyzer
+    port_ids = list(args.port_ids)
+    if args.ids_file:
+        with open(args.ids_file) as f:
+            port_ids += [line.strip() for line in f if line.strip()]
+
+    exchange = None
+    base_url = args.base_url
+    if args.stand_in:
+        paths, sharded = verify_input(args.data)
+        if sharded:
+            print("--stand-in needs a single trade history file, not shards")
+            sys.exit(2)
+        exchange = StandInExchange.from_csv(paths[0], path=args.path, weight_limit=args.stand_in_weight_limit,
+                                            request_weight=args.request_weight,
+                                            latency=args.stand_in_latency / 1000)
+        base_url = exchange.start_in_thread()
+        port_ids = port_ids or list(exchange.histories)
+    if not port_ids:
+        print("fetch needs PORT_IDs, --ids-file or --stand-in")
+        sys.exit(2)
+
+    fetcher = ExchangeFetcher(base_url, args.path, concurrency=args.concurrency, page_size=args.page_size,
+                              weight_limit=args.weight_limit, request_weight=args.request_weight,
+                              max_retries=args.max_retries)
+    analyzer = TradingAnalyzer(PROJECT_ROOT, setup_dirs=False)
+    try:
+        stats = analyzer.fetch_trades(port_ids, fetcher)
+    finally:
+        if exchange is not None:
+            exchange.stop_thread()
+    print(f"Fetched {stats['trades']:,} trades of {stats['portfolios']:,} portfolios in {stats['seconds']:.2f}s: "
+          f"{stats['trades_per_second']:,.0f} trades/s, {stats['requests_per_second']:,.0f} requests/s "
+          f"({stats['requests']:,} requests, {stats['retries']:,} retries, "
+          f"{stats['rate_limit_wait']:.2f}s rate-limit wait, {len(stats['failed'])} failed)")
+    analyzer.calculate_position_type()
+    print_ranking(analyzer.get_top_portfolios(args.n).to_dict('records'), RANK_COLUMNS)
+    return {'rows': len(analyzer.trade_data), 'trades_per_second': round(stats['trades_per_second'])}
+
+
+def serve(args, timer):
+    """
+    Keep the analyzed dataset in memory and answer queries over HTTP or a Unix socket
+    """
+    paths, sharded = verify_input(args.data)
+    if sharded:
+        print("serve needs a single trade history file, not shards")
+        sys.exit(2)
+    with timer.imports('query_service'):
+        from query_service import QueryService, serve as run_server
+    service = QueryService(paths[0], PROJECT_ROOT, cache_size=args.cache_size,
+                           reload_interval=args.reload_interval, use_cache=not args.no_cache)
+    run_server(service, args.host, args.port, args.socket)
+    return {'requests': service.requests}
+
+
+def plot(args, timer):
+    """
+    Render the EDA plots headless, skipping unchanged ones
+    """
+    with timer.imports('eda'):
+        from eda import DEFAULT_MAX_POINTS, PortfolioAnalysis
+    analysis = PortfolioAnalysis(PROJECT_ROOT)
+    analysis.load_data()
+    analysis.load_rolling_metrics()
+    status = analysis.render_all(args.workers, args.max_points or DEFAULT_MAX_POINTS, args.force)
+    return {'rendered': sum(s == 'rendered' for s in status.values())}
+
+
+def report(args, timer):
+    """
+    Summary PDF report, or per-portfolio tear sheets with --tear-sheets for the
+    full ranking written by analyze (ranked_portfolios.csv)
+    """
+    with timer.imports('generate_report'):
+        from generate_report import TradingReportGenerator
+    report_path = os.path.join(PROJECT_ROOT, 'reports', 'trading_report.pdf')
+    if not args.tear_sheets:
+        TradingReportGenerator(RESULTS_FILE, report_path).generate_report()
+        return {}
+    generator = TradingReportGenerator(RANKED_FILE, report_path)
+    output_dir = args.out or os.path.join(PROJECT_ROOT, 'reports', 'tear_sheets')
+    result = generator.generate_tear_sheets(output_dir, combined=not args.per_portfolio,
+                                            workers=args.workers, force=args.force, n=args.n)
+    return {'rendered': result['rendered']}
+
+
+def add_out_of_core_options(parser):
+    parser.add_argument('--out-of-core', action='store_true',
+                        help="Stream trades into memory-mapped column files (output/column_store) "
+                             "and compute metrics one Port_ID partition at a time")
+    parser.add_argument('--memory-budget', type=int, default=256, metavar='MB',
+                        help="Working memory for --out-of-core batches and partitions (default: 256)")
+
+
+def add_analysis_options(parser):
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes used to parse trade_history.csv (0 = all cores)")
+    parser.add_argument('--lower-bound', action='store_true',
+                        help="Rank on bootstrap lower confidence bounds of Sharpe ratio and win rate")
+    parser.add_argument('--resamples', type=int, default=2000,
+                        help="Bootstrap resamples per portfolio used with --lower-bound")
+    parser.add_argument('--max-correlation', type=float, default=None, metavar='RHO',
+                        help="Skip portfolios whose daily PnL correlation with a higher-ranked pick exceeds RHO")
+
+
+def build_parser():
+    data_help = ("Trade history CSV, or a directory or glob of CSV shards analyzed map-reduce style "
+                 "(default: data/trade_history.csv)")
+    parser = argparse.ArgumentParser(description="Analyze Binance trade history and rank portfolios")
+    parser.add_argument('--data', default=DATA_FILE, help=data_help)
+    parser.add_argument('--timings', action='store_true', help="Print import and total time to stderr")
+    commands = parser.add_subparsers(dest='command', required=True)
+    # --data is also accepted after the subcommand (main.py passes its arguments there)
+    data_option = argparse.ArgumentParser(add_help=False)
+    data_option.add_argument('--data', default=argparse.SUPPRESS, help=data_help)
+
+    command = commands.add_parser('ingest', parents=[data_option], help="Parse trade_history.csv into the trade cache")
+    command.add_argument('--workers', type=int, default=1,
+                         help="Worker processes used to parse trade_history.csv or the shards (0 = all cores)")
+    add_out_of_core_options(command)
+    command.set_defaults(handler=ingest)
+
+    command = commands.add_parser('analyze', parents=[data_option], help="Compute metrics, rank and save top_portfolios.csv")
+    add_analysis_options(command)
+    add_out_of_core_options(command)
+    command.add_argument('--no-cache', action='store_true',
+                         help="Re-parse trade_history.csv instead of using the cached trade table")
+    command.add_argument('--compact', action='store_true',
+                         help="Store the trade table with categorical and int8 codes to save memory")
+    command.add_argument('--compact-fills', action='store_true',
+                         help="Merge partial fills of the same order (time, symbol, side, positionSide, price) "
+                              "into one row before analysis; Win_Rate and Total_Positions then count orders")
+    command.add_argument('--profile', action='store_true',
+                         help="Also dump cProfile stats to output/run_profile.prof")
+    command.add_argument('--trace-memory', action='store_true',
+                         help="Record tracemalloc allocations per stage in output/run_profile.json (slower)")
+    command.add_argument('--rolling', type=int, nargs='*', metavar='DAYS',
+                         help="Also write rolling Sharpe/MDD to output/rolling_metrics.csv "
+                              "(without DAYS: rolling_metrics.DEFAULT_WINDOWS)")
+    command.add_argument('--round-trips', action='store_true',
+                         help="Also write FIFO round trips to output/round_trips.csv and output/positions.csv")
+    command.add_argument('--correlations', action='store_true',
+                         help="Also write the most correlated peers per portfolio (daily PnL) and correlation "
+                              "clusters to output/correlation_peers.csv and output/correlation_clusters.csv")
+    command.add_argument('--peers', type=int, default=5, help="Peers per portfolio written with --correlations")
+    command.add_argument('--cluster-threshold', type=float, default=0.7,
+                         help="Correlation that links portfolios into one cluster with --correlations")
+    command.set_defaults(handler=analyze)
+
+    command = commands.add_parser('rank', parents=[data_option], help="Print the top N portfolios")
+    add_analysis_options(command)
+    add_out_of_core_options(command)
+    command.add_argument('-n', type=int, default=20, help="Number of portfolios to show")
+    command.add_argument('--refresh', action='store_true',
+                         help="Recompute even if top_portfolios.csv is current")
+    command.set_defaults(handler=rank)
+
+    command = commands.add_parser('lookup', parents=[data_option],
+                                  help="Metrics of single portfolios, parsing only their rows")
+    command.add_argument('port_ids', nargs='+', metavar='PORT_ID')
+    command.set_defaults(handler=lookup)
+
+    command = commands.add_parser('fetch', parents=[data_option],
+                                  help="Fetch trade histories from the exchange API and rank them")
+    command.add_argument('port_ids', nargs='*', metavar='PORT_ID')
+    command.add_argument('--ids-file', default=None, metavar='PATH', help="File with one Port_ID per line")
+    command.add_argument('--base-url', default='https://www.binance.com')
+    command.add_argument('--path', default='/bapi/futures/v1/friendly/future/copy-trade/lead-portfolio/trade-history',
+                         help="Trade history endpoint")
+    command.add_argument('--concurrency', type=int, default=8, help="Portfolios (and connections) fetched at once")
+    command.add_argument('--page-size', type=int, default=100)
+    command.add_argument('--weight-limit', type=int, default=1200, help="Request weight allowed per minute")
+    command.add_argument('--request-weight', type=int, default=5, help="Weight of one page request")
+    command.add_argument('--max-retries', type=int, default=5, help="Retries per page on 429/418/5xx and connection errors")
+    command.add_argument('--stand-in', action='store_true',
+                         help="Fetch from a local stand-in server that serves the portfolios of --data")
+    command.add_argument('--stand-in-latency', type=float, default=0.0, metavar='MS',
+                         help="Latency the stand-in adds to every response")
+    command.add_argument('--stand-in-weight-limit', type=int, default=None,
+                         help="Weight per minute the stand-in allows before answering 429")
+    command.add_argument('-n', type=int, default=20, help="Number of portfolios to show")
+    command.set_defaults(handler=fetch)
+
+    command = commands.add_parser('serve', parents=[data_option],
+                                  help="Serve metrics, top N and the summary from memory over HTTP")
+    command.add_argument('--host', default='127.0.0.1')
+    command.add_argument('--port', type=int, default=8765)
+    command.add_argument('--socket', default=None, metavar='PATH', help="Listen on a Unix socket instead of TCP")
+    command.add_argument('--cache-size', type=int, default=512, help="Cached responses (LRU)")
+    command.add_argument('--reload-interval', type=float, default=2.0,
+                         help="Seconds between checks of the source file for changes (0 = never reload)")
+    command.add_argument('--no-cache', action='store_true',
+                         help="Re-parse trade_history.csv instead of using the cached trade table")
+    command.set_defaults(handler=serve)
+
+    command = commands.add_parser('plot', help="Render EDA plots headless into reports/plots")
+    command.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per plot)")
+    command.add_argument('--max-points', type=int, default=None)
+    command.add_argument('--force', action='store_true', help="Re-render plots even if their input is unchanged")
+    command.set_defaults(handler=plot)
+
+    command = commands.add_parser('report', help="Write the PDF report or per-portfolio tear sheets")
+    command.add_argument('--tear-sheets', action='store_true',
+                         help="Write a tear sheet for every portfolio in output/ranked_portfolios.csv")
+    command.add_argument('-n', type=int, default=None, help="Only the top N tear sheets (default: all)")
+    command.add_argument('--out', default=None, help="Tear sheet directory (default: reports/tear_sheets)")
+    command.add_argument('--per-portfolio', action='store_true', help="One PDF per portfolio instead of one combined PDF")
+    command.add_argument('--workers', type=int, default=None)
+    command.add_argument('--force', action='store_true', help="Re-render tear sheets even if unchanged")
+    command.set_defaults(handler=report)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    timer = StartupTimer()
+
+    # Directories first: logging writes into logs/
+    setup_project_structure(args.command)
+    setup_logging()
+
+    status, extra = 'ok', {}
+    try:
+        extra = args.handler(args, timer) or {}
+    except Exception as e:
+        status = 'error'
+        logging.error(f"Error during {args.command}: {str(e)}")
+        print(f"Error during {args.command}: {str(e)}")
+        sys.exit(1)
+    finally:
+        entry = timer.record(args.command, status, extra)
+        if args.timings:
+            print(f"{args.command}: {entry['import_seconds']:.3f}s importing {', '.join(entry['modules']) or 'nothing'}, "
+                  f"{entry['total_seconds']:.3f}s total", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sharding import PortfolioPartial
+from trade_cache import file_fingerprint
+from trade_parser import TradeHistoryParser, parse_rows
+from trade_schema import POSITION_CODES
+
+# Bump whenever the on-disk layout changes
+STORE_SCHEMA_VERSION = 1
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# Columns kept on disk, in partitioned (Port_ID) order
+COLUMNS = {
+    'timestamp': np.int64,       # datetime64[ns] as int64, NaT included
+    'realizedProfit': np.float64,
+    'quantity': np.float64,
+    'side': np.int8,             # codes into the manifest categories, -1 = missing
+    'positionSide': np.int8,
+    'position_type': np.int8,    # POSITION_CODES, written by write_position_codes
+}
+CATEGORY_COLUMNS = ['side', 'positionSide']
+
+# Rough working-set bytes per trade, used to size batches from the memory budget:
+# raw Trade_History text expands ~4x while parsing, and portfolio_aggregates needs
+# ~200 bytes per trade for its sort, gathers and daily grouping
+_PARSE_EXPANSION = 4
+_BYTES_PER_TRADE = 256
+
+_MANIFEST = 'manifest.json'
+_NAT = np.iinfo(np.int64).min
+
+
+class ColumnStore:
+    """
+    Out-of-core trade table: the columns the metrics need as memory-mapped files,
+    partitioned by Port_ID (portfolios in order of first appearance, each
+    portfolio's trades in file order) with per-portfolio offsets.
+
+    Building and every later pass work on windows of whole portfolios sized from
+    memory_budget, mapped with np.memmap only for as long as the window is in use,
+    so peak memory follows the budget rather than the input size. A single
+    portfolio larger than the budget is still processed as one window.
+    """
+
+    def __init__(self, source_path: Path, store_dir: Path, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 logger: Optional[logging.Logger] = None):
+        self.source_path = Path(source_path)
+        self.logger = logger or logging.getLogger(__name__)
+        self.memory_budget = int(memory_budget)
+        source_key = hashlib.sha1(str(self.source_path.resolve()).encode()).hexdigest()[:12]
+        self.store_dir = Path(store_dir) / f"{self.source_path.stem}-{source_key}"
+        self.manifest = None
+        self.offsets = None
+        self.port_ids = None
+
+    @property
+    def window_trades(self) -> int:
+        return max(1024, self.memory_budget // _BYTES_PER_TRADE)
+
+    @property
+    def batch_bytes(self) -> int:
+        return max(64 * 1024, self.memory_budget // (_PARSE_EXPANSION * 2))
+
+    @property
+    def trades(self) -> int:
+        return self.manifest['trades']
+
+    @property
+    def first_trade(self):
+        return pd.Timestamp(self.manifest['first_trade']) if self.manifest['first_trade'] else None
+
+    @property
+    def last_trade(self):
+        return pd.Timestamp(self.manifest['last_trade']) if self.manifest['last_trade'] else None
+
+    def __len__(self) -> int:
+        return len(self.port_ids)
+
+    def open(self) -> bool:
+        """
+        Open an existing store if it matches the current source file
+        """
+        try:
+            with open(self.store_dir / _MANIFEST) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if manifest.get('schema_version') != STORE_SCHEMA_VERSION:
+            return False
+        stat = self.source_path.stat()
+        source = manifest.get('source', {})
+        if source.get('size') != stat.st_size or source.get('mtime_ns') != stat.st_mtime_ns:
+            return False
+        if source != file_fingerprint(self.source_path):
+            return False
+        self._load_manifest(manifest)
+        return True
+
+    def _load_manifest(self, manifest: Dict) -> None:
+        self.manifest = manifest
+        self.offsets = np.fromfile(self.store_dir / 'offsets.bin', dtype=np.int64)
+        port_ids = manifest['port_ids']
+        self.port_ids = (np.array([int(port_id) for port_id in port_ids], dtype=np.int64) if manifest['numeric_ids']
+                         else np.array(port_ids, dtype=object))
+
+    def _path(self, name: str, directory: Optional[Path] = None) -> Path:
+        return (directory or self.store_dir) / f"{name}.bin"
+
+    def _map(self, name: str, start: int, stop: int, mode: str = 'r', dtype=None,
+             directory: Optional[Path] = None) -> np.ndarray:
+        """
+        Map rows [start, stop) of one column file; the mapping lives as long as the array
+        """
+        dtype = np.dtype(dtype or COLUMNS[name])
+        if stop <= start:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self._path(name, directory), dtype=dtype, mode=mode,
+                         offset=start * dtype.itemsize, shape=(stop - start,))
+
+    def build(self, workers: int = 1) -> None:
+        """
+        Parse the source CSV in budget-sized batches into column files, then
+        partition them by Port_ID
+        """
+        start_time = time.perf_counter()
+        if self.store_dir.exists():
+            shutil.rmtree(self.store_dir)
+        unsorted_dir = self.store_dir / 'unsorted'
+        unsorted_dir.mkdir(parents=True)
+
+        codes: Dict = {}
+        port_ids: List = []
+        counts = np.zeros(0, dtype=np.int64)
+        categories = {name: {} for name in CATEGORY_COLUMNS}
+        numeric_ids = True
+        trades = malformed = 0
+        first_trade, last_trade = _NAT, _NAT
+
+        files = {name: open(self._path(name, unsorted_dir), 'wb') for name in COLUMNS if name != 'position_type'}
+        files['port_code'] = open(self._path('port_code', unsorted_dir), 'wb')
+        try:
+            for parser in self._parsed_batches(workers):
+                malformed += parser.malformed_rows
+                if parser.n_trades == 0:
+                    continue
+                frame = parser.to_frame()
+                del parser
+                if 'time' in frame.columns:
+                    frame.rename(columns={"time": "timestamp"}, inplace=True)
+                required_columns = {"Port_ID", "timestamp", "side", "positionSide", "quantity", "realizedProfit"}
+                missing_columns = required_columns - set(frame.columns)
+                if missing_columns:
+                    raise KeyError(f"Missing columns in data after flattening: {missing_columns}")
+                trades += len(frame)
+
+                batch_codes, uniques = pd.factorize(frame['Port_ID'])
+                numeric_ids = numeric_ids and uniques.dtype == np.int64
+                lookup = np.empty(len(uniques), dtype=np.int32)
+                for i, port_id in enumerate(uniques.tolist()):
+                    key = str(port_id)
+                    code = codes.get(key)
+                    if code is None:
+                        code = codes[key] = len(port_ids)
+                        port_ids.append(key)
+                    lookup[i] = code
+                # Trades without a Port_ID never reach the metrics
+                keep = batch_codes >= 0
+                port_code = lookup[batch_codes[keep]]
+                if len(port_ids) > len(counts):
+                    counts = np.concatenate([counts, np.zeros(len(port_ids) - len(counts), dtype=np.int64)])
+                counts += np.bincount(port_code, minlength=len(counts))
+
+                timestamp = pd.to_datetime(frame['timestamp'], unit='ms', errors='coerce')
+                timestamp = timestamp.to_numpy(dtype='datetime64[ns]').view(np.int64)[keep]
+                valid = timestamp[timestamp != _NAT]
+                if len(valid):
+                    first_trade = valid.min() if first_trade == _NAT else min(first_trade, valid.min())
+                    last_trade = max(last_trade, valid.max())
+
+                columns = {
+                    'port_code': port_code,
+                    'timestamp': timestamp,
+                    'realizedProfit': frame['realizedProfit'].to_numpy(dtype=np.float64)[keep],
+                    'quantity': frame['quantity'].to_numpy(dtype=np.float64)[keep],
+                }
+                for name in CATEGORY_COLUMNS:
+                    value_codes, values = pd.factorize(frame[name])
+                    table = categories[name]
+                    remap = np.array([table.setdefault(value, len(table)) for value in values.tolist()] + [-1],
+                                     dtype=np.int8)
+                    # Code -1 (missing) indexes the trailing -1
+                    columns[name] = remap[value_codes[keep]]
+                for name, values in columns.items():
+                    files[name].write(np.ascontiguousarray(values, dtype=COLUMNS.get(name, np.int32)).tobytes())
+        finally:
+            for f in files.values():
+                f.close()
+
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        offsets.tofile(self.store_dir / 'offsets.bin')
+        self._partition(unsorted_dir, offsets)
+        shutil.rmtree(unsorted_dir)
+
+        manifest = {
+            'schema_version': STORE_SCHEMA_VERSION,
+            'source': file_fingerprint(self.source_path),
+            'trades': trades,
+            'stored_trades': int(offsets[-1]),
+            'malformed_rows': malformed,
+            'port_ids': port_ids,
+            'numeric_ids': bool(numeric_ids),
+            'categories': {name: list(table) for name, table in categories.items()},
+            'first_trade': str(pd.Timestamp(first_trade)) if first_trade != _NAT else None,
+            'last_trade': str(pd.Timestamp(last_trade)) if last_trade != _NAT else None,
+            'position_types': False,
+        }
+        self._write_manifest(manifest)
+        self._load_manifest(manifest)
+        if malformed:
+            self.logger.warning(f"Skipped {malformed} malformed trade history rows")
+        self.logger.info(f"Built column store with {offsets[-1]:,} trades for {len(port_ids):,} portfolios "
+                         f"in {self.store_dir} ({time.perf_counter() - start_time:.2f}s, "
+                         f"budget {self.memory_budget / 2**20:.0f} MB)")
+
+    def _parsed_batches(self, workers: int) -> Iterator[TradeHistoryParser]:
+        """
+        Parsers for successive budget-sized batches of CSV rows, in file order
+        """
+        if workers is None or workers <= 0:
+            workers = os.cpu_count() or 1
+        rows = TradeHistoryParser.read_rows(self.source_path, self.logger)
+        # Every batch in flight counts against the budget
+        batch_bytes = max(64 * 1024, self.batch_bytes // (2 * workers if workers > 1 else 1))
+        batches = TradeHistoryParser._batches(rows, batch_bytes)
+        if workers == 1:
+            for batch in batches:
+                yield parse_rows(batch)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.submit(parse_rows, batch))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _partition(self, unsorted_dir: Path, offsets: np.ndarray) -> None:
+        """
+        Counting-sort the file-order columns into Port_ID partitions, one window at a time
+        """
+        total = int(offsets[-1])
+        for name, dtype in COLUMNS.items():
+            with open(self._path(name), 'wb') as f:
+                f.truncate(total * np.dtype(dtype).itemsize)
+
+        cursor = offsets[:-1].copy()
+        for start in range(0, total, self.window_trades):
+            stop = min(total, start + self.window_trades)
+            port_code = np.array(self._map('port_code', start, stop, dtype=np.int32, directory=unsorted_dir))
+            # Destination of each trade: its portfolio's next free slot, keeping file order
+            rank = pd.Series(port_code).groupby(port_code).cumcount().to_numpy()
+            destination = cursor[port_code] + rank
+            cursor += np.bincount(port_code, minlength=len(cursor))
+            for name in COLUMNS:
+                if name == 'position_type':
+                    continue
+                target = np.memmap(self._path(name), dtype=COLUMNS[name], mode='r+', shape=(total,))
+                target[destination] = self._map(name, start, stop, directory=unsorted_dir)
+                target.flush()
+                del target
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        tmp_path = self.store_dir / f"{_MANIFEST}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.store_dir / _MANIFEST)
+
+    def partitions(self) -> Iterator[Tuple[int, int]]:
+        """
+        (first, last + 1) portfolio code ranges of whole portfolios holding at most
+        window_trades trades each (or a single larger portfolio)
+        """
+        start = 0
+        while start < len(self.port_ids):
+            stop = int(np.searchsorted(self.offsets, self.offsets[start] + self.window_trades, side='right')) - 1
+            stop = max(stop, start + 1)
+            yield start, stop
+            start = stop
+
+    def frame(self, start: int, stop: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Trades of portfolios [start, stop) as a DataFrame over memory-mapped slices
+        """
+        lo, hi = int(self.offsets[start]), int(self.offsets[stop])
+        columns = columns or [name for name in COLUMNS if name != 'position_type' or self.manifest['position_types']]
+        data = {'Port_ID': np.repeat(self.port_ids[start:stop], np.diff(self.offsets[start:stop + 1]))}
+        for name in columns:
+            values = self._map(name, lo, hi)
+            if name == 'timestamp':
+                values = values.view('datetime64[ns]')
+            elif name in CATEGORY_COLUMNS:
+                values = pd.Categorical.from_codes(values, categories=self.manifest['categories'][name])
+            data[name] = values
+        return pd.DataFrame(data, copy=False)
+
+    def write_position_codes(self, classify: Callable[[pd.DataFrame], np.ndarray]) -> int:
+        """
+        Fill position_type partition by partition with classify(trades) -> int8 codes;
+        returns the number of unknown positions
+        """
+        unknown = 0
+        for start, stop in self.partitions():
+            lo, hi = int(self.offsets[start]), int(self.offsets[stop])
+            codes = classify(self.frame(start, stop, CATEGORY_COLUMNS))
+            target = self._map('position_type', lo, hi, mode='r+')
+            target[:] = codes
+            target.flush()
+            del target
+            unknown += int((codes == POSITION_CODES['unknown']).sum())
+        self.manifest['position_types'] = True
+        self._write_manifest(self.manifest)
+        return unknown
+
+    def portfolio_metrics(self) -> pd.DataFrame:
+        """
+        calculate_metrics columns for every portfolio, reduced partition by partition;
+        portfolios never span partitions, so merging the partials is exact
+        """
+        if not self.manifest['position_types']:
+            raise KeyError("position_type has not been calculated for the column store")
+        partials = []
+        for start, stop in self.partitions():
+            trades = self.frame(start, stop, ['timestamp', 'realizedProfit', 'quantity', 'position_type'])
+            partials.append(PortfolioPartial.from_trades(trades))
+            del trades
+        return PortfolioPartial.merge(partials).metrics()
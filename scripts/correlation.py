@@ -0,0 +1,224 @@
+from typing import Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TOP_K = 5
+DEFAULT_MIN_OVERLAP = 10
+DEFAULT_CLUSTER_THRESHOLD = 0.7
+PEER_COLUMNS = ['Port_ID', 'rank', 'peer', 'correlation', 'overlap_days']
+CLUSTER_COLUMNS = ['Port_ID', 'cluster', 'cluster_size']
+
+# Correlation cells (block rows x portfolios) materialized at a time; each block
+# also holds about ten work arrays of the same size
+_BLOCK_CELLS = 1_000_000
+
+
+class DailyPnL:
+    """
+    Per-portfolio daily PnL rows prepared for pairwise-complete correlations:
+    zero-filled values, their squares and the mask of days with data (NaN in the
+    daily_pnl_matrix, i.e. outside the portfolio's trading span)
+    """
+
+    def __init__(self, matrix: np.ndarray):
+        self.mask = (~np.isnan(matrix)).astype(np.float64)
+        self.values = np.nan_to_num(matrix, nan=0.0)
+        self.squares = self.values * self.values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def correlations(self, rows, columns, min_overlap: int = DEFAULT_MIN_OVERLAP) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Pearson correlations of the rows against the columns (index arrays or
+        slices), each pair over the days both have data, and the number of those
+        days (as float). Pairs with fewer than min_overlap common days or a
+        constant series on them are NaN.
+        """
+        x, xx, mx = self.values[rows], self.squares[rows], self.mask[rows]
+        y, yy, my = self.values[columns], self.squares[columns], self.mask[columns]
+        overlap = mx @ my.T
+        sum_x, sum_y = x @ my.T, mx @ y.T
+        # In place throughout: for wide blocks the elementwise passes and fresh
+        # allocations cost more than the matrix products
+        inverse = np.zeros_like(overlap)
+        np.divide(1.0, overlap, out=inverse, where=overlap >= max(min_overlap, 1))
+        term = np.multiply(sum_x, sum_y)
+        term *= inverse
+        corr = x @ y.T
+        corr -= term
+
+        variance_x = xx @ my.T
+        # Sums of squares leave rounding noise where a series is constant
+        floor = variance_x * 1e-24
+        np.multiply(sum_x, sum_x, out=term)
+        term *= inverse
+        variance_x -= term
+        variance_y = np.matmul(mx, yy.T, out=sum_x)
+        floor *= variance_y
+        np.multiply(sum_y, sum_y, out=term)
+        term *= inverse
+        variance_y -= term
+
+        np.multiply(variance_x, variance_y, out=variance_x)
+        valid = np.greater(variance_x, floor, out=np.zeros(variance_x.shape, dtype=bool), where=inverse > 0)
+        np.sqrt(variance_x, out=variance_x, where=valid)
+        np.divide(corr, variance_x, out=corr, where=valid)
+        corr[~valid] = np.nan
+        np.clip(corr, -1.0, 1.0, out=corr)
+        return corr, overlap
+
+    def blocks(self, min_overlap: int = DEFAULT_MIN_OVERLAP) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        (first row, correlations, overlap days) for consecutive row blocks
+        against the portfolios from that row on (the upper triangle, including
+        the block's own square), so only block x n cells exist at a time
+        """
+        n = len(self)
+        start = 0
+        while start < n:
+            block = max(1, _BLOCK_CELLS // (n - start))
+            corr, overlap = self.correlations(slice(start, start + block), slice(start, None), min_overlap)
+            yield start, corr, overlap
+            start += block
+
+
+def connected_components(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """
+    Component label (smallest member index) of every node of an undirected
+    graph given as edge arrays
+    """
+    labels = np.arange(n)
+    while True:
+        # Hook both ends to the smaller label, then shortcut label chains
+        low = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, labels[left], low)
+        np.minimum.at(updated, labels[right], low)
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def _top_k(values: np.ndarray, keys: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k largest values per row, best first; equal values keep
+    the smaller key. Rows must have at least k columns.
+    """
+    if values.shape[1] > k:
+        top = np.argpartition(-values, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(values.shape[1]), values.shape)
+    order = np.lexsort((np.take_along_axis(keys, top, axis=1), -np.take_along_axis(values, top, axis=1)))
+    return np.take_along_axis(top, order, axis=1)
+
+
+def correlation_peers(port_ids, matrix: np.ndarray, k: int = DEFAULT_TOP_K,
+                      threshold: float = DEFAULT_CLUSTER_THRESHOLD,
+                      min_overlap: int = DEFAULT_MIN_OVERLAP) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Top-k most correlated peers of every portfolio and correlation clusters,
+    from a (portfolio x day) daily PnL matrix in one blocked pass over the
+    upper triangle of the correlation matrix.
+
+    peers has one row per (Port_ID, rank) with the peer's correlation and the
+    number of overlapping days. Clusters are the connected components of the
+    graph linking portfolios whose correlation is at least threshold (single
+    linkage), numbered by their first portfolio; portfolios without such a
+    link are clusters of one.
+    """
+    port_ids = np.asarray(port_ids)
+    daily = DailyPnL(matrix)
+    n = len(daily)
+    k = max(0, min(k, n - 1))
+    # Running top k per portfolio; a block's columns are candidates for the
+    # portfolios to its right, its rows for the block's own portfolios
+    best_corr = np.full((n, k), -np.inf)
+    best_peer = np.zeros((n, k), dtype=np.int64)
+    best_overlap = np.zeros((n, k))
+
+    def merge(rows: slice, corr: np.ndarray, peers: np.ndarray, overlap: np.ndarray) -> None:
+        corr = np.concatenate([best_corr[rows], corr], axis=1)
+        peers = np.concatenate([best_peer[rows], peers], axis=1)
+        overlap = np.concatenate([best_overlap[rows], overlap], axis=1)
+        top = _top_k(corr, peers, k)
+        best_corr[rows] = np.take_along_axis(corr, top, axis=1)
+        best_peer[rows] = np.take_along_axis(peers, top, axis=1)
+        best_overlap[rows] = np.take_along_axis(overlap, top, axis=1)
+
+    left, right = [], []
+    for start, corr, overlap in daily.blocks(min_overlap):
+        size = len(corr)
+        corr[np.arange(size), np.arange(size)] = np.nan
+        columns = np.arange(start, n)
+
+        # Every pair once: above the block's diagonal
+        linked = corr >= threshold
+        linked[:, :size] &= np.triu(np.ones((size, size), dtype=bool), 1)
+        i, j = np.nonzero(linked)
+        left.append(i + start)
+        right.append(j + start)
+
+        if k:
+            ranked = np.where(np.isnan(corr), -np.inf, corr)
+            keys = np.broadcast_to(columns, ranked.shape)
+            top = _top_k(ranked, keys, min(k, ranked.shape[1]))
+            merge(slice(start, start + size), np.take_along_axis(ranked, top, axis=1), columns[top],
+                  np.take_along_axis(overlap, top, axis=1))
+
+            if n > start + size:
+                ranked, overlap = ranked[:, size:].T, overlap[:, size:].T
+                rows = np.broadcast_to(np.arange(start, start + size), ranked.shape)
+                top = _top_k(ranked, rows, min(k, size))
+                merge(slice(start + size, n), np.take_along_axis(ranked, top, axis=1), start + top,
+                      np.take_along_axis(overlap, top, axis=1))
+
+    if k and n:
+        found = np.isfinite(best_corr)
+        peers = pd.DataFrame({
+            'Port_ID': port_ids[np.repeat(np.arange(n), k).reshape(n, k)[found]],
+            'rank': np.tile(np.arange(1, k + 1), (n, 1))[found],
+            'peer': port_ids[best_peer[found]],
+            'correlation': best_corr[found],
+            'overlap_days': best_overlap[found].astype(np.int64),
+        })
+    else:
+        peers = pd.DataFrame(columns=PEER_COLUMNS)
+
+    left = np.concatenate(left) if left else np.zeros(0, dtype=np.int64)
+    right = np.concatenate(right) if right else np.zeros(0, dtype=np.int64)
+    labels = connected_components(n, left, right)
+    _, cluster, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    clusters = pd.DataFrame({'Port_ID': port_ids, 'cluster': cluster, 'cluster_size': sizes[cluster]})
+    return peers, clusters
+
+
+def select_uncorrelated(matrix: np.ndarray, n: int, max_correlation: float,
+                        min_overlap: int = DEFAULT_MIN_OVERLAP, chunk: int = 256) -> np.ndarray:
+    """
+    Greedy diversified selection: walk the rows of matrix in order (best first)
+    and keep a row unless its correlation with an already kept row exceeds
+    max_correlation, until n are kept. Pairs without enough overlapping days
+    (NaN correlation) do not block each other. Returns the kept row positions.
+    """
+    daily = DailyPnL(matrix)
+    kept = []
+    for start in range(0, len(daily), chunk):
+        candidates = np.arange(start, min(start + chunk, len(daily)))
+        against_kept = daily.correlations(candidates, np.array(kept, dtype=np.int64), min_overlap)[0]
+        within = daily.correlations(candidates, candidates, min_overlap)[0]
+        kept_in_chunk = []
+        for i, row in enumerate(candidates):
+            if (against_kept[i] > max_correlation).any() or (within[i, kept_in_chunk] > max_correlation).any():
+                continue
+            kept.append(row)
+            kept_in_chunk.append(i)
+            if len(kept) == n:
+                return np.array(kept, dtype=np.int64)
+    return np.array(kept, dtype=np.int64)
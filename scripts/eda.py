@@ -1,7 +1,118 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+import argparse
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Above this many rows, scatter plots become hexbins and line/KDE inputs are sampled
+DEFAULT_MAX_POINTS = 5000
+# Bump when a plot function changes so cached renders are redrawn
+PLOT_VERSION = 1
+MANIFEST_NAME = ".plot_manifest.json"
+
+
+def plot_roi_distribution(df, max_points=DEFAULT_MAX_POINTS):
+    # 1. Histogram of ROI (the KDE is skipped on large inputs; bins stay exact)
+    fig = plt.figure(figsize=(10, 5))
+    sns.histplot(df["ROI"], bins=20, kde=len(df) <= max_points, color="blue")
+    plt.xlabel("ROI (%)")
+    plt.ylabel("Frequency")
+    plt.title("Distribution of ROI Among Portfolios")
+    return fig
+
+
+def plot_risk_vs_return(df, max_points=DEFAULT_MAX_POINTS):
+    # 2. Scatter Plot: Sharpe Ratio vs ROI (Risk vs. Return), hexbin density for large inputs
+    fig = plt.figure(figsize=(10, 6))
+    if len(df) > max_points:
+        plt.hexbin(df["Sharpe_Ratio"], df["ROI"], gridsize=60, bins="log", cmap="coolwarm", mincnt=1)
+        plt.colorbar(label="Portfolios")
+    else:
+        sns.scatterplot(data=df, x="Sharpe_Ratio", y="ROI", hue="Profit_Factor", size="Total_Positions", palette="coolwarm", sizes=(20, 200))
+        plt.legend(title="Profit Factor")
+    plt.xlabel("Sharpe Ratio (Risk-Adjusted Return)")
+    plt.ylabel("ROI (%)")
+    plt.title("Risk vs Return: Sharpe Ratio vs ROI")
+    return fig
+
+
+def plot_win_vs_total_positions(df, max_points=DEFAULT_MAX_POINTS):
+    # 3. Bar Chart: Win Positions vs Total Positions
+    fig = plt.figure(figsize=(12, 6))
+    df_sorted = df.nlargest(20, "Win_Rate")  # Top 20 accounts
+    sns.barplot(x=df_sorted["Port_ID"].astype(str), y=df_sorted["Total_Positions"], color="gray", label="Total Positions")
+    sns.barplot(x=df_sorted["Port_ID"].astype(str), y=df_sorted["Win_Positions"], color="green", label="Win Positions")
+
+    plt.xticks(rotation=90)
+    plt.xlabel("Port ID")
+    plt.ylabel("Number of Positions")
+    plt.title("Win Positions vs Total Positions for Top 20 Portfolios")
+    plt.legend()
+    return fig
+
+
+def _thin_series(df, group, max_points):
+    """
+    Keep every k-th row per group so the whole frame has at most ~max_points rows
+    """
+    if len(df) <= max_points:
+        return df
+    step = -(-len(df) // max_points)
+    return df[df.groupby(group).cumcount() % step == 0]
+
+
+def plot_portfolio_growth(df, max_points=DEFAULT_MAX_POINTS):
+    # 4. Line Chart: Portfolio Growth Over Time
+    df = df.copy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df_sorted = _thin_series(df.sort_values("timestamp"), "Port_ID", max_points)
+
+    fig = plt.figure(figsize=(12, 6))
+    sns.lineplot(data=df_sorted, x="timestamp", y="PnL", hue="Port_ID")
+    plt.xlabel("Time")
+    plt.ylabel("Cumulative PnL")
+    plt.title("Portfolio Growth Over Time")
+    return fig
+
+
+def plot_rolling(df, metric, label, top_n, max_points=DEFAULT_MAX_POINTS):
+    """
+    Rolling metric per window for the given portfolios (one facet row per window)
+    """
+    df = _thin_series(df, ["Port_ID", "window"], max_points)
+    grid = sns.relplot(data=df, x="date", y=metric, hue="Port_ID", row="window",
+                       kind="line", height=3, aspect=4, facet_kws={"sharey": False})
+    grid.set_axis_labels("Date", label)
+    grid.fig.suptitle(f"{label} for Top {top_n} Portfolios", y=1.02)
+    return grid.fig
+
+
+def input_hash(df, name, max_points):
+    """
+    Fingerprint of a plot's input columns and render settings
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{name}:{PLOT_VERSION}:{max_points}:{list(df.columns)}".encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def render_plot(name, func, df, path, kwargs):
+    """
+    Render one figure to path with the non-interactive backend (runs in a worker)
+    """
+    plt.switch_backend("Agg")
+    sns.set_theme(style="whitegrid")
+    start = time.perf_counter()
+    fig = func(df, **kwargs)
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+    return name, time.perf_counter() - start
+
 
 class PortfolioAnalysis:
     def __init__(self, base_dir):
@@ -9,7 +120,9 @@ class PortfolioAnalysis:
         self.data_dir = os.path.join(base_dir, "output")
         self.plot_dir = os.path.join(base_dir, "reports", "plots")
         self.file_path = os.path.join(self.data_dir, "top_portfolios.csv")
+        self.rolling_path = os.path.join(self.data_dir, "rolling_metrics.csv")
         self.df = None
+        self.rolling_df = None
 
     def load_data(self):
         if not os.path.exists(self.file_path):
@@ -17,6 +130,12 @@ class PortfolioAnalysis:
             exit()
         self.df = pd.read_csv(self.file_path)
 
+    def load_rolling_metrics(self):
+        if not os.path.exists(self.rolling_path):
+            print(f"No rolling metrics at {self.rolling_path} (run main.py --rolling).")
+            return
+        self.rolling_df = pd.read_csv(self.rolling_path, parse_dates=["date"])
+
     def display_summary(self):
         print("\n🔍 Data Summary:")
         print(self.df.describe())
@@ -25,62 +144,128 @@ class PortfolioAnalysis:
         print("\nMissing values per column:")
         print(self.df.isnull().sum())
 
+    def plot_jobs(self, max_points=DEFAULT_MAX_POINTS, top_n=5):
+        """
+        (name, function, input frame, file name, extra kwargs) for every plot that has data
+        """
+        jobs = []
+        if self.df is not None:
+            jobs.append(("roi_distribution", plot_roi_distribution, self.df[["ROI"]], "roi_distribution.png", {}))
+            jobs.append(("risk_vs_return", plot_risk_vs_return,
+                         self.df[["Sharpe_Ratio", "ROI", "Profit_Factor", "Total_Positions"]], "risk_vs_return.png", {}))
+            jobs.append(("win_vs_total_positions", plot_win_vs_total_positions,
+                         self.df[["Port_ID", "Win_Rate", "Total_Positions", "Win_Positions"]],
+                         "win_vs_total_positions.png", {}))
+            if "timestamp" in self.df.columns:
+                jobs.append(("portfolio_growth", plot_portfolio_growth, self.df[["timestamp", "PnL", "Port_ID"]],
+                             "portfolio_growth.png", {}))
+            else:
+                print("No timestamp data available for portfolio growth visualization.")
+
+        subset = self.rolling_subset(top_n) if self.rolling_df is not None else None
+        if subset is not None and len(subset) > 0:
+            for metric, label in [("Sharpe_Ratio", "Rolling Sharpe Ratio"), ("MDD", "Rolling Max Drawdown (%)")]:
+                jobs.append((f"rolling_{metric.lower()}", plot_rolling, subset[["Port_ID", "date", "window", metric]],
+                             f"rolling_{metric.lower()}.png", {"metric": metric, "label": label, "top_n": top_n}))
+
+        for job in jobs:
+            job[4]["max_points"] = max_points
+        return jobs
+
+    def rolling_subset(self, top_n=5):
+        port_ids = self.df["Port_ID"].head(top_n) if self.df is not None else self.rolling_df["Port_ID"].unique()[:top_n]
+        subset = self.rolling_df[self.rolling_df["Port_ID"].isin(port_ids)].copy()
+        subset["Port_ID"] = subset["Port_ID"].astype(str)
+        return subset
+
     def create_plots(self):
         sns.set_theme(style="whitegrid")
         os.makedirs(self.plot_dir, exist_ok=True)
 
-        # 1. Histogram of ROI
-        plt.figure(figsize=(10, 5))
-        sns.histplot(self.df["ROI"], bins=20, kde=True, color="blue")
-        plt.xlabel("ROI (%)")
-        plt.ylabel("Frequency")
-        plt.title("Distribution of ROI Among Portfolios")
-        plt.savefig(os.path.join(self.plot_dir, "roi_distribution.png"))
-        plt.show()
-
-        # 2. Scatter Plot: Sharpe Ratio vs ROI (Risk vs. Return)
-        plt.figure(figsize=(10, 6))
-        sns.scatterplot(data=self.df, x="Sharpe_Ratio", y="ROI", hue="Profit_Factor", size="Total_Positions", palette="coolwarm", sizes=(20, 200))
-        plt.xlabel("Sharpe Ratio (Risk-Adjusted Return)")
-        plt.ylabel("ROI (%)")
-        plt.title("Risk vs Return: Sharpe Ratio vs ROI")
-        plt.legend(title="Profit Factor")
-        plt.savefig(os.path.join(self.plot_dir, "risk_vs_return.png"))
-        plt.show()
-
-        # 3. Bar Chart: Win Positions vs Total Positions
-        plt.figure(figsize=(12, 6))
-        df_sorted = self.df.sort_values(by="Win_Rate", ascending=False).head(20)  # Top 20 accounts
-        sns.barplot(x=df_sorted["Port_ID"].astype(str), y=df_sorted["Total_Positions"], color="gray", label="Total Positions")
-        sns.barplot(x=df_sorted["Port_ID"].astype(str), y=df_sorted["Win_Positions"], color="green", label="Win Positions")
-
-        plt.xticks(rotation=90)
-        plt.xlabel("Port ID")
-        plt.ylabel("Number of Positions")
-        plt.title("Win Positions vs Total Positions for Top 20 Portfolios")
-        plt.legend()
-        plt.savefig(os.path.join(self.plot_dir, "win_vs_total_positions.png"))
-        plt.show()
-
-        # 4. Line Chart: Portfolio Growth Over Time (If Available)
-        if "timestamp" in self.df.columns:
-            self.df["timestamp"] = pd.to_datetime(self.df["timestamp"])
-            df_sorted = self.df.sort_values("timestamp")
-
-            plt.figure(figsize=(12, 6))
-            sns.lineplot(data=df_sorted, x="timestamp", y="PnL", hue="Port_ID")
-            plt.xlabel("Time")
-            plt.ylabel("Cumulative PnL")
-            plt.title("Portfolio Growth Over Time")
-            plt.savefig(os.path.join(self.plot_dir, "portfolio_growth.png"))
+        for name, func, df, file_name, kwargs in self.plot_jobs():
+            if name.startswith("rolling_"):
+                continue
+            func(df, **kwargs)
+            plt.savefig(os.path.join(self.plot_dir, file_name))
+            plt.show()
+
+    def plot_rolling_metrics(self, top_n=5):
+        """
+        Rolling Sharpe and MDD per window for the top portfolios
+        """
+        if self.rolling_df is None:
+            print("No rolling metrics loaded.")
+            return
+        sns.set_theme(style="whitegrid")
+        os.makedirs(self.plot_dir, exist_ok=True)
+
+        for name, func, df, file_name, kwargs in self.plot_jobs(top_n=top_n):
+            if not name.startswith("rolling_"):
+                continue
+            fig = func(df, **kwargs)
+            fig.savefig(os.path.join(self.plot_dir, file_name))
             plt.show()
+
+    def render_all(self, workers=None, max_points=DEFAULT_MAX_POINTS, force=False, top_n=5):
+        """
+        Headless batch mode: render every plot with the Agg backend, one worker
+        process per figure, skipping plots whose input is unchanged since the last run.
+        Returns {plot name: 'rendered' | 'unchanged'}.
+        """
+        os.makedirs(self.plot_dir, exist_ok=True)
+        manifest_path = os.path.join(self.plot_dir, MANIFEST_NAME)
+        manifest = {}
+        if os.path.exists(manifest_path) and not force:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+
+        status, pending = {}, []
+        for name, func, df, file_name, kwargs in self.plot_jobs(max_points, top_n):
+            path = os.path.join(self.plot_dir, file_name)
+            digest = input_hash(df, name, max_points)
+            if manifest.get(name) == digest and os.path.exists(path):
+                status[name] = "unchanged"
+                continue
+            pending.append((name, func, df, path, kwargs, digest))
+
+        start = time.perf_counter()
+        workers = min(len(pending), workers or os.cpu_count() or 1)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(render_plot, name, func, df, path, kwargs)
+                           for name, func, df, path, kwargs, _ in pending]
+                timings = [future.result() for future in futures]
         else:
-            print("No timestamp data available for portfolio growth visualization.")
+            timings = [render_plot(name, func, df, path, kwargs) for name, func, df, path, kwargs, _ in pending]
+
+        for (name, _, _, _, _, digest), (_, seconds) in zip(pending, timings):
+            manifest[name] = digest
+            status[name] = "rendered"
+            print(f"Rendered {name} in {seconds:.2f}s")
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        print(f"Rendered {len(pending)} plot(s), {len(status) - len(pending)} unchanged, "
+              f"in {time.perf_counter() - start:.2f}s")
+        return status
+
 
 if __name__ == "__main__":
-    base_dir = os.path.join(os.path.expanduser("~"), "Videos", "data science")
-    analysis = PortfolioAnalysis(base_dir)
+    parser = argparse.ArgumentParser(description="Exploratory plots for portfolio results")
+    parser.add_argument("--base-dir", default=os.path.join(os.path.expanduser("~"), "Videos", "data science"))
+    parser.add_argument("--batch", action="store_true", help="Render headless in parallel and skip unchanged plots")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for --batch (default: one per plot)")
+    parser.add_argument("--max-points", type=int, default=DEFAULT_MAX_POINTS)
+    parser.add_argument("--force", action="store_true", help="Re-render plots even if their input is unchanged")
+    args = parser.parse_args()
+
+    analysis = PortfolioAnalysis(args.base_dir)
     analysis.load_data()
-    analysis.display_summary()
-    analysis.check_missing_values()
-    analysis.create_plots()
+    analysis.load_rolling_metrics()
+    if args.batch:
+        analysis.render_all(args.workers, args.max_points, args.force)
+    else:
+        analysis.display_summary()
+        analysis.check_missing_values()
+        analysis.create_plots()
+        analysis.plot_rolling_metrics()
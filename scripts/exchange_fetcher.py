@@ -0,0 +1,462 @@
+import ast
+import asyncio
+import csv
+import json
+import logging
+import random
+import ssl
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from trade_parser import TradeHistoryParser
+
+# Binance copy-trading lead portfolio trade history: POST {portfolioId, pageNumber,
+# pageSize} -> {"code": "000000", "data": {"total": N, "list": [trade, ...]}}
+DEFAULT_BASE_URL = 'https://www.binance.com'
+DEFAULT_PATH = '/bapi/futures/v1/friendly/future/copy-trade/lead-portfolio/trade-history'
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_CONCURRENCY = 8
+# Request weight budget per interval, like the exchange's X-MBX-USED-WEIGHT-1M limit
+DEFAULT_WEIGHT_LIMIT = 1200
+DEFAULT_WEIGHT_INTERVAL = 60.0
+DEFAULT_REQUEST_WEIGHT = 5
+DEFAULT_MAX_RETRIES = 5
+WEIGHT_HEADER = 'x-mbx-used-weight-1m'
+SUCCESS_CODE = '000000'
+# 418 is the exchange's "banned for ignoring 429s"; both carry Retry-After
+RETRY_STATUSES = {418, 429, 500, 502, 503, 504}
+
+_CSV_FIELD_LIMIT = 2 ** 31 - 1
+
+
+class FetchError(Exception):
+    """
+    A request that failed for good (non-retryable status or retries exhausted)
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class WeightLimiter:
+    """
+    Sliding-window budget of request weight: acquire() waits until the weight
+    spent in the last `interval` seconds leaves room for the request. pause()
+    stops all requests until a server-imposed deadline (Retry-After).
+    """
+
+    def __init__(self, limit: int = DEFAULT_WEIGHT_LIMIT, interval: float = DEFAULT_WEIGHT_INTERVAL):
+        self.limit = limit
+        self.interval = interval
+        self.spent = deque()
+        self.used = 0
+        self.waited = 0.0
+        self._resume_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, weight: int) -> None:
+        # One waiter at a time keeps the order of requests fair
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self.spent and self.spent[0][0] <= now - self.interval:
+                    self.used -= self.spent.popleft()[1]
+                delay = self._resume_at - now
+                if delay <= 0 and (self.used + weight <= self.limit or not self.spent):
+                    self.spent.append((now, weight))
+                    self.used += weight
+                    return
+                if delay <= 0:
+                    delay = self.spent[0][0] + self.interval - now
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def throttle(self, seconds: float) -> None:
+        """
+        After a 429: pause, and lower the limit to the weight the server accepted
+        in the current window, so the workers do not hit it again together
+        """
+        self.pause(seconds)
+        self.limit = max(1, min(self.limit, int(self.used * 0.9)))
+
+    def observe(self, used_weight: int) -> None:
+        """
+        Sync with the weight the server reports as used: weight spent by other
+        clients of the same budget is booked as spent now
+        """
+        if used_weight > self.used:
+            self.spent.append((time.monotonic(), used_weight - self.used))
+            self.used = used_weight
+
+
+class HTTPConnectionPool:
+    """
+    Keep-alive HTTP/1.1 connections to one host over asyncio streams, at most
+    `size` open at a time; connections go back to the pool after each request
+    """
+
+    def __init__(self, base_url: str, size: int = DEFAULT_CONCURRENCY, timeout: float = 30.0):
+        url = urlsplit(base_url)
+        if url.scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL scheme: {base_url}")
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if url.scheme == 'https' else None
+        self.host_header = url.netloc
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self):
+        self.connections_opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+
+    async def request(self, method: str, path: str, body: bytes = b'',
+                      headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Send one request; returns (status, lower-cased headers, body)
+        """
+        async with self._slots:
+            reused = bool(self._idle)
+            conn = self._idle.pop() if reused else await self._connect()
+            try:
+                response = await asyncio.wait_for(self._roundtrip(conn, method, path, body, headers), self.timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as e:
+                conn[1].close()
+                if not reused or isinstance(e, asyncio.TimeoutError):
+                    raise
+                # The server closed an idle keep-alive connection; retry once on a fresh one
+                conn = await self._connect()
+                try:
+                    response = await asyncio.wait_for(self._roundtrip(conn, method, path, body, headers),
+                                                      self.timeout)
+                except Exception:
+                    conn[1].close()
+                    raise
+            status, response_headers, data = response
+            if response_headers.get('connection', '').lower() == 'close':
+                conn[1].close()
+            else:
+                self._idle.append(conn)
+            return status, response_headers, data
+
+    async def _roundtrip(self, conn, method: str, path: str, body: bytes, headers: Optional[Dict[str, str]]):
+        reader, writer = conn
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host_header}", f"Content-Length: {len(body)}",
+                 'Connection: keep-alive']
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by server")
+        status = int(status_line.split(None, 2)[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            parts = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Trailers end with an empty line
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                parts.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b''.join(parts)
+        elif 'content-length' in response_headers:
+            data = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await reader.read()
+            response_headers['connection'] = 'close'
+        return status, response_headers, data
+
+    async def close(self) -> None:
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+class ExchangeFetcher:
+    """
+    Fetch the trade history of many portfolios concurrently and feed every page
+    straight into a TradeHistoryParser, so the result is the same columnar trade
+    table load_data builds from the CSV without going through the Trade_History
+    text format.
+
+    Portfolios are fetched `concurrency` at a time over one keep-alive connection
+    pool; every request first takes its weight from a WeightLimiter. 429/418 and
+    5xx responses and connection errors are retried with exponential backoff and
+    jitter (or the server's Retry-After, which also lowers the weight limit); a
+    portfolio that still fails is logged and left out entirely. Pages of one
+    portfolio are fetched in order and fed to the parser once all of them have
+    arrived, so its trades keep the exchange's order; portfolios appear in the
+    order they complete.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, path: str = DEFAULT_PATH,
+                 concurrency: int = DEFAULT_CONCURRENCY, page_size: int = DEFAULT_PAGE_SIZE,
+                 weight_limit: int = DEFAULT_WEIGHT_LIMIT, weight_interval: float = DEFAULT_WEIGHT_INTERVAL,
+                 request_weight: int = DEFAULT_REQUEST_WEIGHT, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff: float = 0.5, max_backoff: float = 30.0, timeout: float = 30.0,
+                 logger: Optional[logging.Logger] = None):
+        self.base_url = base_url
+        self.path = path
+        self.concurrency = max(1, concurrency)
+        self.page_size = page_size
+        self.weight_limit = weight_limit
+        self.weight_interval = weight_interval
+        self.request_weight = request_weight
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.stats: Dict = {}
+
+    def fetch(self, port_ids: Iterable, parser: Optional[TradeHistoryParser] = None) -> TradeHistoryParser:
+        """
+        Fetch all portfolios (blocking); returns the parser holding their trades
+        """
+        return asyncio.run(self.fetch_async(port_ids, parser))
+
+    async def fetch_async(self, port_ids: Iterable,
+                          parser: Optional[TradeHistoryParser] = None) -> TradeHistoryParser:
+        parser = parser or TradeHistoryParser(self.logger)
+        port_ids = list(dict.fromkeys(str(port_id).strip() for port_id in port_ids))
+        pool = HTTPConnectionPool(self.base_url, self.concurrency, self.timeout)
+        limiter = WeightLimiter(self.weight_limit, self.weight_interval)
+        self.stats = {'portfolios': 0, 'trades': 0, 'requests': 0, 'retries': 0, 'bytes': 0, 'failed': []}
+        queue = asyncio.Queue()
+        for port_id in port_ids:
+            queue.put_nowait(port_id)
+
+        async def worker():
+            while not queue.empty():
+                port_id = queue.get_nowait()
+                try:
+                    await self._fetch_portfolio(pool, limiter, parser, port_id)
+                    self.stats['portfolios'] += 1
+                except FetchError as e:
+                    self.stats['failed'].append(port_id)
+                    self.logger.error(f"Error fetching portfolio {port_id}: {str(e)}")
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*[worker() for _ in range(min(self.concurrency, len(port_ids)) or 1)])
+        finally:
+            await pool.close()
+        elapsed = time.perf_counter() - start
+        self.stats.update({
+            'seconds': elapsed,
+            'connections': pool.connections_opened,
+            'rate_limit_wait': limiter.waited,
+            'trades_per_second': self.stats['trades'] / elapsed if elapsed > 0 else 0.0,
+            'requests_per_second': self.stats['requests'] / elapsed if elapsed > 0 else 0.0,
+        })
+        self.logger.info(f"Fetched {self.stats['trades']:,} trades of {self.stats['portfolios']:,} portfolios "
+                         f"in {elapsed:.2f}s ({self.stats['trades_per_second']:,.0f} trades/s, "
+                         f"{self.stats['requests']:,} requests, {self.stats['retries']:,} retries, "
+                         f"{len(self.stats['failed'])} failed)")
+        return parser
+
+    async def _fetch_portfolio(self, pool: HTTPConnectionPool, limiter: WeightLimiter,
+                               parser: TradeHistoryParser, port_id: str) -> None:
+        pages, fetched = [], 0
+        while True:
+            data = await self._request_page(pool, limiter, port_id, len(pages) + 1)
+            trades = data.get('list') or []
+            pages.append(trades)
+            fetched += len(trades)
+            total = data.get('total')
+            if len(trades) < self.page_size or (total is not None and fetched >= total):
+                break
+        # Only complete histories go into the table: a partial one would skew every metric
+        for trades in pages:
+            parser.feed_trades(port_id, trades)
+        self.stats['trades'] += fetched
+
+    async def _request_page(self, pool: HTTPConnectionPool, limiter: WeightLimiter,
+                            port_id: str, page: int) -> Dict:
+        body = json.dumps({'portfolioId': port_id, 'pageNumber': page, 'pageSize': self.page_size}).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        attempt = 0
+        while True:
+            await limiter.acquire(self.request_weight)
+            self.stats['requests'] += 1
+            try:
+                status, response_headers, data = await pool.request('POST', self.path, body, headers)
+                self.stats['bytes'] += len(data)
+                if WEIGHT_HEADER in response_headers:
+                    limiter.observe(int(response_headers[WEIGHT_HEADER]))
+                if status == 200:
+                    payload = json.loads(data)
+                    if payload.get('code') != SUCCESS_CODE:
+                        raise FetchError(f"Exchange error {payload.get('code')}: {payload.get('message')}", status)
+                    return payload.get('data') or {}
+                retry_after = response_headers.get('retry-after')
+                raise FetchError(f"HTTP {status} for page {page}", status,
+                                 float(retry_after) if retry_after else None)
+            except FetchError as e:
+                if e.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    raise
+                delay = e.retry_after
+                if delay is not None:
+                    # Everyone waits: the limit is shared by all workers
+                    limiter.throttle(delay)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as e:
+                if attempt >= self.max_retries:
+                    raise FetchError(f"Page {page} failed after {attempt + 1} attempts: {str(e) or type(e).__name__}")
+                delay = None
+            if delay is None:
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            attempt += 1
+            self.stats['retries'] += 1
+            await asyncio.sleep(delay)
+
+
+class StandInExchange:
+    """
+    Local stand-in for the exchange's trade-history endpoint, for tests and
+    benchmarks: serves {Port_ID: [trade, ...]} in pages over keep-alive HTTP/1.1,
+    enforces its own weight limit with 429 + Retry-After, and can add latency
+    per request
+    """
+
+    def __init__(self, histories: Dict[str, List[Dict]], path: str = DEFAULT_PATH,
+                 weight_limit: Optional[int] = None, weight_interval: float = DEFAULT_WEIGHT_INTERVAL,
+                 request_weight: int = DEFAULT_REQUEST_WEIGHT, latency: float = 0.0):
+        self.histories = histories
+        self.path = path
+        self.weight_limit = weight_limit
+        self.weight_interval = weight_interval
+        self.request_weight = request_weight
+        self.latency = latency
+        self.requests = 0
+        self.rejected = 0
+        self._spent = deque()
+        self._server = None
+        self._loop = None
+
+    @classmethod
+    def from_csv(cls, data_path: Path, **options) -> 'StandInExchange':
+        """
+        Serve the portfolios of a trade history CSV
+        """
+        csv.field_size_limit(_CSV_FIELD_LIMIT)
+        histories = {}
+        with open(data_path, newline='') as f:
+            for row in csv.DictReader(f):
+                trades = ast.literal_eval(row['Trade_History']) if row.get('Trade_History') else []
+                histories.setdefault(row['Port_IDs'].strip(), []).extend(
+                    trade for trade in trades if isinstance(trade, dict))
+        return cls(histories, **options)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def start_in_thread(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Serve from an event loop in a daemon thread, for blocking callers; returns the base URL
+        """
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name='stand-in-exchange', daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(self.start(host, port), self._loop).result()
+
+    def stop_thread(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _over_limit(self) -> Optional[float]:
+        """
+        Seconds until the request fits in the window, or None if it fits now
+        """
+        if self.weight_limit is None:
+            return None
+        now = time.monotonic()
+        while self._spent and self._spent[0] <= now - self.weight_interval:
+            self._spent.popleft()
+        if self._spent and (len(self._spent) + 1) * self.request_weight > self.weight_limit:
+            return self._spent[0] + self.weight_interval - now
+        self._spent.append(now)
+        return None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(None, 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, response_headers, payload = self._respond(method, target, body)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                head = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                        'Content-Type: application/json', f"Content-Length: {len(payload)}"]
+                head += [f"{name}: {value}" for name, value in response_headers.items()]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _respond(self, method: str, target: str, body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        self.requests += 1
+        if method != 'POST' or urlsplit(target).path != self.path:
+            return 404, {}, json.dumps({'code': '404', 'message': 'Not found'}).encode('utf-8')
+        wait = self._over_limit()
+        if wait is not None:
+            self.rejected += 1
+            return 429, {'Retry-After': f"{max(wait, 0.001):.3f}"}, json.dumps(
+                {'code': '429', 'message': 'Too many requests'}).encode('utf-8')
+        try:
+            request = json.loads(body)
+            port_id = str(request['portfolioId'])
+            page, page_size = int(request.get('pageNumber', 1)), int(request.get('pageSize', DEFAULT_PAGE_SIZE))
+        except (ValueError, KeyError, TypeError):
+            return 400, {}, json.dumps({'code': '400', 'message': 'Bad request'}).encode('utf-8')
+        trades = self.histories.get(port_id, [])
+        start = (page - 1) * page_size
+        data = {'total': len(trades), 'list': trades[start:start + page_size]}
+        headers = {}
+        if self.weight_limit is not None:
+            headers['X-MBX-USED-WEIGHT-1M'] = str(len(self._spent) * self.request_weight)
+        return 200, headers, json.dumps({'code': SUCCESS_CODE, 'data': data, 'success': True}).encode('utf-8')
@@ -0,0 +1,46 @@
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Fills sharing all of these belong to one order
+ORDER_KEYS = ['Port_ID', 'timestamp', 'symbol', 'side', 'positionSide', 'price']
+SUM_COLUMNS = ['qty', 'quantity', 'fee', 'realizedProfit']
+
+
+def compact_fills(trade_data: pd.DataFrame,
+                  logger: Optional[logging.Logger] = None) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Merge partial fills with the same Port_ID, timestamp, symbol, side,
+    positionSide and price into one order row: qty, quantity, fee and
+    realizedProfit are summed, every other column keeps the first fill's value
+    and `fills` counts the merged fills. Orders keep the position of their first
+    fill; fills without a timestamp are never merged.
+    Returns the compacted frame and a report with the compression ratio.
+    """
+    logger = logger or logging.getLogger(__name__)
+    keys = [key for key in ORDER_KEYS if key in trade_data.columns]
+    missing_time = trade_data['timestamp'].isna().to_numpy()
+    # A unique extra key per fill without a timestamp keeps it on its own
+    unique_key = np.where(missing_time, np.arange(len(trade_data)), -1)
+    groups = trade_data.groupby([trade_data[key] for key in keys] + [pd.Series(unique_key, index=trade_data.index)],
+                                sort=False, observed=True, dropna=False).ngroup().to_numpy()
+
+    # ngroup numbers orders by first appearance, so first fills come out in file order
+    _, first = np.unique(groups, return_index=True)
+    orders = trade_data.iloc[first].reset_index(drop=True)
+    for column in SUM_COLUMNS:
+        if column in orders.columns:
+            orders[column] = pd.Series(trade_data[column].to_numpy()).groupby(groups).sum(min_count=1).to_numpy()
+    orders['fills'] = np.bincount(groups, minlength=len(orders))
+
+    fills, merged = len(trade_data), len(orders)
+    report = {
+        'fills': fills,
+        'orders': merged,
+        'compression_ratio': fills / merged if merged else 1.0,
+    }
+    logger.info(f"Compacted {fills:,} fills into {merged:,} orders "
+                f"(compression ratio {report['compression_ratio']:.2f}x)")
+    return orders, report
@@ -1,6 +1,35 @@
 from fpdf import FPDF
 import pandas as pd
+import argparse
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Bump when the tear sheet layout changes so cached pages are redrawn
+TEAR_SHEET_VERSION = 3
+MANIFEST_NAME = ".tear_sheets.json"
+# Single-page sheets the combined PDF is merged from
+PAGE_DIR_NAME = ".tear_sheet_pages"
+
+# (column, label, format) rows of the tear sheet metrics table. Only values of
+# the portfolio itself: rank, percentiles and total_score (min-max normalized)
+# change with the rest of the population and would invalidate every sheet
+TEAR_SHEET_METRICS = [
+    ("ROI", "ROI", "{:.2f}%"),
+    ("PnL", "PnL", "${:,.2f}"),
+    ("Sharpe_Ratio", "Sharpe Ratio", "{:.2f}"),
+    ("MDD", "Max Drawdown", "{:.4g}%"),
+    ("Win_Rate", "Win Rate", "{:.2f}%"),
+    ("Win_Positions", "Win Positions", "{:,.0f}"),
+    ("Total_Positions", "Total Positions", "{:,.0f}"),
+    ("Avg_Profit_Per_Trade", "Avg Profit per Trade", "${:,.2f}"),
+    ("Profit_Factor", "Profit Factor", "{:.2f}"),
+]
+
 
 class TradingReportGenerator:
     def __init__(self, data_path, report_path):
@@ -76,6 +105,85 @@ class TradingReportGenerator:
         self.add_insights()
         self.save_pdf()
 
+    def tear_sheet_rows(self):
+        """
+        One dict per ranked portfolio (in rank order) with its formatted metrics
+        """
+        df = self.df.reset_index(drop=True)
+        columns = []
+        for column, label, fmt in TEAR_SHEET_METRICS:
+            if column not in df.columns:
+                continue
+            texts = [fmt.format(v) if v == v else "n/a" for v in df[column].tolist()]
+            columns.append([(label, text) for text in texts])
+
+        return [{"Port_ID": str(port_id), "metrics": cells}
+                for port_id, *cells in zip(df["Port_ID"].astype("int64").tolist(), *columns)]
+
+    def generate_tear_sheets(self, output_dir, combined=True, workers=None, force=False, chunk_size=64, n=None):
+        """
+        Bulk mode: one tear sheet per ranked portfolio, rendered as complete
+        single-page PDFs over a process pool and skipped when the portfolio's
+        metrics hash is unchanged since the last run. Writes output_dir/<Port_ID>.pdf,
+        or with combined merges the sheets (kept under output_dir/.tear_sheet_pages)
+        in rank order into output_dir/tear_sheets.pdf, labelling pages "Rank N",
+        so reranking re-renders nothing. With n, only the top n portfolios get a sheet.
+        """
+        self.load_data()
+        if n is not None:
+            self.df = self.df.head(n)
+        os.makedirs(output_dir, exist_ok=True)
+        sheet_dir = os.path.join(output_dir, PAGE_DIR_NAME) if combined else output_dir
+        os.makedirs(sheet_dir, exist_ok=True)
+        rows = self.tear_sheet_rows()
+        hashes = {row["Port_ID"]: row_hash(row) for row in rows}
+
+        manifest_path = os.path.join(sheet_dir, MANIFEST_NAME)
+        manifest = {}
+        if os.path.exists(manifest_path) and not force:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+
+        combined_path = os.path.join(output_dir, "tear_sheets.pdf")
+        stale = [row for row in rows if manifest.get(row["Port_ID"]) != hashes[row["Port_ID"]]
+                 or not os.path.exists(os.path.join(sheet_dir, f"{row['Port_ID']}.pdf"))]
+        # Same sheets in the same rank order: the combined PDF is current
+        if combined and not stale and os.path.exists(combined_path) and list(manifest) == list(hashes):
+            print(f"All {len(rows)} tear sheets unchanged; kept {combined_path}")
+            return {"rendered": 0, "unchanged": len(rows), "pages_per_second": None}
+
+        start = time.perf_counter()
+        chunks = [stale[i:i + chunk_size] for i in range(0, len(stale), chunk_size)]
+        workers = max(1, min(len(chunks), workers or os.cpu_count() or 1))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(write_tear_sheet_files, chunks, [sheet_dir] * len(chunks)))
+        else:
+            for chunk in chunks:
+                write_tear_sheet_files(chunk, sheet_dir)
+        render_seconds = time.perf_counter() - start
+
+        if combined:
+            merge_tear_sheets([os.path.join(sheet_dir, f"{row['Port_ID']}.pdf") for row in rows], combined_path)
+            # Sheets of portfolios that dropped out of the ranking
+            for port_id in set(manifest) - set(hashes):
+                path = os.path.join(sheet_dir, f"{port_id}.pdf")
+                if os.path.exists(path):
+                    os.remove(path)
+
+        # Every sheet on disk now matches its row
+        with open(manifest_path, "w") as f:
+            json.dump(hashes, f)
+
+        elapsed = time.perf_counter() - start
+        rate = len(stale) / elapsed if elapsed > 0 else 0.0
+        print(f"✅ Rendered {len(stale)} tear sheet(s), {len(rows) - len(stale)} unchanged, "
+              f"with {workers} worker(s): {rate:,.1f} pages/s "
+              f"({render_seconds:.2f}s rendering, {elapsed:.2f}s total)")
+        print(f"   Output: {combined_path if combined else output_dir}")
+        return {"rendered": len(stale), "unchanged": len(rows) - len(stale), "pages_per_second": rate}
+
+
 class PDFReport(FPDF):
     def header(self):
         self.set_font("Arial", "B", 16)
@@ -87,8 +195,91 @@ class PDFReport(FPDF):
         self.set_font("Arial", "I", 10)
         self.cell(0, 10, f"Page {self.page_no()}", align="C")
 
+
+class TearSheetPDF(PDFReport):
+    """
+    Single-page tear sheet: report header, no page number
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.set_auto_page_break(auto=False)
+
+    def footer(self):
+        pass
+
+
+def row_hash(row):
+    """
+    Fingerprint of everything drawn on a tear sheet: the portfolio's own metrics
+    """
+    payload = json.dumps([TEAR_SHEET_VERSION, row], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def draw_tear_sheet(pdf, row):
+    """
+    Draw one portfolio's tear sheet on the current page
+    """
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, f"Portfolio {row['Port_ID']}", ln=True, align="L")
+    pdf.ln(4)
+
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(90, 8, "Metric", border=1)
+    pdf.cell(80, 8, "Value", border=1, ln=True, align="R")
+    pdf.set_font("Arial", "", 11)
+    for label, text in row["metrics"]:
+        pdf.cell(90, 8, label, border=1)
+        pdf.cell(80, 8, text, border=1, ln=True, align="R")
+
+
+def write_tear_sheet_files(rows, output_dir):
+    """
+    Write one single-page PDF per portfolio in a worker
+    """
+    for row in rows:
+        pdf = TearSheetPDF()
+        pdf.add_page()
+        draw_tear_sheet(pdf, row)
+        pdf.output(os.path.join(output_dir, f"{row['Port_ID']}.pdf"))
+    return len(rows)
+
+
+def merge_tear_sheets(paths, path):
+    """
+    Concatenate single-page tear sheet PDFs (in rank order) into one PDF whose
+    page labels are the ranks
+    """
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for sheet in paths:
+        writer.append(sheet)
+    if paths:
+        writer.set_page_label(0, len(paths) - 1, style="/D", prefix="Rank ")
+    writer.write(path)
+
+
 if __name__ == "__main__":
-    data_path = "/home/anand/Videos/data science/output/top_portfolios.csv"
-    report_path = "/home/anand/Videos/data science/reports/trading_report.pdf"
-    report_generator = TradingReportGenerator(data_path, report_path)
-    report_generator.generate_report()
+    parser = argparse.ArgumentParser(description="Generate PDF trading reports")
+    parser.add_argument("--data", default=None,
+                        help="Ranked portfolios CSV (default: output/top_portfolios.csv, or "
+                             "output/ranked_portfolios.csv with --tear-sheets)")
+    parser.add_argument("--report", default=os.path.join(PROJECT_ROOT, "reports", "trading_report.pdf"))
+    parser.add_argument("--tear-sheets", action="store_true", help="Write a tear sheet for every ranked portfolio")
+    parser.add_argument("-n", type=int, default=None, help="Only the top N tear sheets (default: all)")
+    parser.add_argument("--out", default=os.path.join(PROJECT_ROOT, "reports", "tear_sheets"))
+    parser.add_argument("--per-portfolio", action="store_true", help="One PDF per portfolio instead of one combined PDF")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="Re-render tear sheets even if unchanged")
+    args = parser.parse_args()
+
+    data_path = args.data or os.path.join(PROJECT_ROOT, "output",
+                                          "ranked_portfolios.csv" if args.tear_sheets else "top_portfolios.csv")
+    report_generator = TradingReportGenerator(data_path, args.report)
+    if args.tear_sheets:
+        report_generator.generate_tear_sheets(args.out, combined=not args.per_portfolio,
+                                              workers=args.workers, force=args.force, n=args.n)
+    else:
+        report_generator.generate_report()
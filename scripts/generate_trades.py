@@ -0,0 +1,119 @@
+import argparse
+import csv
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+BASE_ASSETS = ['BTC', 'ETH', 'SOL', 'DOGE', 'XRP', 'BNB', 'ADA', 'AVAX', 'LINK', 'DOT',
+               'LTC', 'TRX', 'NEAR', 'APT', 'ARB', 'OP', 'SUI', 'PEPE', 'WIF', 'TIA']
+# Rough price levels so notionals look like the real export
+BASE_PRICES = [65000.0, 3500.0, 150.0, 0.15, 0.5, 580.0, 0.45, 35.0, 15.0, 7.0,
+               80.0, 0.12, 6.0, 9.0, 1.0, 2.0, 1.0, 0.00001, 2.5, 8.0]
+
+TRADE_TEMPLATE = ("{{'time': {}, 'symbol': '{}USDT', 'side': '{}', 'price': {!r}, 'fee': {!r}, "
+                  "'feeAsset': 'USDT', 'quantity': {!r}, 'quantityAsset': 'USDT', 'realizedProfit': {!r}, "
+                  "'realizedProfitAsset': 'USDT', 'baseAsset': '{}', 'qty': {!r}, 'positionSide': '{}', "
+                  "'activeBuy': {}}}")
+
+# (opens, positionSide) -> side, following calculate_position_type
+_SIDES = {(True, 'LONG'): 'BUY', (False, 'LONG'): 'SELL', (True, 'SHORT'): 'SELL', (False, 'SHORT'): 'BUY'}
+
+
+def symbol_universe(n_symbols: int):
+    """
+    Base assets and reference prices for n_symbols symbols
+    """
+    assets, prices = [], []
+    for i in range(n_symbols):
+        if i < len(BASE_ASSETS):
+            assets.append(BASE_ASSETS[i])
+            prices.append(BASE_PRICES[i])
+        else:
+            assets.append(f"ALT{i}")
+            prices.append(float(10 ** ((i * 7919) % 9 - 4)))
+    return assets, np.array(prices)
+
+
+def portfolio_trades(rng: np.random.Generator, n_trades: int, assets: List[str], prices: np.ndarray,
+                     start_ms: int, span_ms: int) -> List[str]:
+    """
+    Trade_History dict literals for one portfolio, newest first like the export
+    """
+    times = np.sort(rng.integers(start_ms // 1000, (start_ms + span_ms) // 1000, n_trades))[::-1] * 1000
+    symbol = rng.integers(0, len(assets), n_trades)
+    price = np.round(prices[symbol] * rng.lognormal(0.0, 0.05, n_trades), 5)
+    qty = np.round(rng.lognormal(0.0, 1.0, n_trades) * 1000 / np.maximum(prices[symbol], 1e-9) * 0.01, 3)
+    qty = np.maximum(qty, 0.001)
+    quantity = np.round(price * qty, 5)
+    fee = -np.round(quantity * 0.0005, 8)
+    opens = rng.random(n_trades) < 0.5
+    long_side = rng.random(n_trades) < 0.6
+    # Closing fills carry the realized PnL, opening fills realize nothing
+    profit = np.where(opens, 0.0, np.round(quantity * rng.normal(0.002, 0.02, n_trades), 8))
+    active_buy = rng.random(n_trades) < 0.5
+
+    trades = []
+    for t, s, p, f, q, r, b, o, l, a in zip(times.tolist(), symbol.tolist(), price.tolist(), fee.tolist(),
+                                             quantity.tolist(), profit.tolist(), qty.tolist(),
+                                             opens.tolist(), long_side.tolist(), active_buy.tolist()):
+        position_side = 'LONG' if l else 'SHORT'
+        trades.append(TRADE_TEMPLATE.format(t, assets[s], _SIDES[(o, position_side)], p, f, q, r,
+                                            assets[s], b, position_side, a))
+    return trades
+
+
+def generate_trade_history(output_path: Path, n_portfolios: int = 150, trades_per_portfolio: int = 1000,
+                           n_symbols: int = 10, start: str = '2024-04-01', days: int = 90,
+                           seed: int = 0, logger: Optional[logging.Logger] = None) -> int:
+    """
+    Write a synthetic trade_history.csv in the Port_IDs,Trade_History literal format.
+    Trade counts per portfolio are Poisson around trades_per_portfolio.
+    Returns the number of fills written.
+    """
+    logger = logger or logging.getLogger(__name__)
+    rng = np.random.default_rng(seed)
+    assets, prices = symbol_universe(n_symbols)
+    start_ms = int(pd.Timestamp(start).value // 1_000_000)
+    span_ms = days * 86_400_000
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    port_ids = rng.integers(3_900_000_000_000_000_000, 4_040_000_000_000_000_000, n_portfolios, dtype=np.int64)
+    counts = rng.poisson(trades_per_portfolio, n_portfolios)
+
+    fills = 0
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Port_IDs', 'Trade_History'])
+        for i, (port_id, n_trades) in enumerate(zip(port_ids.tolist(), counts.tolist())):
+            trades = portfolio_trades(rng, n_trades, assets, prices, start_ms, span_ms)
+            writer.writerow([port_id, '[' + ', '.join(trades) + ']'])
+            fills += n_trades
+            if (i + 1) % 1000 == 0:
+                logger.info(f"Generated {i + 1:,}/{n_portfolios:,} portfolios ({fills:,} fills)")
+
+    logger.info(f"Wrote {fills:,} fills for {n_portfolios:,} portfolios to {output_path}")
+    return fills
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic trade_history.csv")
+    parser.add_argument('output', help="Path of the CSV to write")
+    parser.add_argument('--portfolios', type=int, default=150)
+    parser.add_argument('--trades', type=int, default=1000, help="Mean trades per portfolio")
+    parser.add_argument('--symbols', type=int, default=10)
+    parser.add_argument('--start', default='2024-04-01', help="First trade date")
+    parser.add_argument('--days', type=int, default=90, help="Date span of the trades")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    generate_trade_history(Path(args.output), args.portfolios, args.trades, args.symbols,
+                           args.start, args.days, args.seed)
+
+
+if __name__ == "__main__":
+    main()
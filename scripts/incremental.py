@@ -0,0 +1,198 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from metrics_engine import daily_pnl, finalize_metrics
+from trade_schema import POSITION_CODES, position_codes
+
+_NAN = float('nan')
+
+
+def advance_drawdown(cum: float, peak: float, low: float, value: float):
+    """
+    Fold one daily return into (cumulative product, running peak, lowest drawdown),
+    with the NaN handling of cumprod / expanding().max() / min() in calculate_metrics
+    """
+    cum = cum * (1 + value)
+    if cum == cum and not (peak >= cum):
+        peak = cum
+    drawdown = cum / peak - 1 if peak == peak else _NAN
+    if drawdown == drawdown and not (low <= drawdown):
+        low = drawdown
+    return cum, peak, low
+
+
+class IncrementalMetrics:
+    """
+    Running per-portfolio aggregates that absorb new trades without a full recompute.
+
+    Sums and counts live in arrays indexed by portfolio code. Each portfolio also
+    keeps its daily PnL series, Welford moments of that series for Sharpe, and a
+    drawdown checkpoint taken before its last day, so a batch only replays the
+    days it touches.
+    """
+
+    _FLOAT_STATE = ['total_profit', 'total_investment', 'gross_profit', 'gross_loss',
+                    'day_mean', 'day_m2', 'check_cum', 'check_peak', 'check_low', 'low']
+    _INT_STATE = ['win_positions', 'total_positions', 'n_days']
+
+    def __init__(self):
+        self.port_ids: List = []
+        self.codes: Dict = {}
+        self.days: List[List[int]] = []
+        self.day_pnl: List[List[float]] = []
+        for name in self._FLOAT_STATE:
+            setattr(self, name, np.zeros(0, dtype=np.float64))
+        for name in self._INT_STATE:
+            setattr(self, name, np.zeros(0, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.port_ids)
+
+    def _codes_for(self, port_ids: pd.Series) -> np.ndarray:
+        """
+        Map Port_IDs to codes, registering unseen portfolios in order of appearance
+        """
+        inverse, uniques = pd.factorize(port_ids)
+        lookup = np.empty(len(uniques), dtype=np.int64)
+        for i, port_id in enumerate(np.asarray(uniques)):
+            code = self.codes.get(port_id)
+            if code is None:
+                code = len(self.port_ids)
+                self.codes[port_id] = code
+                self.port_ids.append(port_id)
+                self.days.append([])
+                self.day_pnl.append([])
+            lookup[i] = code
+        self._grow(len(self.port_ids))
+        return lookup[inverse]
+
+    def _grow(self, size: int) -> None:
+        capacity = len(self.total_profit)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity)
+        for name in self._FLOAT_STATE + self._INT_STATE:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def update(self, trades: pd.DataFrame) -> np.ndarray:
+        """
+        Absorb a batch of trades; returns the codes of the portfolios it touched
+        """
+        trades = trades[trades['Port_ID'].notna()]
+        if len(trades) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        groups = self._codes_for(trades['Port_ID'])
+        position_type = position_codes(trades['position_type'])
+        profit = trades['realizedProfit'].to_numpy(dtype=np.float64)
+        quantity = trades['quantity'].to_numpy(dtype=np.float64)
+
+        is_close = (position_type == POSITION_CODES['long_close']) | (position_type == POSITION_CODES['short_close'])
+        is_open = (position_type == POSITION_CODES['long_open']) | (position_type == POSITION_CODES['short_open'])
+        is_win = profit > 0
+        is_loss = profit < 0
+
+        np.add.at(self.total_positions, groups[is_close], 1)
+        np.add.at(self.win_positions, groups[is_win], 1)
+        # NaN counts as 0, like Series.sum() in calculate_metrics
+        np.add.at(self.total_investment, groups[is_open], np.where(np.isnan(quantity), 0.0, quantity)[is_open])
+        np.add.at(self.total_profit, groups, np.where(np.isnan(profit), 0.0, profit))
+        np.add.at(self.gross_profit, groups[is_win], profit[is_win])
+        np.add.at(self.gross_loss, groups[is_loss], profit[is_loss])
+
+        daily = daily_pnl(groups, trades['timestamp'], profit)
+        day_groups = daily.index.get_level_values(0).to_numpy()
+        day_keys = daily.index.get_level_values(1).to_numpy()
+        day_values = daily.to_numpy()
+        bounds = np.flatnonzero(np.diff(day_groups)) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(day_groups)]):
+            if end > start:
+                self._merge_days(int(day_groups[start]), day_keys[start:end].tolist(),
+                                 day_values[start:end].tolist())
+
+        return np.unique(groups)
+
+    def _merge_days(self, code: int, new_days: List[int], new_pnl: List[float]) -> None:
+        days, pnl = self.days[code], self.day_pnl[code]
+
+        if days and new_days[0] < days[-1]:
+            # Late fills for an earlier day: replay this portfolio's series
+            merged = dict(zip(days, pnl))
+            for day, value in zip(new_days, new_pnl):
+                merged[day] = merged.get(day, 0.0) + value
+            days[:] = sorted(merged)
+            pnl[:] = [merged[day] for day in days]
+            self._rebuild(code)
+            return
+
+        replay_from = len(days) - 1 if days else 0
+        if days and new_days[0] == days[-1]:
+            self._remove_moment(code, pnl[-1])
+            pnl[-1] += new_pnl[0]
+            self._add_moment(code, pnl[-1])
+            new_days, new_pnl = new_days[1:], new_pnl[1:]
+
+        for day, value in zip(new_days, new_pnl):
+            days.append(day)
+            pnl.append(value)
+            self._add_moment(code, value)
+        self._replay(code, replay_from)
+
+    def _add_moment(self, code: int, value: float) -> None:
+        n = self.n_days[code] + 1
+        delta = value - self.day_mean[code]
+        self.day_mean[code] += delta / n
+        self.day_m2[code] += delta * (value - self.day_mean[code])
+        self.n_days[code] = n
+
+    def _remove_moment(self, code: int, value: float) -> None:
+        n = self.n_days[code] - 1
+        if n == 0:
+            self.day_mean[code] = 0.0
+            self.day_m2[code] = 0.0
+        else:
+            mean = (self.day_mean[code] * (n + 1) - value) / n
+            self.day_m2[code] -= (value - mean) * (value - self.day_mean[code])
+            self.day_mean[code] = mean
+        self.n_days[code] = n
+
+    def _rebuild(self, code: int) -> None:
+        self.n_days[code] = 0
+        self.day_mean[code] = 0.0
+        self.day_m2[code] = 0.0
+        for value in self.day_pnl[code]:
+            self._add_moment(code, value)
+        self.check_cum[code], self.check_peak[code], self.check_low[code] = 1.0, _NAN, _NAN
+        self._replay(code, 0)
+
+    def _replay(self, code: int, start: int) -> None:
+        """
+        Advance the drawdown checkpoint from day index start to the last day
+        """
+        pnl = self.day_pnl[code]
+        cum, peak, low = float(self.check_cum[code]), float(self.check_peak[code]), float(self.check_low[code])
+        if start == 0:
+            cum, peak, low = 1.0, _NAN, _NAN
+        for value in pnl[start:-1]:
+            cum, peak, low = advance_drawdown(cum, peak, low, value)
+        self.check_cum[code], self.check_peak[code], self.check_low[code] = cum, peak, low
+        self.low[code] = advance_drawdown(cum, peak, low, pnl[-1])[2] if pnl else _NAN
+
+    def results(self, codes=None) -> pd.DataFrame:
+        """
+        Metrics frame (calculate_metrics columns) for all or some portfolio codes
+        """
+        codes = np.arange(len(self.port_ids)) if codes is None else np.asarray(codes)
+        n_days = self.n_days[codes]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(self.day_m2[codes] / (n_days - 1))
+        port_ids = np.array([self.port_ids[code] for code in codes])
+        return finalize_metrics(port_ids, self.total_profit[codes], self.total_investment[codes],
+                                self.win_positions[codes], self.total_positions[codes],
+                                self.gross_profit[codes], self.gross_loss[codes],
+                                n_days, self.day_mean[codes], std, self.low[codes])
@@ -0,0 +1,188 @@
+import cProfile
+import datetime
+import functools
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+
+def current_rss() -> int:
+    """
+    Resident set size of this process in bytes (0 where /proc is unavailable)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def max_rss() -> int:
+    """
+    Peak resident set size of this process so far, in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _rows(value) -> Optional[int]:
+    return len(value) if isinstance(value, (pd.DataFrame, pd.Series)) else None
+
+
+class RunProfiler:
+    """
+    Records wall/CPU time, rows in and out and memory of each pipeline stage,
+    plus aggregated counters that replace per-item logging in hot loops.
+
+    Stages may nest (save_results -> get_top_portfolios -> analyze_all_portfolios);
+    each record keeps its depth and parent so totals are not double counted.
+    With trace_memory, tracemalloc reports allocation deltas and peaks per stage,
+    at the cost of slower allocations; otherwise only RSS is sampled.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages: List[Dict] = []
+        self.counters: Counter = Counter()
+        self.started = datetime.datetime.now()
+        self._stack: List[Dict] = []
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None):
+        """
+        Time a block as one stage; set record['rows_out'] inside to report output rows
+        """
+        record = {
+            'stage': name,
+            'depth': len(self._stack),
+            'parent': self._stack[-1]['stage'] if self._stack else None,
+            'rows_in': rows_in,
+            'rows_out': None,
+        }
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak)
+            tracemalloc.reset_peak()
+            record['_traced'] = current
+            record['_peak'] = current
+        rss = current_rss()
+        self._stack.append(record)
+        start_cpu = time.process_time()
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - start, 6)
+            record['cpu_seconds'] = round(time.process_time() - start_cpu, 6)
+            record['rss_mb'] = round(current_rss() / 1e6, 1)
+            record['rss_delta_mb'] = round((current_rss() - rss) / 1e6, 1)
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(record.pop('_peak'), peak)
+                traced = record.pop('_traced')
+                record['alloc_delta_mb'] = round((current - traced) / 1e6, 1)
+                record['alloc_peak_mb'] = round((peak - traced) / 1e6, 1)
+                self._stack.pop()
+                if self._stack:
+                    self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak)
+                tracemalloc.reset_peak()
+            else:
+                self._stack.pop()
+            self.stages.append(record)
+
+    def summary(self) -> Dict:
+        """
+        Calls, wall and CPU time summed per stage name (nested calls count
+        toward their own stage as well as inside their parent)
+        """
+        totals: Dict[str, Dict] = {}
+        for record in self.stages:
+            total = totals.setdefault(record['stage'], {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+            total['calls'] += 1
+            total['wall_seconds'] = round(total['wall_seconds'] + record['wall_seconds'], 6)
+            total['cpu_seconds'] = round(total['cpu_seconds'] + record['cpu_seconds'], 6)
+        return totals
+
+    def to_dict(self, extra_counters: Optional[Dict] = None) -> Dict:
+        counters = dict(self.counters)
+        counters.update(extra_counters or {})
+        top_level = [record for record in self.stages if record['depth'] == 0]
+        return {
+            'started': self.started.isoformat(timespec='seconds'),
+            'finished': datetime.datetime.now().isoformat(timespec='seconds'),
+            'pid': os.getpid(),
+            'trace_memory': self.trace_memory,
+            'total_wall_seconds': round(sum(r['wall_seconds'] for r in top_level), 6),
+            'total_cpu_seconds': round(sum(r['cpu_seconds'] for r in top_level), 6),
+            'peak_rss_mb': round(max_rss() / 1e6, 1),
+            'stages': self.stages,
+            'stage_totals': self.summary(),
+            'counters': counters,
+        }
+
+    def write(self, path: Path, extra_counters: Optional[Dict] = None) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(extra_counters), f, indent=2, default=str)
+        return path
+
+
+def instrumented(name: Optional[str] = None):
+    """
+    Decorator for TradingAnalyzer methods: run the method as a profiler stage,
+    with the trade table size as rows in and a returned frame's length as rows out
+    """
+    def decorator(method):
+        stage_name = name or method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = getattr(self, 'profiler', None)
+            if profiler is None:
+                return method(self, *args, **kwargs)
+            trade_data = getattr(self, '_trade_data', None)
+            with profiler.stage(stage_name, rows_in=_rows(trade_data)) as record:
+                result = method(self, *args, **kwargs)
+                rows_out = _rows(result)
+                record['rows_out'] = rows_out if rows_out is not None else _rows(getattr(self, '_trade_data', None))
+            return result
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def cprofile_to(path: Optional[Path]):
+    """
+    Run the block under cProfile and dump stats to path; a no-op when path is None
+    """
+    if path is None:
+        yield None
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        profile.dump_stats(str(path))
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+from trade_schema import POSITION_CODES, position_codes
+
+METRIC_COLUMNS = ['Port_ID', 'ROI', 'PnL', 'Sharpe_Ratio', 'MDD', 'Win_Rate', 'Win_Positions',
+                  'Total_Positions', 'Avg_Profit_Per_Trade', 'Profit_Factor']
+
+_NS_PER_DAY = 86_400 * 1_000_000_000
+
+
+def segment_sum(values: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    Sum values per group in one pass; groups must already be sorted. NaN counts
+    as 0, like Series.sum() in calculate_metrics.
+    """
+    result = np.zeros(n_groups, dtype=np.float64)
+    if len(values) == 0:
+        return result
+    values = values.astype(np.float64, copy=False)
+    values = np.where(np.isnan(values), 0.0, values)
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    nonempty = counts > 0
+    result[nonempty] = np.add.reduceat(values, starts[nonempty])
+    return result
+
+
+def _zero_branch(values: np.ndarray, fallback: np.ndarray) -> np.ndarray:
+    """
+    Mirror calculate_metrics, which returns the int 0 when a metric is undefined;
+    a column made only of those zeros is int64 in the old DataFrame
+    """
+    if len(fallback) and fallback.all():
+        return values.astype(np.int64)
+    return values
+
+
+def daily_pnl(port_codes: np.ndarray, timestamps: pd.Series, profit: np.ndarray) -> pd.Series:
+    """
+    Realized PnL per (portfolio code, calendar day), sorted by code then day
+    """
+    ts = timestamps.to_numpy(dtype='datetime64[ns]')
+    has_day = ~np.isnat(ts)
+    days = ts[has_day].view(np.int64) // _NS_PER_DAY
+    return pd.Series(profit[has_day]).groupby([port_codes[has_day], days], sort=True).sum()
+
+
+def portfolio_aggregates(trade_data: pd.DataFrame) -> dict:
+    """
+    Per-portfolio sums and counts plus the daily PnL series that every metric is
+    derived from. Trades are stably sorted by portfolio once; every sum is then a
+    segment reduction over that order instead of a boolean scan of the whole frame.
+    Portfolios appear in the same order as trade_data['Port_ID'].unique().
+    """
+    codes, port_ids = pd.factorize(trade_data['Port_ID'])
+    port_ids = np.asarray(port_ids)
+    n = len(port_ids)
+
+    valid = codes >= 0
+    order = np.argsort(codes[valid], kind='stable')
+    index = np.flatnonzero(valid)[order]
+    groups = codes[index]
+
+    position_type = position_codes(trade_data['position_type'])[index]
+    profit = trade_data['realizedProfit'].to_numpy(dtype=np.float64)[index]
+    quantity = trade_data['quantity'].to_numpy(dtype=np.float64)[index]
+
+    is_close = (position_type == POSITION_CODES['long_close']) | (position_type == POSITION_CODES['short_close'])
+    is_open = (position_type == POSITION_CODES['long_open']) | (position_type == POSITION_CODES['short_open'])
+    is_win = profit > 0
+    is_loss = profit < 0
+
+    # Daily returns per portfolio, laid out contiguously by portfolio then day
+    daily = daily_pnl(groups, trade_data['timestamp'].iloc[index], profit)
+
+    return {
+        'port_ids': port_ids,
+        'total_profit': segment_sum(profit, groups, n),
+        'total_investment': segment_sum(quantity[is_open], groups[is_open], n),
+        'win_positions': np.bincount(groups[is_win], minlength=n),
+        'total_positions': np.bincount(groups[is_close], minlength=n),
+        'gross_profit': segment_sum(profit[is_win], groups[is_win], n),
+        'gross_loss': segment_sum(profit[is_loss], groups[is_loss], n),
+        'day_groups': daily.index.get_level_values(0).to_numpy(),
+        'day_keys': daily.index.get_level_values(1).to_numpy(),
+        'day_values': daily.to_numpy(),
+    }
+
+
+def metrics_from_aggregates(aggregates: dict) -> pd.DataFrame:
+    """
+    Sharpe ratio and drawdown from the daily series, then the calculate_metrics columns
+    """
+    n = len(aggregates['port_ids'])
+    day_groups = aggregates['day_groups']
+    day_values = aggregates['day_values']
+    n_days = np.bincount(day_groups, minlength=n)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Same mean/std formulas as Series.mean() / Series.std(ddof=1)
+        mean = segment_sum(day_values, day_groups, n) / n_days
+        sq_dev = (mean[day_groups] - day_values) ** 2
+        std = np.sqrt(segment_sum(sq_dev, day_groups, n) / (n_days - 1))
+
+        # Maximum drawdown of the compounded daily series, segment-wise
+        cumulative = pd.Series(1 + day_values).groupby(day_groups).cumprod()
+        rolling_max = cumulative.groupby(day_groups).cummax()
+        drawdowns = (cumulative / rolling_max - 1).groupby(day_groups).min()
+    min_drawdown = np.zeros(n, dtype=np.float64)
+    min_drawdown[drawdowns.index.to_numpy()] = drawdowns.to_numpy()
+
+    return finalize_metrics(aggregates['port_ids'], aggregates['total_profit'], aggregates['total_investment'],
+                            aggregates['win_positions'], aggregates['total_positions'],
+                            aggregates['gross_profit'], aggregates['gross_loss'], n_days, mean, std, min_drawdown)
+
+
+def compute_portfolio_metrics(trade_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute the calculate_metrics output for every portfolio in one grouped pass
+    """
+    aggregates = portfolio_aggregates(trade_data)
+    if len(aggregates['port_ids']) == 0:
+        return pd.DataFrame()
+    return metrics_from_aggregates(aggregates)
+
+
+def finalize_metrics(port_ids, total_profit, total_investment, win_positions, total_positions,
+                     gross_profit, gross_loss, n_days, mean, std, min_drawdown) -> pd.DataFrame:
+    """
+    Turn per-portfolio aggregates into the calculate_metrics columns and rounding
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        no_investment = total_investment == 0
+        roi = np.where(no_investment, 0.0, total_profit / total_investment * 100)
+
+        no_positions = total_positions == 0
+        win_rate = np.where(no_positions, 0.0, win_positions / total_positions * 100)
+        avg_profit = np.where(no_positions, 0.0, total_profit / total_positions)
+
+        profit_factor = np.where(np.abs(gross_loss) != 0, np.abs(gross_profit) / np.abs(gross_loss), np.inf)
+
+        no_sharpe = (n_days <= 1) | (std == 0)
+        sharpe = np.where(no_sharpe, 0.0, np.sqrt(252) * (mean / std))
+
+        no_days = n_days == 0
+        mdd = np.where(no_days, 0.0, min_drawdown * 100)
+
+    results = pd.DataFrame({
+        'Port_ID': port_ids,
+        'ROI': _zero_branch(np.round(roi, 2), no_investment),
+        'PnL': np.round(total_profit, 2),
+        'Sharpe_Ratio': _zero_branch(np.round(sharpe, 2), no_sharpe),
+        'MDD': _zero_branch(np.round(mdd, 2), no_days),
+        'Win_Rate': _zero_branch(np.round(win_rate, 2), no_positions),
+        'Win_Positions': win_positions,
+        'Total_Positions': total_positions,
+        'Avg_Profit_Per_Trade': _zero_branch(np.round(avg_profit, 2), no_positions),
+        'Profit_Factor': np.round(profit_factor, 2),
+    })
+    return results[METRIC_COLUMNS]
@@ -0,0 +1,359 @@
+import json
+import logging
+import math
+import os
+import signal
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from ranking import DEFAULT_WEIGHTS, rank_portfolios
+
+DEFAULT_CACHE_SIZE = 512
+DEFAULT_RELOAD_INTERVAL = 2.0
+MAX_TOP_N = 10_000
+
+
+class QueryError(Exception):
+    """
+    A request that can be answered with an HTTP error status
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache of encoded responses
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def _clean(value):
+    """
+    JSON-safe scalar: numpy types unwrapped, NaN/inf as null, timestamps as ISO strings
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return None if pd.isna(value) else value.isoformat()
+    return value
+
+
+def _records(frame: pd.DataFrame):
+    records = []
+    for row in frame.to_dict('records'):
+        record = {column: _clean(value) for column, value in row.items()}
+        # 19-digit Port_IDs do not survive JSON number parsing in most clients
+        record['Port_ID'] = str(record['Port_ID'])
+        records.append(record)
+    return records
+
+
+class Snapshot:
+    """
+    One loaded version of the dataset: the analyzer with its trade table, the
+    per-portfolio metrics and a Port_ID -> row lookup. Requests read a snapshot
+    and never modify it, so any number of them can run concurrently.
+    """
+
+    def __init__(self, analyzer, version: int, source_state: Tuple[int, int]):
+        self.analyzer = analyzer
+        self.version = version
+        self.source_state = source_state
+        self.loaded_at = time.time()
+        self.results = analyzer.analyze_all_portfolios()
+        self.rows = {str(port_id): i for i, port_id in enumerate(self.results['Port_ID'].tolist())}
+        self.summary = {name: _clean(value) for name, value in analyzer.summary_stats(self.results).items()}
+
+
+class QueryService:
+    """
+    Keeps a TradingAnalyzer's trade table and portfolio metrics resident and
+    answers queries against them: metrics by Port_ID, top N with custom weights
+    and the summary statistics. Encoded responses go through an LRU cache keyed
+    by the dataset version; a watcher thread reloads the data in the background
+    when the source file changes and swaps the new snapshot in atomically, so
+    readers never wait for a reload.
+    """
+
+    def __init__(self, data_path: Path, project_root: Path, cache_size: int = DEFAULT_CACHE_SIZE,
+                 reload_interval: float = DEFAULT_RELOAD_INTERVAL, use_cache: bool = True,
+                 logger: Optional[logging.Logger] = None):
+        self.data_path = Path(data_path)
+        self.project_root = Path(project_root)
+        self.reload_interval = reload_interval
+        self.use_cache = use_cache
+        self.logger = logger or logging.getLogger(__name__)
+        self.cache = LRUCache(cache_size)
+        self.snapshot: Optional[Snapshot] = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self.requests = 0
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def source_state(self) -> Tuple[int, int]:
+        stat = self.data_path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def load(self) -> Snapshot:
+        """
+        Load the source file into a new snapshot and make it current
+        """
+        from trading_analyzer import TradingAnalyzer
+
+        with self._reload_lock:
+            start = time.perf_counter()
+            state = self.source_state()
+            analyzer = TradingAnalyzer(self.project_root, setup_dirs=False)
+            analyzer.load_data(self.data_path, use_cache=self.use_cache)
+            analyzer.calculate_position_type()
+            version = self.snapshot.version + 1 if self.snapshot is not None else 1
+            snapshot = Snapshot(analyzer, version, state)
+            self.snapshot = snapshot
+            # Entries of older versions can never be hit again
+            self.cache.clear()
+            self.logger.info(f"Loaded dataset version {version} ({snapshot.summary['total_trades']:,} trades, "
+                             f"{len(snapshot.rows):,} portfolios) in {time.perf_counter() - start:.2f}s")
+            return snapshot
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload when the source file's size or mtime changed; the old snapshot keeps
+        serving until the new one is ready, and also if loading fails
+        """
+        try:
+            if self.snapshot is not None and self.source_state() == self.snapshot.source_state:
+                return False
+            self.load()
+            self.reloads += 1
+            return True
+        except Exception as e:
+            self.reload_errors += 1
+            self.logger.error(f"Error reloading {self.data_path}: {str(e)}")
+            return False
+
+    def start_watcher(self) -> None:
+        def watch():
+            while not self._stop.wait(self.reload_interval):
+                self.reload_if_changed()
+
+        if self.reload_interval and self.reload_interval > 0:
+            self._watcher = threading.Thread(target=watch, name='query-service-reload', daemon=True)
+            self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def query(self, path: str, query_string: str = '') -> Tuple[int, bytes]:
+        """
+        Answer one request; returns (HTTP status, JSON body)
+        """
+        self.requests += 1
+        snapshot = self.snapshot
+        path = '/' + unquote(path).strip('/')
+        if path == '/stats':
+            return 200, self._encode(self.stats())
+
+        params = parse_qs(query_string, keep_blank_values=True)
+        key = (snapshot.version, path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            if path == '/health':
+                body = {'status': 'ok', 'version': snapshot.version, 'loaded_at': snapshot.loaded_at,
+                        'trades': snapshot.summary['total_trades'], 'portfolios': len(snapshot.rows)}
+            elif path == '/summary':
+                body = snapshot.summary
+            elif path == '/top':
+                body = self._top(snapshot, params)
+            elif path.startswith('/portfolios/'):
+                body = self._portfolio(snapshot, path[len('/portfolios/'):])
+            else:
+                raise QueryError(404, f"Unknown endpoint {path}")
+            response = (200, self._encode(body))
+        except QueryError as e:
+            response = (e.status, self._encode({'error': str(e)}))
+        self.cache.put(key, response)
+        return response
+
+    @staticmethod
+    def _encode(body) -> bytes:
+        return json.dumps(body, allow_nan=False).encode('utf-8')
+
+    @staticmethod
+    def _portfolio(snapshot: Snapshot, port_id: str) -> Dict:
+        row = snapshot.rows.get(port_id.strip())
+        if row is None:
+            raise QueryError(404, f"Unknown Port_ID {port_id}")
+        return _records(snapshot.results.iloc[[row]])[0]
+
+    @staticmethod
+    def _top(snapshot: Snapshot, params: Dict) -> Dict:
+        """
+        /top?n=20&weights=ROI:0.5,Sharpe_Ratio:0.5 (default: the ranking.py weights)
+        """
+        try:
+            n = int(params.get('n', ['20'])[-1])
+        except ValueError:
+            raise QueryError(400, "n must be an integer")
+        if not 0 < n <= MAX_TOP_N:
+            raise QueryError(400, f"n must be between 1 and {MAX_TOP_N}")
+
+        weights = None
+        if params.get('weights', [''])[-1]:
+            weights = {}
+            for item in params['weights'][-1].split(','):
+                metric, _, weight = item.partition(':')
+                metric = metric.strip()
+                if metric not in DEFAULT_WEIGHTS and metric not in snapshot.results.columns:
+                    raise QueryError(400, f"Unknown metric {metric}")
+                try:
+                    weights[metric] = float(weight)
+                except ValueError:
+                    raise QueryError(400, f"Weight for {metric} must be a number")
+        top = rank_portfolios(snapshot.results, n, weights)
+        return {'weights': weights or DEFAULT_WEIGHTS, 'portfolios': _records(top)}
+
+    def stats(self) -> Dict:
+        snapshot = self.snapshot
+        return {
+            'version': snapshot.version,
+            'source': str(self.data_path),
+            'loaded_at': snapshot.loaded_at,
+            'requests': self.requests,
+            'cache_entries': len(self.cache),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'reloads': self.reloads,
+            'reload_errors': self.reload_errors,
+        }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    GET-only JSON endpoint; HTTP/1.1 so clients can keep connections open
+    """
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; without TCP_NODELAY the body waits
+    # for the client's delayed ACK (~40 ms) on every keep-alive request
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            status, body = self.server.service.query(url.path, url.query)
+        except Exception as e:
+            self.server.service.logger.error(f"Error answering {self.path}: {str(e)}")
+            status, body = 500, json.dumps({'error': str(e)}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        self.server.service.logger.debug(f"{self.address_string()} {format % args}")
+
+
+class UnixQueryHandler(QueryHandler):
+    disable_nagle_algorithm = False
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: QueryService, host: str = '127.0.0.1', port: int = 8765,
+                socket_path: Optional[str] = None):
+    """
+    Threaded HTTP server for the service, on a Unix socket if socket_path is given
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, UnixQueryHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), QueryHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(service: QueryService, host: str = '127.0.0.1', port: int = 8765,
+          socket_path: Optional[str] = None) -> None:
+    """
+    Load the data, start the reload watcher and serve until interrupted (SIGINT or SIGTERM)
+    """
+    service.load()
+    service.start_watcher()
+    server = make_server(service, host, port, socket_path)
+    address = socket_path or f"http://{host}:{server.server_address[1]}"
+    service.logger.info(f"Query service listening on {address}")
+    print(f"Serving {service.data_path} on {address} (Ctrl+C to stop)")
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -0,0 +1,131 @@
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# Define weights for each metric
+DEFAULT_WEIGHTS = {
+    'ROI': 0.3,
+    'Sharpe_Ratio': 0.25,
+    'Win_Rate': 0.2,
+    'MDD': 0.15,  # Note: Higher MDD is worse
+    'Profit_Factor': 0.1
+}
+
+# Metrics where a lower value is better get inverse normalization
+INVERSE_METRICS = {'MDD'}
+
+OUTPUT_COLUMNS = ['Port_ID', 'ROI', 'PnL', 'Sharpe_Ratio', 'MDD',
+                  'Win_Rate', 'Win_Positions', 'Total_Positions',
+                  'Avg_Profit_Per_Trade', 'Profit_Factor', 'total_score']
+
+Scenarios = Union[Sequence[Dict[str, float]], np.ndarray]
+
+
+def normalized_metrics(results_df: pd.DataFrame, metrics: Sequence[str]) -> np.ndarray:
+    """
+    Min-max normalize metric columns into a (portfolios x metrics) matrix.
+    A column with zero range (every portfolio equal) normalizes to 0 instead of NaN.
+    """
+    values = results_df[list(metrics)].to_numpy(dtype=np.float64)
+    matrix = np.empty_like(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for j, metric in enumerate(metrics):
+            column = values[:, j]
+            low, high = np.nanmin(column), np.nanmax(column)
+            if high - low == 0:
+                scaled = np.zeros_like(column)
+            else:
+                scaled = (column - low) / (high - low)
+            matrix[:, j] = 1 - scaled if metric in INVERSE_METRICS else scaled
+    return matrix
+
+
+def weight_matrix(scenarios: Scenarios, metrics: Optional[Sequence[str]] = None):
+    """
+    Turn a list of weight dicts (or an array) into a (scenarios x metrics) matrix
+    """
+    if isinstance(scenarios, np.ndarray):
+        metrics = list(metrics or DEFAULT_WEIGHTS)
+        return np.atleast_2d(scenarios).astype(np.float64), metrics
+
+    if metrics is None:
+        metrics = []
+        for weights in scenarios:
+            metrics.extend(metric for metric in weights if metric not in metrics)
+    matrix = np.array([[weights.get(metric, 0.0) for metric in metrics] for weights in scenarios],
+                      dtype=np.float64)
+    return matrix, list(metrics)
+
+
+def score_matrix(normalized: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Scores of every portfolio under every weighting, shape (scenarios x portfolios).
+
+    This is weights @ normalized.T, accumulated one metric at a time so each
+    scenario's score is bit-identical to the single-weighting sum.
+    """
+    scores = np.zeros((weights.shape[0], normalized.shape[0]))
+    term = np.empty_like(scores)
+    for j in range(normalized.shape[1]):
+        np.multiply(weights[:, j, None], normalized[None, :, j], out=term)
+        scores += term
+    return scores
+
+
+def top_n_indices(scores: np.ndarray, n: int) -> np.ndarray:
+    """
+    Row indices of the n largest scores, best first, using partial selection.
+    NaN scores are never selected and ties keep the earlier row, like nlargest.
+    """
+    valid = np.flatnonzero(~np.isnan(scores))
+    n = min(n, len(valid))
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    values = scores[valid]
+    if n < len(values):
+        threshold = values[np.argpartition(-values, n - 1)[n - 1]]
+        above = valid[values > threshold]
+        tied = valid[values == threshold][:n - len(above)]
+        chosen = np.concatenate([above, tied])
+    else:
+        chosen = valid
+    # Sort the selection by score descending, then by original position
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
+
+
+def rank_scenarios(results_df: pd.DataFrame, scenarios: Scenarios, n: int = 20,
+                   metrics: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Rank portfolios under many weightings at once. Returns a long table with the
+    top N rows per scenario (columns 'scenario', 'rank' and OUTPUT_COLUMNS).
+    """
+    weights, metrics = weight_matrix(scenarios, metrics)
+    scores = score_matrix(normalized_metrics(results_df, metrics), weights)
+
+    tops = [top_n_indices(scores[s], n) for s in range(weights.shape[0])]
+    rows = np.concatenate(tops) if tops else np.zeros(0, dtype=np.int64)
+    scenario = np.repeat(np.arange(len(tops)), [len(top) for top in tops])
+
+    # One gather for every scenario instead of a frame per scenario
+    ranking = results_df.iloc[rows].reset_index(drop=True)
+    ranking['total_score'] = scores[scenario, rows]
+    ranking.insert(0, 'rank', np.concatenate([np.arange(1, len(top) + 1) for top in tops]) if tops else rows)
+    ranking.insert(0, 'scenario', scenario)
+    return ranking[['scenario', 'rank'] + OUTPUT_COLUMNS]
+
+
+def rank_portfolios(results_df: pd.DataFrame, n: int = 20,
+                    weights: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """
+    Score portfolios with min-max normalized weighted metrics and return the top N
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    matrix, metrics = weight_matrix([weights])
+    scores = score_matrix(normalized_metrics(results_df, metrics), matrix)[0]
+
+    top = top_n_indices(scores, n)
+    top_portfolios = results_df.iloc[top].copy()
+    top_portfolios['total_score'] = scores[top]
+    return top_portfolios[OUTPUT_COLUMNS]
@@ -0,0 +1,142 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from metrics_engine import daily_pnl
+
+DEFAULT_WINDOWS = (7, 30, 90)
+ROLLING_COLUMNS = ['Port_ID', 'date', 'window', 'Sharpe_Ratio', 'MDD']
+
+# Portfolio rows per block when materializing (rows x days x window) drawdown windows
+_DRAWDOWN_BLOCK_CELLS = 4_000_000
+
+
+def daily_pnl_matrix(trade_data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Dense (portfolio x calendar day) realized PnL matrix.
+
+    Returns (port_ids, days as datetime64[D], matrix). Days without trades between
+    a portfolio's first and last trading day are 0; days outside that span are NaN.
+    """
+    codes, port_ids = pd.factorize(trade_data['Port_ID'])
+    valid = codes >= 0
+    profit = trade_data['realizedProfit'].to_numpy(dtype=np.float64)
+    daily = daily_pnl(codes[valid], trade_data['timestamp'][valid], profit[valid])
+
+    day_groups = daily.index.get_level_values(0).to_numpy()
+    day_keys = daily.index.get_level_values(1).to_numpy()
+    n = len(port_ids)
+    if len(daily) == 0:
+        return np.asarray(port_ids), np.zeros(0, dtype='datetime64[D]'), np.zeros((n, 0))
+
+    first_day = day_keys.min()
+    columns = day_keys - first_day
+    n_days = int(columns.max()) + 1
+
+    matrix = np.full((n, n_days), np.nan)
+    starts = np.full(n, n_days, dtype=np.int64)
+    ends = np.full(n, -1, dtype=np.int64)
+    np.minimum.at(starts, day_groups, columns)
+    np.maximum.at(ends, day_groups, columns)
+    day_index = np.arange(n_days)
+    matrix[(day_index >= starts[:, None]) & (day_index <= ends[:, None])] = 0.0
+    matrix[day_groups, columns] = daily.to_numpy()
+
+    days = (first_day + day_index).astype('datetime64[D]')
+    return np.asarray(port_ids), days, matrix
+
+
+def rolling_sharpe(matrix: np.ndarray, window: int) -> np.ndarray:
+    """
+    Annualized Sharpe over trailing windows, from cumulative sums and sums of squares.
+    Column t covers days t-window+1..t; incomplete windows are NaN and a zero
+    standard deviation gives 0, like calculate_metrics.
+    """
+    n_rows, n_days = matrix.shape
+    sharpe = np.full((n_rows, n_days), np.nan)
+    if window < 2 or n_days < window:
+        return sharpe
+
+    # Center each row first so the sum of squares does not cancel catastrophically;
+    # days outside the trading span add nothing and are counted separately
+    active = ~np.isnan(matrix)
+    offset = np.zeros((n_rows, 1))
+    has_days = active.any(axis=1)
+    offset[has_days, 0] = np.nanmean(matrix[has_days], axis=1)
+    centered = np.where(active, matrix - offset, 0.0)
+
+    cum = np.zeros((n_rows, n_days + 1))
+    cum_sq = np.zeros((n_rows, n_days + 1))
+    count = np.zeros((n_rows, n_days + 1), dtype=np.int64)
+    np.cumsum(centered, axis=1, out=cum[:, 1:])
+    np.cumsum(centered ** 2, axis=1, out=cum_sq[:, 1:])
+    np.cumsum(active, axis=1, out=count[:, 1:])
+
+    sums = cum[:, window:] - cum[:, :-window]
+    sq_sums = cum_sq[:, window:] - cum_sq[:, :-window]
+    complete = (count[:, window:] - count[:, :-window]) == window
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = sums / window
+        var = np.maximum(sq_sums - sums * mean, 0.0) / (window - 1)
+        # Treat variance lost in rounding (e.g. a run of idle days) as zero
+        flat = var <= 1e-12 * sq_sums / (window - 1)
+        values = np.where(flat, 0.0, np.sqrt(252) * (mean + offset) / np.sqrt(var))
+    values[~complete] = np.nan
+    sharpe[:, window - 1:] = values
+    return sharpe
+
+
+def rolling_drawdown(matrix: np.ndarray, window: int) -> np.ndarray:
+    """
+    Maximum drawdown (%) within each trailing window, compounding (1 + daily PnL)
+    like calculate_metrics does over the full history
+    """
+    n_rows, n_days = matrix.shape
+    mdd = np.full((n_rows, n_days), np.nan)
+    if window < 1 or n_days < window:
+        return mdd
+
+    block = max(1, _DRAWDOWN_BLOCK_CELLS // ((n_days - window + 1) * window))
+    with np.errstate(invalid='ignore', over='ignore', divide='ignore'):
+        for start in range(0, n_rows, block):
+            windows = sliding_window_view(1 + matrix[start:start + block], window, axis=1)
+            cumulative = np.cumprod(windows, axis=2)
+            drawdowns = cumulative / np.fmax.accumulate(cumulative, axis=2) - 1
+            values = np.fmin.reduce(drawdowns, axis=2) * 100
+            values[np.isnan(windows).any(axis=2)] = np.nan
+            mdd[start:start + block, window - 1:] = values
+    return mdd
+
+
+def rolling_metrics(trade_data: pd.DataFrame, windows: Sequence[int] = DEFAULT_WINDOWS) -> pd.DataFrame:
+    """
+    Long table of rolling Sharpe and MDD per portfolio, day and window.
+    Only days with a complete window inside the portfolio's trading span are kept.
+    """
+    port_ids, days, matrix = daily_pnl_matrix(trade_data)
+    active = np.zeros((matrix.shape[0], matrix.shape[1] + 1), dtype=np.int64)
+    np.cumsum(~np.isnan(matrix), axis=1, out=active[:, 1:])
+
+    frames = []
+    for window in windows:
+        if window > matrix.shape[1]:
+            continue
+        sharpe = rolling_sharpe(matrix, window)
+        mdd = rolling_drawdown(matrix, window)
+        rows, columns = np.nonzero(active[:, window:] - active[:, :-window] == window)
+        columns = columns + window - 1
+        frames.append(pd.DataFrame({
+            'Port_ID': port_ids[rows],
+            'date': days[columns],
+            'window': np.full(len(rows), window, dtype=np.int16),
+            'Sharpe_Ratio': np.round(sharpe[rows, columns], 2),
+            'MDD': np.round(mdd[rows, columns], 2),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=ROLLING_COLUMNS)
+
+    result = pd.concat(frames, ignore_index=True)
+    result['Port_ID'] = result['Port_ID'].astype('category')
+    return result[ROLLING_COLUMNS]
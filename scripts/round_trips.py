@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+from trade_schema import POSITION_CODES, position_codes
+
+GROUP_COLUMNS = ['Port_ID', 'symbol', 'positionSide']
+ROUND_TRIP_COLUMNS = GROUP_COLUMNS + ['position', 'entry_time', 'exit_time', 'holding_period', 'qty',
+                                      'entry_price', 'exit_price', 'realized_pnl', 'fee', 'closed']
+POSITION_COLUMNS = GROUP_COLUMNS + ['position', 'entry_time', 'exit_time', 'holding_period', 'qty',
+                                    'avg_entry_price', 'avg_exit_price', 'realized_pnl', 'fee', 'lots', 'closed']
+
+# Cumulative quantities are rounded to this many decimals so float noise in
+# the running sums never produces zero-size lots or a missed flat position
+_QTY_DECIMALS = 10
+
+
+def _group_cumsum(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    return pd.Series(values).groupby(groups).cumsum().to_numpy()
+
+
+def _next_in_group(flags: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    For every position, the first position at or after it (same group) where
+    flags is set, else -1; groups must be sorted
+    """
+    n = len(flags)
+    candidates = np.where(flags, np.arange(n), n)
+    following = np.minimum.accumulate(candidates[::-1])[::-1]
+    found = following < n
+    found[found] &= groups[following[found]] == groups[found]
+    return np.where(found, following, -1)
+
+
+def round_trips(trade_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    FIFO round trips: every opening fill is matched against the closing fills
+    of the same (Port_ID, symbol, positionSide) in time order on qty, giving
+    one row per matched (open fill, close fill) lot.
+
+    Matching is done on cumulative quantities instead of a per-fill queue: in a
+    group the opens cover [0, total opened) and the closes [0, total closed), one
+    interval per fill, so each lot is one piece of the union of both interval
+    boundaries, found with a single sort. Fills in the same millisecond put opens
+    first; closes of quantity never opened (history starting mid-position) are
+    dropped, and quantity still open at the end of the history is not reported.
+    realized_pnl and fee are the fills' realizedProfit and fee pro-rated by the
+    lot's share of each fill. `position` numbers the flat-to-flat positions of a
+    group, so several lots (partial fills) make up one position; `closed` is
+    False for lots of a position that is still open at the end of the history.
+    """
+    codes = position_codes(trade_data['position_type'])
+    is_open = (codes == POSITION_CODES['long_open']) | (codes == POSITION_CODES['short_open'])
+    is_close = (codes == POSITION_CODES['long_close']) | (codes == POSITION_CODES['short_close'])
+    qty = trade_data['qty'].to_numpy(dtype=np.float64)
+    timestamps = trade_data['timestamp'].to_numpy(dtype='datetime64[ns]')
+    keep = np.flatnonzero((is_open | is_close) & (qty > 0) & ~np.isnat(timestamps))
+    if len(keep) == 0:
+        return pd.DataFrame(columns=ROUND_TRIP_COLUMNS)
+
+    trades = trade_data.iloc[keep]
+    groups = trades.groupby(GROUP_COLUMNS, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    is_open, qty, timestamps = is_open[keep], qty[keep], timestamps[keep]
+    # Group, then time, then opens before closes, then file order (lexsort is stable)
+    order = np.lexsort((~is_open, timestamps.view(np.int64), groups))
+    groups, is_open, qty = groups[order], is_open[order], qty[order]
+
+    # Net position in time order; closing below zero is quantity never opened
+    net = _group_cumsum(np.where(is_open, qty, -qty), groups)
+    orphaned = -np.minimum(pd.Series(net).groupby(groups).cummin().to_numpy(), 0)
+    orphaned = np.round(orphaned, _QTY_DECIMALS)
+    previous = np.concatenate([[0.0], orphaned[:-1]])
+    previous[np.flatnonzero(np.diff(groups)) + 1] = 0.0
+    close_qty = np.where(is_open, 0.0, np.maximum(qty - (orphaned - previous), 0.0))
+
+    # Flat-to-flat position number of every fill
+    flat = np.round(net + orphaned, _QTY_DECIMALS) <= 0
+    position = _group_cumsum(flat.astype(np.int64), groups) - flat
+    # A position is closed if one of its fills brings the group back to flat
+    position_key = groups.astype(np.int64) * (int(position.max()) + 1) + position
+    closed_keys = np.unique(position_key[flat])
+
+    opened = np.round(_group_cumsum(np.where(is_open, qty, 0.0), groups), _QTY_DECIMALS)
+    closed = np.round(_group_cumsum(close_qty, groups), _QTY_DECIMALS)
+
+    # Interval ends of both sides, sorted by group and cumulative quantity
+    fills = np.concatenate([np.flatnonzero(is_open), np.flatnonzero(close_qty > 0)])
+    event_open = np.concatenate([np.ones(is_open.sum(), dtype=bool), np.zeros((close_qty > 0).sum(), dtype=bool)])
+    event_cum = np.where(event_open, opened[fills], closed[fills])
+    event_groups = groups[fills]
+    event_order = np.lexsort((event_cum, event_groups))
+    fills, event_open = fills[event_order], event_open[event_order]
+    event_cum, event_groups = event_cum[event_order], event_groups[event_order]
+
+    # Each event ends the piece that starts at the previous event of its group
+    starts = np.concatenate([[0.0], event_cum[:-1]])
+    starts[np.flatnonzero(np.diff(event_groups)) + 1] = 0.0
+    if len(event_groups):
+        starts[0] = 0.0
+    size = np.round(event_cum - starts, _QTY_DECIMALS)
+    open_event = _next_in_group(event_open, event_groups)
+    close_event = _next_in_group(~event_open, event_groups)
+    matched = (size > 0) & (open_event >= 0) & (close_event >= 0)
+
+    open_sorted = fills[open_event[matched]]
+    open_fill = order[open_sorted]
+    close_fill = order[fills[close_event[matched]]]
+    size = size[matched]
+    open_rows, close_rows = trades.iloc[open_fill], trades.iloc[close_fill]
+    open_qty = open_rows['qty'].to_numpy(dtype=np.float64)
+    close_fill_qty = close_rows['qty'].to_numpy(dtype=np.float64)
+
+    entry_time = open_rows['timestamp'].to_numpy(dtype='datetime64[ns]')
+    exit_time = close_rows['timestamp'].to_numpy(dtype='datetime64[ns]')
+    result = pd.DataFrame({
+        'Port_ID': open_rows['Port_ID'].to_numpy(),
+        'symbol': open_rows['symbol'].to_numpy(),
+        'positionSide': open_rows['positionSide'].to_numpy(),
+        'position': position[open_sorted],
+        'entry_time': entry_time,
+        'exit_time': exit_time,
+        'holding_period': exit_time - entry_time,
+        'qty': size,
+        'entry_price': open_rows['price'].to_numpy(dtype=np.float64),
+        'exit_price': close_rows['price'].to_numpy(dtype=np.float64),
+        'realized_pnl': close_rows['realizedProfit'].to_numpy(dtype=np.float64) * size / close_fill_qty,
+        'fee': (open_rows['fee'].to_numpy(dtype=np.float64) * size / open_qty
+                + close_rows['fee'].to_numpy(dtype=np.float64) * size / close_fill_qty),
+        'closed': np.isin(position_key[open_sorted], closed_keys),
+    })
+    # Lots of a group are already in FIFO (cumulative quantity) order
+    return result
+
+
+def positions(trips: pd.DataFrame) -> pd.DataFrame:
+    """
+    Collapse round-trip lots into flat-to-flat positions: first entry, last exit,
+    total and quantity-weighted average prices, summed PnL and fees
+    """
+    if len(trips) == 0:
+        return pd.DataFrame(columns=POSITION_COLUMNS)
+    trips = trips.assign(entry_value=trips['entry_price'] * trips['qty'],
+                         exit_value=trips['exit_price'] * trips['qty'])
+    grouped = trips.groupby(GROUP_COLUMNS + ['position'], sort=False, observed=True, dropna=False)
+    result = grouped.agg(entry_time=('entry_time', 'min'), exit_time=('exit_time', 'max'), qty=('qty', 'sum'),
+                         entry_value=('entry_value', 'sum'), exit_value=('exit_value', 'sum'),
+                         realized_pnl=('realized_pnl', 'sum'), fee=('fee', 'sum'),
+                         lots=('qty', 'size'), closed=('closed', 'all')).reset_index()
+    result['holding_period'] = result['exit_time'] - result['entry_time']
+    result['avg_entry_price'] = result['entry_value'] / result['qty']
+    result['avg_exit_price'] = result['exit_value'] / result['qty']
+    return result[POSITION_COLUMNS]
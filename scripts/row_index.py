@@ -0,0 +1,189 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Bump whenever the index layout changes
+INDEX_SCHEMA_VERSION = 1
+
+_CSV_FIELD_LIMIT = 2 ** 31 - 1
+
+
+class RowIndex:
+    """
+    Sidecar index of a trade history CSV: the byte offset and length of every
+    row, keyed by Port_ID, so single portfolios can be read without parsing the
+    rest of the file.
+
+    The index is built with one binary scan that only counts quotes and finds
+    the Port_ID field, and is stored as .npy arrays plus a manifest. It is keyed
+    by the CSV's size and mtime (a full content hash would cost as much as the
+    scan); rows are also checked against their Port_ID when read, and any
+    mismatch rebuilds the index.
+    """
+
+    def __init__(self, source_path: Path, index_dir: Path, logger: Optional[logging.Logger] = None):
+        self.source_path = Path(source_path)
+        self.logger = logger or logging.getLogger(__name__)
+        source_key = hashlib.sha1(str(self.source_path.resolve()).encode()).hexdigest()[:12]
+        self.index_dir = Path(index_dir) / f"{self.source_path.stem}-{source_key}"
+        self.port_ids: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        self.lengths: Optional[np.ndarray] = None
+        self._rows: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, port_id) -> bool:
+        return str(port_id) in self._rows
+
+    def _source_state(self) -> Dict:
+        stat = self.source_path.stat()
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def load(self) -> bool:
+        """
+        Load the stored index if it matches the current CSV
+        """
+        try:
+            with open(self.index_dir / 'manifest.json') as f:
+                manifest = json.load(f)
+            if manifest.get('schema_version') != INDEX_SCHEMA_VERSION or manifest.get('source') != self._source_state():
+                return False
+            port_ids = np.load(self.index_dir / 'port_ids.npy', allow_pickle=False)
+            offsets = np.load(self.index_dir / 'offsets.npy', allow_pickle=False)
+            lengths = np.load(self.index_dir / 'lengths.npy', allow_pickle=False)
+        except (OSError, ValueError):
+            return False
+        self._set(port_ids, offsets, lengths)
+        return True
+
+    def _set(self, port_ids: np.ndarray, offsets: np.ndarray, lengths: np.ndarray) -> None:
+        self.port_ids, self.offsets, self.lengths = port_ids, offsets, lengths
+        self._rows = {}
+        for row, port_id in enumerate(port_ids.tolist()):
+            self._rows.setdefault(port_id, []).append(row)
+
+    def ensure(self) -> 'RowIndex':
+        """
+        Load the index, rebuilding it first if it is missing or stale
+        """
+        if not self.load():
+            self.build()
+        return self
+
+    def build(self) -> None:
+        """
+        Scan the CSV once and store (Port_ID, offset, length) for every row
+        """
+        start = time.perf_counter()
+        state = self._source_state()
+        port_ids, offsets, lengths = [], [], []
+        with open(self.source_path, 'rb') as f:
+            header = f.readline()
+            columns = [column.strip() for column in next(csv.reader([header.decode('utf-8')]), [])]
+            if 'Port_IDs' not in columns:
+                raise KeyError("Missing expected column 'Port_IDs' in CSV.")
+            id_index = columns.index('Port_IDs')
+
+            offset = row_start = len(header)
+            quotes = 0
+            for line in f:
+                if quotes == 0:
+                    row_start = offset
+                    first_line = line
+                quotes += line.count(b'"')
+                offset += len(line)
+                # An odd quote count means a quoted field continues on the next line
+                if quotes % 2:
+                    continue
+                quotes = 0
+                if not line.strip(b'\r\n') and offset - row_start == len(line):
+                    continue
+                port_id = self._port_id(first_line, id_index)
+                if port_id is None:
+                    port_id = self._row_fields(self._read(row_start, offset - row_start))[id_index].strip()
+                port_ids.append(port_id)
+                offsets.append(row_start)
+                lengths.append(offset - row_start)
+
+        self._set(np.array(port_ids, dtype=str), np.array(offsets, dtype=np.int64), np.array(lengths, dtype=np.int64))
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        for name, values in [('port_ids', self.port_ids), ('offsets', self.offsets), ('lengths', self.lengths)]:
+            np.save(self.index_dir / f"{name}.npy", values, allow_pickle=False)
+        tmp_path = self.index_dir / 'manifest.json.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'schema_version': INDEX_SCHEMA_VERSION, 'source': state}, f)
+        os.replace(tmp_path, self.index_dir / 'manifest.json')
+        self.logger.info(f"Indexed {len(offsets):,} rows for {len(self):,} portfolios of {self.source_path} "
+                         f"in {time.perf_counter() - start:.2f}s")
+
+    @staticmethod
+    def _port_id(line: bytes, id_index: int) -> Optional[str]:
+        """
+        Port_ID from the first physical line of a row when the fields before it
+        are unquoted; None if the row needs the csv module
+        """
+        fields = line.split(b',', id_index + 1)
+        if len(fields) <= id_index or any(b'"' in field for field in fields[:id_index + 1]):
+            return None
+        return fields[id_index].strip(b'\r\n').decode('utf-8').strip()
+
+    @staticmethod
+    def _row_fields(text: bytes) -> List[str]:
+        csv.field_size_limit(_CSV_FIELD_LIMIT)
+        return next(csv.reader(io.StringIO(text.decode('utf-8'), newline='')), [])
+
+    def _read(self, offset: int, length: int) -> bytes:
+        with open(self.source_path, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def read_rows(self, port_ids: Iterable) -> List[Tuple[str, str]]:
+        """
+        (Port_ID, Trade_History) for the rows of the given portfolios in file
+        order, read from a memory map of the CSV; unknown Port_IDs are skipped
+        """
+        if self.port_ids is None:
+            self.ensure()
+        port_ids = [str(port_id).strip() for port_id in port_ids]
+        rows = self._fetch(port_ids)
+        if rows is None:
+            # Same size and mtime but different content: rebuild and read again
+            self.logger.info(f"Row index of {self.source_path} is stale, rebuilding")
+            self.build()
+            rows = self._fetch(port_ids)
+            if rows is None:
+                raise ValueError(f"Could not index the rows of {self.source_path}")
+        return rows
+
+    def _fetch(self, port_ids: List[str]) -> Optional[List[Tuple[str, str]]]:
+        """
+        Read and split the indexed rows; None if a row no longer holds its Port_ID
+        """
+        rows = sorted(row for port_id in dict.fromkeys(port_ids) for row in self._rows.get(port_id, []))
+        if not rows:
+            return []
+
+        with open(self.source_path, 'rb') as f:
+            columns = [column.strip() for column in next(csv.reader([f.readline().decode('utf-8')]), [])]
+            if 'Trade_History' not in columns:
+                raise KeyError("Column 'Trade_History' not found in dataset.")
+            id_index, history_index = columns.index('Port_IDs'), columns.index('Trade_History')
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                fields = [self._row_fields(view[self.offsets[row]:self.offsets[row] + self.lengths[row]])
+                          for row in rows]
+
+        if any(len(row) <= id_index or row[id_index].strip() != self.port_ids[i] for row, i in zip(fields, rows)):
+            return None
+        return [(row[id_index], row[history_index] if history_index < len(row) else '') for row in fields]
@@ -0,0 +1,135 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from metrics_engine import metrics_from_aggregates, portfolio_aggregates
+
+# Aggregates that combine across shards by addition
+SUM_FIELDS = ['total_profit', 'total_investment', 'win_positions', 'total_positions',
+              'gross_profit', 'gross_loss']
+
+
+class PortfolioPartial:
+    """
+    Mergeable per-portfolio state of one or more trade history shards: the sums and
+    counts behind every metric plus each portfolio's daily PnL series (so Sharpe
+    ratio and drawdown are computed on the merged series, not combined per shard).
+
+    A portfolio or day that lies in a single shard keeps exactly the values of a
+    single-file run; sums over a portfolio split across shards are re-associated
+    and can differ from it in the last bits before rounding.
+    """
+
+    def __init__(self, aggregates: dict, trades: int = 0, first_trade=None, last_trade=None,
+                 sources: Optional[List[str]] = None):
+        self.aggregates = aggregates
+        self.trades = trades
+        self.first_trade = first_trade
+        self.last_trade = last_trade
+        self.sources = sources or []
+
+    def __len__(self) -> int:
+        return len(self.aggregates['port_ids'])
+
+    @classmethod
+    def from_trades(cls, trade_data: pd.DataFrame, source: Optional[str] = None) -> 'PortfolioPartial':
+        """
+        Reduce a trade table (with position_type) to its partial state
+        """
+        return cls(portfolio_aggregates(trade_data), len(trade_data),
+                   trade_data['timestamp'].min(), trade_data['timestamp'].max(),
+                   [str(source)] if source is not None else [])
+
+    @classmethod
+    def merge(cls, partials: Sequence['PortfolioPartial']) -> 'PortfolioPartial':
+        """
+        Combine partial states in shard order; portfolios keep their order of first
+        appearance, as if the shards were one concatenated file
+        """
+        partials = [p for p in partials if len(p)]
+        if not partials:
+            return cls({'port_ids': np.array([], dtype=object),
+                        **{name: np.zeros(0) for name in SUM_FIELDS},
+                        'day_groups': np.zeros(0, dtype=np.int64), 'day_keys': np.zeros(0, dtype=np.int64),
+                        'day_values': np.zeros(0)})
+
+        codes, port_ids = pd.factorize(np.concatenate([p.aggregates['port_ids'] for p in partials]))
+        bounds = np.cumsum([0] + [len(p) for p in partials])
+        shard_codes = [codes[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        n = len(port_ids)
+
+        merged = {'port_ids': np.asarray(port_ids)}
+        for name in SUM_FIELDS:
+            total = np.zeros(n, dtype=partials[0].aggregates[name].dtype)
+            for partial, part_codes in zip(partials, shard_codes):
+                # Port_IDs are unique within a partial, so plain fancy-index adds are safe
+                total[part_codes] += partial.aggregates[name]
+            merged[name] = total
+
+        # Daily PnL of a day split across shards is the sum of its parts
+        daily = pd.Series(np.concatenate([p.aggregates['day_values'] for p in partials])).groupby(
+            [np.concatenate([part_codes[p.aggregates['day_groups']] for p, part_codes in zip(partials, shard_codes)]),
+             np.concatenate([p.aggregates['day_keys'] for p in partials])], sort=True).sum()
+        merged['day_groups'] = daily.index.get_level_values(0).to_numpy()
+        merged['day_keys'] = daily.index.get_level_values(1).to_numpy()
+        merged['day_values'] = daily.to_numpy()
+
+        firsts = [p.first_trade for p in partials if pd.notna(p.first_trade)]
+        lasts = [p.last_trade for p in partials if pd.notna(p.last_trade)]
+        return cls(merged, sum(p.trades for p in partials), min(firsts) if firsts else None,
+                   max(lasts) if lasts else None, [s for p in partials for s in p.sources])
+
+    def metrics(self) -> pd.DataFrame:
+        """
+        Final calculate_metrics columns for every portfolio
+        """
+        if len(self) == 0:
+            return pd.DataFrame()
+        return metrics_from_aggregates(self.aggregates)
+
+
+def shard_partial(path: str, use_cache: bool = True) -> PortfolioPartial:
+    """
+    Map step: load one shard through the usual TradingAnalyzer path and reduce it
+    """
+    from trading_analyzer import TradingAnalyzer
+
+    analyzer = TradingAnalyzer(path, setup_dirs=False)
+    analyzer.load_data(Path(path), workers=1, use_cache=use_cache)
+    analyzer.calculate_position_type()
+    return PortfolioPartial.from_trades(analyzer.trade_data, source=path)
+
+
+def reduce_shards(shard_paths: Sequence, workers: int = 1, use_cache: bool = True,
+                  logger: Optional[logging.Logger] = None) -> PortfolioPartial:
+    """
+    Map every shard to a PortfolioPartial (in a process pool when workers > 1,
+    0 = all cores) and merge the partials in shard order
+    """
+    logger = logger or logging.getLogger(__name__)
+    shard_paths = [str(path) for path in shard_paths]
+    if not shard_paths:
+        raise ValueError("No trade history shards to reduce")
+    workers = min(len(shard_paths), workers or os.cpu_count() or 1)
+    start = time.perf_counter()
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(shard_partial, shard_paths, [use_cache] * len(shard_paths)))
+    else:
+        partials = [shard_partial(path, use_cache) for path in shard_paths]
+    mapped = time.perf_counter()
+
+    merged = PortfolioPartial.merge(partials)
+    appearances = pd.Series(np.concatenate([p.aggregates['port_ids'] for p in partials])).value_counts()
+    split = int((appearances > 1).sum())
+    logger.info(f"Reduced {len(shard_paths)} shard(s) with {workers} worker(s) in {mapped - start:.2f}s, "
+                f"merged {merged.trades:,} trades into {len(merged):,} portfolios "
+                f"({split:,} split across shards) in {time.perf_counter() - mapped:.2f}s")
+    return merged
@@ -0,0 +1,263 @@
+import argparse
+import json
+import logging
+import socket
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from incremental import advance_drawdown
+from metrics_engine import finalize_metrics
+from ranking import rank_portfolios
+
+_MS_PER_DAY = 86_400_000
+_NAN = float('nan')
+
+# (side, positionSide) -> (opens a position, closes a position)
+_POSITION_FLAGS = {
+    ('BUY', 'LONG'): (True, False),
+    ('SELL', 'LONG'): (False, True),
+    ('SELL', 'SHORT'): (True, False),
+    ('BUY', 'SHORT'): (False, True),
+}
+_NO_POSITION = (False, False)
+
+
+def tail_jsonl(path: Path, follow: bool = False, poll_interval: float = 0.5,
+               logger: Optional[logging.Logger] = None) -> Iterator[Dict]:
+    """
+    Yield trade events from a JSONL file, optionally waiting for new lines like tail -f.
+    Without follow, a last line with no newline that does not parse (the writer
+    is still appending it) is skipped with a warning.
+    """
+    logger = logger or logging.getLogger(__name__)
+    with open(path) as f:
+        pending = ''
+        while True:
+            line = f.readline()
+            if not line:
+                if not follow:
+                    break
+                time.sleep(poll_interval)
+                continue
+            pending += line
+            # A line without its newline is still being written
+            if not pending.endswith('\n'):
+                continue
+            if pending.strip():
+                yield json.loads(pending)
+            pending = ''
+
+        if pending.strip():
+            try:
+                event = json.loads(pending)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping incomplete last line of {path} ({len(pending)} characters, no newline)")
+                return
+            yield event
+
+
+def socket_events(host: str, port: int) -> Iterator[Dict]:
+    """
+    Yield newline-delimited JSON trade events from a local socket feed
+    """
+    with socket.create_connection((host, port)) as conn:
+        with conn.makefile('r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def serve_events(events: Iterable[Dict], host: str = '127.0.0.1', port: int = 0,
+                 ready: Optional[Callable[[int], None]] = None) -> None:
+    """
+    Local stand-in for the exchange feed: stream events as JSON lines to one client
+    """
+    with socket.create_server((host, port)) as server:
+        if ready is not None:
+            ready(server.getsockname()[1])
+        conn, _ = server.accept()
+        with conn, conn.makefile('w') as f:
+            for event in events:
+                f.write(json.dumps(event) + '\n')
+
+
+class _PortfolioState:
+    """
+    Constant-size online state of one portfolio
+    """
+    __slots__ = ('total_profit', 'total_investment', 'gross_profit', 'gross_loss',
+                 'win_positions', 'total_positions', 'day', 'day_pnl',
+                 'n_days', 'mean', 'm2', 'cum', 'peak', 'low')
+
+    def __init__(self):
+        self.total_profit = 0.0
+        self.total_investment = 0.0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.win_positions = 0
+        self.total_positions = 0
+        self.day = None
+        self.day_pnl = 0.0
+        # Welford moments and drawdown state over closed days only
+        self.n_days = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.cum = 1.0
+        self.peak = _NAN
+        self.low = _NAN
+
+    def close_day(self) -> None:
+        value = self.day_pnl
+        self.n_days += 1
+        delta = value - self.mean
+        self.mean += delta / self.n_days
+        self.m2 += delta * (value - self.mean)
+        self.cum, self.peak, self.low = advance_drawdown(self.cum, self.peak, self.low, value)
+
+
+class StreamingMetrics:
+    """
+    Online per-portfolio metrics over a stream of trade events.
+
+    Events are flattened Trade_History dicts with a Port_ID. Daily PnL is folded
+    into Welford moments and the drawdown state when a portfolio's next day
+    starts, so memory per portfolio is constant. Events for a day that is already
+    closed are attributed to the portfolio's current day.
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.states: Dict = {}
+        self.events = 0
+
+    def process(self, event: Dict) -> None:
+        """
+        Apply one trade event
+        """
+        state = self.states.get(event['Port_ID'])
+        if state is None:
+            state = self.states[event['Port_ID']] = _PortfolioState()
+
+        day = event['time'] // _MS_PER_DAY
+        if day != state.day:
+            if state.day is None:
+                state.day = day
+            elif day > state.day:
+                state.close_day()
+                state.day = day
+                state.day_pnl = 0.0
+
+        profit = event['realizedProfit']
+        state.total_profit += profit
+        state.day_pnl += profit
+        if profit > 0:
+            state.win_positions += 1
+            state.gross_profit += profit
+        elif profit < 0:
+            state.gross_loss += profit
+
+        opens, closes = _POSITION_FLAGS.get((event['side'], event['positionSide']), _NO_POSITION)
+        if opens:
+            state.total_investment += event['quantity']
+        elif closes:
+            state.total_positions += 1
+        self.events += 1
+
+    def snapshot(self) -> pd.DataFrame:
+        """
+        Current metrics for every portfolio, counting the still-open day
+        """
+        n = len(self.states)
+        port_ids = np.array(list(self.states))
+        columns = {name: np.zeros(n) for name in ('total_profit', 'total_investment', 'gross_profit',
+                                                 'gross_loss', 'mean', 'std', 'low')}
+        wins = np.zeros(n, dtype=np.int64)
+        positions = np.zeros(n, dtype=np.int64)
+        n_days = np.zeros(n, dtype=np.int64)
+
+        for i, state in enumerate(self.states.values()):
+            columns['total_profit'][i] = state.total_profit
+            columns['total_investment'][i] = state.total_investment
+            columns['gross_profit'][i] = state.gross_profit
+            columns['gross_loss'][i] = state.gross_loss
+            wins[i] = state.win_positions
+            positions[i] = state.total_positions
+
+            # Fold the open day into copies of the moments and drawdown state
+            days = state.n_days + (state.day is not None)
+            mean, m2 = state.mean, state.m2
+            low = state.low
+            if state.day is not None:
+                delta = state.day_pnl - mean
+                mean += delta / days
+                m2 += delta * (state.day_pnl - mean)
+                low = advance_drawdown(state.cum, state.peak, state.low, state.day_pnl)[2]
+            n_days[i] = days
+            columns['mean'][i] = mean
+            columns['std'][i] = (m2 / (days - 1)) ** 0.5 if days > 1 else _NAN
+            columns['low'][i] = low
+
+        return finalize_metrics(port_ids, columns['total_profit'], columns['total_investment'], wins,
+                                positions, columns['gross_profit'], columns['gross_loss'], n_days,
+                                columns['mean'], columns['std'], columns['low'])
+
+    def run(self, events: Iterable[Dict], top_n: int = 20, interval_events: int = 100_000,
+            interval_seconds: Optional[float] = None,
+            on_ranking: Optional[Callable[[pd.DataFrame], None]] = None) -> pd.DataFrame:
+        """
+        Consume events and emit the top-N ranking every interval_events events
+        (or interval_seconds, checked every 1024 events). Returns the final ranking.
+        """
+        on_ranking = on_ranking or (lambda ranking: None)
+        process = self.process
+        start = last_emit = time.perf_counter()
+        since_emit = 0
+
+        for event in events:
+            process(event)
+            since_emit += 1
+            if since_emit >= interval_events or (
+                    interval_seconds is not None and since_emit % 1024 == 0
+                    and time.perf_counter() - last_emit >= interval_seconds):
+                on_ranking(rank_portfolios(self.snapshot(), top_n))
+                since_emit = 0
+                last_emit = time.perf_counter()
+
+        elapsed = time.perf_counter() - start
+        rate = self.events / elapsed if elapsed > 0 else float('inf')
+        self.logger.info(f"Processed {self.events:,} events from {len(self.states):,} portfolios "
+                         f"({rate:,.0f} events/s)")
+        ranking = rank_portfolios(self.snapshot(), top_n)
+        on_ranking(ranking)
+        return ranking
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream trade events and keep live portfolio rankings")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--jsonl', help="JSONL file of trade events")
+    source.add_argument('--socket', help="host:port of a newline-delimited JSON feed")
+    parser.add_argument('--follow', action='store_true', help="Keep tailing the JSONL file")
+    parser.add_argument('--top', type=int, default=20, help="Number of portfolios per ranking")
+    parser.add_argument('--interval', type=int, default=100_000, help="Events between rankings")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.jsonl:
+        events = tail_jsonl(Path(args.jsonl), follow=args.follow)
+    else:
+        host, port = args.socket.rsplit(':', 1)
+        events = socket_events(host, int(port))
+
+    def show(ranking):
+        print(ranking.to_string(index=False))
+
+    StreamingMetrics().run(events, top_n=args.top, interval_events=args.interval, on_ranking=show)
+
+
+if __name__ == "__main__":
+    main()
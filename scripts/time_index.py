@@ -0,0 +1,207 @@
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from metrics_engine import finalize_metrics
+from trade_schema import POSITION_CODES, position_codes
+
+_NS_PER_DAY = 86_400 * 1_000_000_000
+_NAT = np.iinfo(np.int64).min
+
+
+def _segment_cumsum(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    Running sum that restarts at every portfolio, keeping prefix values small
+    """
+    return pd.Series(values).groupby(groups).cumsum().to_numpy()
+
+
+def _kahan_sum(values: np.ndarray) -> float:
+    """
+    Compensated sum in the same order and form as groupby().sum()
+    """
+    total = compensation = 0.0
+    for value in values.tolist():
+        if value == value:
+            y = value - compensation
+            t = total + y
+            compensation = t - total - y
+            total = t
+    return total
+
+
+def _two_sum(a, b):
+    """
+    Rounded sum and its exact rounding error: a + b == s + e
+    """
+    s = a + b
+    b_virtual = s - a
+    return s, (a - (s - b_virtual)) + (b - b_virtual)
+
+
+def _compensated_cumsum(values: np.ndarray):
+    """
+    Running sum from 0 (NaN counts as 0) as a (hi, lo) pair of n + 1 prefixes:
+    hi is the plain sequential running sum and lo the running sum of the exact
+    rounding error of every step, so hi + lo carries about twice the precision
+    of float64
+    """
+    values = np.where(np.isnan(values), 0.0, values)
+    hi = np.concatenate(([0.0], np.cumsum(values)))
+    return hi, np.concatenate(([0.0], np.cumsum(_two_sum(hi[:-1], values)[1])))
+
+
+class TradeTimeIndex:
+    """
+    Trades sorted by (Port_ID, timestamp) with per-portfolio offsets, prefix sums
+    and per-day aggregates, so metrics for any date range cost two binary searches
+    plus O(days in range).
+
+    A query over [start, end] (both inclusive, None = open) returns what
+    calculate_metrics would return on trade_data sliced to that range. Counts
+    and daily PnL (hence Sharpe ratio and MDD) are exact. PnL, gains, losses and
+    opened quantity are differences of compensated prefix sums, i.e. correctly
+    rounded sums, while pandas sums pairwise: they can differ from it in the
+    last bits (below 1e-15 of the summed magnitudes) and so, rarely, by 0.01
+    after rounding to 2 decimals.
+    """
+
+    def __init__(self, trade_data: pd.DataFrame):
+        codes, port_ids = pd.factorize(trade_data['Port_ID'])
+        self.port_ids = np.asarray(port_ids)
+        self.codes = {port_id: code for code, port_id in enumerate(self.port_ids)}
+
+        valid = np.flatnonzero(codes >= 0)
+        ts = trade_data['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)[valid]
+        order = np.lexsort((ts, codes[valid]))
+        index = valid[order]
+
+        self.rows = index
+        self.groups = codes[index]
+        self.ts = ts[order]
+        self.profit = trade_data['realizedProfit'].to_numpy(dtype=np.float64)[index]
+        position_type = position_codes(trade_data['position_type'])[index]
+        quantity = trade_data['quantity'].to_numpy(dtype=np.float64)[index]
+
+        n = len(self.port_ids)
+        self.offsets = np.searchsorted(self.groups, np.arange(n + 1))
+
+        is_open = (position_type == POSITION_CODES['long_open']) | (position_type == POSITION_CODES['short_open'])
+        is_close = (position_type == POSITION_CODES['long_close']) | (position_type == POSITION_CODES['short_close'])
+        self.cum_profit = _compensated_cumsum(self.profit)
+        self.cum_gain = _compensated_cumsum(np.where(self.profit > 0, self.profit, 0.0))
+        self.cum_loss = _compensated_cumsum(np.where(self.profit < 0, self.profit, 0.0))
+        self.cum_investment = _compensated_cumsum(np.where(is_open, quantity, 0.0))
+        self.cum_wins = _segment_cumsum((self.profit > 0).astype(np.int64), self.groups)
+        self.cum_closes = _segment_cumsum(is_close.astype(np.int64), self.groups)
+
+        # Per-day aggregates: where each (portfolio, day) run starts and its PnL.
+        # The PnL is summed in file order, like the groupby in calculate_metrics,
+        # so whole days match it exactly.
+        days = np.where(ts == _NAT, _NAT, ts // _NS_PER_DAY)
+        self.day_pnl = pd.Series(trade_data['realizedProfit'].to_numpy(dtype=np.float64)[valid]).groupby(
+            [codes[valid], days]).sum().to_numpy()
+        days = days[order]
+        new_day = np.ones(len(days), dtype=bool)
+        new_day[1:] = (days[1:] != days[:-1]) | (self.groups[1:] != self.groups[:-1])
+        self.day_starts = np.flatnonzero(new_day)
+        self.day_keys = days[self.day_starts]
+        self.day_offsets = np.searchsorted(self.groups[self.day_starts], np.arange(n + 1))
+
+    def _prefix(self, cumulative: np.ndarray, start: int, i: int):
+        """
+        Sum of a segment's values before position i (segment starts at start)
+        """
+        return cumulative[i - 1] if i > start else 0
+
+    def _range_sum(self, cumulative: np.ndarray, start: int, i0: int, i1: int):
+        return self._prefix(cumulative, start, i1) - self._prefix(cumulative, start, i0)
+
+    def _compensated_range_sum(self, cumulative, i0: int, i1: int) -> float:
+        """
+        Sum of trades [i0, i1) from a (hi, lo) prefix pair, with the difference
+        of the hi parts taken exactly
+        """
+        hi, lo = cumulative
+        total, error = _two_sum(float(hi[i1]), -float(hi[i0]))
+        return total + (error + (float(lo[i1]) - float(lo[i0])))
+
+    def _daily_returns(self, code: int, i0: int, i1: int) -> np.ndarray:
+        """
+        Daily PnL over trades [i0, i1): whole days come from the per-day
+        aggregates, partially covered edge days are summed directly
+        """
+        d0, d1 = self.day_offsets[code], self.day_offsets[code + 1]
+        starts = self.day_starts[d0:d1]
+        first = max(np.searchsorted(starts, i0, side='right') - 1, 0)
+        last = np.searchsorted(starts, i1, side='left')
+
+        values = []
+        for k in range(first, last):
+            if self.day_keys[d0 + k] == _NAT:
+                continue
+            day_start = starts[k]
+            day_end = starts[k + 1] if k + 1 < len(starts) else self.offsets[code + 1]
+            lo, hi = max(day_start, i0), min(day_end, i1)
+            if lo >= hi:
+                continue
+            if lo == day_start and hi == day_end:
+                values.append(self.day_pnl[d0 + k])
+            else:
+                # Partially covered edge day (at most two per query): sum its
+                # fills in file order so Sharpe and MDD stay bit-exact
+                values.append(_kahan_sum(self.profit[lo:hi][np.argsort(self.rows[lo:hi], kind='stable')]))
+        return np.array(values, dtype=np.float64)
+
+    def query(self, port_ids: Optional[Sequence] = None, start=None, end=None) -> pd.DataFrame:
+        """
+        Metrics (calculate_metrics columns) for portfolios with trades in [start, end]
+        """
+        lo = _NAT + 1 if start is None else pd.Timestamp(start).value
+        hi = np.iinfo(np.int64).max if end is None else pd.Timestamp(end).value
+        if port_ids is None:
+            codes = range(len(self.port_ids))
+        else:
+            codes = [self.codes[port_id] for port_id in port_ids if port_id in self.codes]
+
+        rows = []
+        for code in codes:
+            s, e = self.offsets[code], self.offsets[code + 1]
+            if start is None and end is None:
+                i0, i1 = s, e
+            else:
+                i0 = s + np.searchsorted(self.ts[s:e], lo, side='left')
+                i1 = s + np.searchsorted(self.ts[s:e], hi, side='right')
+            if i1 <= i0:
+                continue
+
+            daily = self._daily_returns(code, i0, i1)
+            n_days = len(daily)
+            mean = std = low = np.nan
+            if n_days:
+                mean = daily.sum() / n_days
+                std = np.sqrt(((mean - daily) ** 2).sum() / (n_days - 1)) if n_days > 1 else np.nan
+                with np.errstate(invalid='ignore', over='ignore'):
+                    cumulative = np.cumprod(1 + daily)
+                    drawdowns = cumulative / np.fmax.accumulate(cumulative) - 1
+                low = np.nanmin(drawdowns) if not np.isnan(drawdowns).all() else np.nan
+
+            rows.append((code,
+                         self._compensated_range_sum(self.cum_profit, i0, i1),
+                         self._compensated_range_sum(self.cum_investment, i0, i1),
+                         self._range_sum(self.cum_wins, s, i0, i1),
+                         self._range_sum(self.cum_closes, s, i0, i1),
+                         self._compensated_range_sum(self.cum_gain, i0, i1),
+                         self._compensated_range_sum(self.cum_loss, i0, i1),
+                         n_days, mean, std, low))
+
+        if not rows:
+            return pd.DataFrame()
+        columns = list(zip(*rows))
+        codes = np.array(columns[0], dtype=np.int64)
+        arrays = [np.array(column) for column in columns[1:]]
+        return finalize_metrics(self.port_ids[codes], arrays[0], arrays[1],
+                                arrays[2].astype(np.int64), arrays[3].astype(np.int64),
+                                arrays[4], arrays[5], arrays[6].astype(np.int64),
+                                arrays[7], arrays[8], arrays[9])
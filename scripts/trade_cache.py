@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# Bump whenever the flattened table layout or the parser output changes
+CACHE_SCHEMA_VERSION = 1
+
+_MANIFEST = 'manifest.json'
+_HASH_BLOCK = 1024 * 1024
+
+
+def file_fingerprint(path: Path) -> Dict:
+    """
+    Size, mtime and blake2b content hash of a file
+    """
+    stat = Path(path).stat()
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            digest.update(block)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'blake2b': digest.hexdigest()}
+
+
+class TradeCache:
+    """
+    Binary columnar cache of the flattened trade table, one .npy file per column.
+
+    The cache is keyed by the source file's size, mtime and content hash plus
+    CACHE_SCHEMA_VERSION; any mismatch invalidates it automatically.
+    """
+
+    def __init__(self, source_path: Path, cache_dir: Path, logger: Optional[logging.Logger] = None):
+        self.source_path = Path(source_path)
+        self.logger = logger or logging.getLogger(__name__)
+        source_key = hashlib.sha1(str(self.source_path.resolve()).encode()).hexdigest()[:12]
+        self.cache_dir = Path(cache_dir) / f"{self.source_path.stem}-{source_key}"
+        self._fingerprint = None
+
+    def fingerprint(self) -> Dict:
+        """
+        Size, mtime and content hash of the source file (computed once)
+        """
+        if self._fingerprint is None:
+            self._fingerprint = file_fingerprint(self.source_path)
+        return self._fingerprint
+
+    def _read_manifest(self) -> Optional[Dict]:
+        try:
+            with open(self.cache_dir / _MANIFEST) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        tmp_path = self.cache_dir / f"{_MANIFEST}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.cache_dir / _MANIFEST)
+
+    def _valid_manifest(self) -> Optional[Dict]:
+        """
+        Return the manifest if it matches the current source file, else None
+        """
+        manifest = self._read_manifest()
+        if manifest is None or manifest.get('schema_version') != CACHE_SCHEMA_VERSION:
+            return None
+
+        source = manifest.get('source', {})
+        stat = self.source_path.stat()
+        # Cheap checks first so a stale cache never pays for hashing
+        if source.get('size') != stat.st_size or source.get('mtime_ns') != stat.st_mtime_ns:
+            return None
+        if source != self.fingerprint():
+            return None
+        return manifest
+
+    def load(self, columns: Optional[Iterable[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        Load the cached table (optionally only some columns); None on a miss.
+        Derived columns added with store_column are only returned when asked for.
+        """
+        manifest = self._valid_manifest()
+        if manifest is None:
+            self.logger.info(f"Trade cache miss for {self.source_path}")
+            return None
+
+        entries = manifest['columns']
+        if columns is not None:
+            wanted = set(columns)
+            if not wanted <= set(entries):
+                return None
+            names = [name for name in manifest['order'] if name in wanted]
+        else:
+            names = [name for name in manifest['order'] if not entries[name].get('derived')]
+
+        frame = pd.DataFrame({name: self._load_array(name, entries[name]) for name in names})
+        self.logger.info(f"Loaded {len(frame):,} trades from cache {self.cache_dir}")
+        return frame
+
+    def load_column(self, name: str) -> Optional[np.ndarray]:
+        """
+        Load a single cached column; None on a miss
+        """
+        manifest = self._valid_manifest()
+        if manifest is None or name not in manifest['columns']:
+            return None
+        return self._load_array(name, manifest['columns'][name])
+
+    def _load_array(self, name: str, entry: Dict) -> np.ndarray:
+        values = np.load(self.cache_dir / entry['file'], allow_pickle=False)
+        if entry['kind'] == 'categorical':
+            categories = np.empty(len(entry['categories']) + 1, dtype=object)
+            categories[:-1] = entry['categories']
+            categories[-1] = np.nan
+            # Code -1 (missing) indexes the trailing NaN slot
+            values = categories[values]
+        return values
+
+    def store(self, frame: pd.DataFrame) -> None:
+        """
+        Replace the cache contents with this table
+        """
+        try:
+            if self.cache_dir.exists():
+                shutil.rmtree(self.cache_dir)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            manifest = {
+                'schema_version': CACHE_SCHEMA_VERSION,
+                'source': self.fingerprint(),
+                'order': [],
+                'columns': {},
+            }
+            for name in frame.columns:
+                self._store_array(manifest, name, frame[name])
+            self._write_manifest(manifest)
+            self.logger.info(f"Cached {len(frame):,} trades to {self.cache_dir}")
+        except (OSError, TypeError, ValueError) as e:
+            # A failed cache write must never break the analysis itself
+            self.logger.warning(f"Could not write trade cache: {e}")
+
+    def store_column(self, name: str, values) -> None:
+        """
+        Add or replace one column of a still-valid cache
+        """
+        try:
+            manifest = self._valid_manifest()
+            if manifest is None:
+                return
+            self._store_array(manifest, name, pd.Series(values))
+            manifest['columns'][name]['derived'] = True
+            self._write_manifest(manifest)
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.warning(f"Could not write trade cache column {name}: {e}")
+
+    def _store_array(self, manifest: Dict, name: str, series: pd.Series) -> None:
+        if name not in manifest['columns']:
+            manifest['order'].append(name)
+        file_name = f"column_{manifest['order'].index(name)}.npy"
+
+        if series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+            codes, categories = pd.factorize(series, use_na_sentinel=True)
+            entry = {'file': file_name, 'kind': 'categorical', 'categories': categories.tolist()}
+            np.save(self.cache_dir / file_name, codes.astype(np.int32))
+        else:
+            entry = {'file': file_name, 'kind': 'array'}
+            np.save(self.cache_dir / file_name, series.to_numpy(), allow_pickle=False)
+        manifest['columns'][name] = entry
@@ -0,0 +1,405 @@
+import ast
+import csv
+import logging
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Grammar for the common repr() layout of a Trade_History cell. Rows that do not
+# match it exactly (escaped strings, None, nested values, ...) are handed to
+# ast.literal_eval so the result is always identical to the old loader.
+_STR_TOKEN = r"'[^'\\\n{}:,]*'"
+_NUM_TOKEN = r"-?(?:0|[1-9]\d*)(?:\.\d*)?(?:[eE][-+]?\d+)?"
+_VALUE_TOKEN = rf"(?:{_STR_TOKEN}|{_NUM_TOKEN}|True|False)"
+_PAIR_RE = re.compile(rf"({_STR_TOKEN})\s*:\s*{_VALUE_TOKEN}")
+_VALUE_RE = re.compile(rf":\s*({_STR_TOKEN}|[^,}}\s]+)")
+
+_CSV_FIELD_LIMIT = 2 ** 31 - 1
+
+# Approximate amount of raw Trade_History text handed to a worker per task
+_BATCH_BYTES = 4 * 1024 * 1024
+
+
+class _Fallback(Exception):
+    """
+    Raised when a row cannot be handled by the fast tokenizer
+    """
+
+
+class TradeHistoryParser:
+    """
+    Flatten Trade_History rows into per-column typed arrays, one row at a time.
+
+    Numeric and boolean fields are kept as int64/float64/bool chunks and string
+    fields (symbol, side, positionSide, ...) as int32 codes into a per-column
+    category table, so memory stays proportional to the flattened table rather
+    than to a list of Python dicts.
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.columns: List[str] = []
+        self.chunks: Dict[str, List[Tuple[str, object]]] = {}
+        self.filled: Dict[str, int] = {}
+        self.categories: Dict[str, Dict[str, int]] = {}
+        self.port_ids: List[str] = []
+        self.row_lengths: List[int] = []
+        self.n_trades = 0
+        self.malformed_rows = 0
+        self._grammars: Dict[Tuple[str, ...], re.Pattern] = {}
+
+    @staticmethod
+    def read_rows(data_path: Path, logger: Optional[logging.Logger] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Stream (Port_ID, Trade_History) pairs from the raw CSV without loading it whole
+        """
+        logger = logger or logging.getLogger(__name__)
+        csv.field_size_limit(_CSV_FIELD_LIMIT)
+
+        with open(data_path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            logger.info(f"Columns found in CSV: {header}")
+            header = [column.strip() for column in header]
+
+            if 'Port_IDs' not in header:
+                raise KeyError("Missing expected column 'Port_IDs' in CSV.")
+            if 'Trade_History' not in header:
+                raise KeyError("Column 'Trade_History' not found in dataset.")
+
+            id_index = header.index('Port_IDs')
+            history_index = header.index('Trade_History')
+
+            for row in reader:
+                if not row:
+                    continue
+                port_id = row[id_index] if id_index < len(row) else ''
+                trade_history = row[history_index] if history_index < len(row) else ''
+                yield port_id, trade_history
+
+    def parse_file(self, data_path: Path, workers: int = 1) -> pd.DataFrame:
+        """
+        Parse every row of a trade history CSV and return the flattened frame.
+
+        With workers > 1 the rows are split into batches that are parsed by a
+        process pool; each worker sends back its columnar chunks only.
+        """
+        if workers is None or workers <= 0:
+            workers = os.cpu_count() or 1
+
+        rows = self.read_rows(data_path, self.logger)
+        if workers == 1:
+            for port_id, trade_history in rows:
+                self.feed_row(port_id, trade_history)
+            return self.to_frame()
+
+        self.logger.info(f"Parsing trade history with {workers} worker processes")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Keep a bounded number of batches in flight and merge them in
+            # submission order so the frame matches a single-process run
+            pending = deque()
+            for batch in self._batches(rows):
+                pending.append(pool.submit(parse_rows, batch))
+                if len(pending) >= 2 * workers:
+                    self.merge(pending.popleft().result())
+            while pending:
+                self.merge(pending.popleft().result())
+        return self.to_frame()
+
+    @staticmethod
+    def _batches(rows: Iterator[Tuple[str, str]], batch_bytes: int = _BATCH_BYTES) -> Iterator[List[Tuple[str, str]]]:
+        batch, size = [], 0
+        for row in rows:
+            batch.append(row)
+            size += len(row[1])
+            if size >= batch_bytes:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
+
+    def merge(self, other: 'TradeHistoryParser') -> None:
+        """
+        Append the trades parsed by another parser (e.g. a worker) after ours
+        """
+        for key in other.columns:
+            self._register(key)
+            if key == 'Port_ID':
+                continue
+
+            remap = None
+            if key in other.categories:
+                table = self.categories.setdefault(key, {})
+                remap = np.array([table.setdefault(value, len(table)) for value in other.categories[key]],
+                                 dtype=np.int32)
+
+            for kind, chunk in other.chunks[key]:
+                if kind == 'codes':
+                    chunk = remap[chunk]
+                self._append_chunk(key, kind, chunk)
+
+        self.port_ids.extend(other.port_ids)
+        self.row_lengths.extend(other.row_lengths)
+        self.n_trades += other.n_trades
+        self.malformed_rows += other.malformed_rows
+        self._pad_columns()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_grammars'] = {}
+        return state
+
+    def feed_row(self, port_id: str, trade_history: str) -> int:
+        """
+        Parse one portfolio row and append its trades to the column chunks
+        """
+        error = None
+        try:
+            try:
+                keys, columns, n = self._tokenize(trade_history)
+                self._append_fast(keys, columns, n)
+            except _Fallback:
+                n, error = self._append_literal(trade_history)
+        except Exception as e:
+            n, error = 0, e
+
+        if n > 0:
+            self.port_ids.append(port_id)
+            self.row_lengths.append(n)
+            self.n_trades += n
+            self._pad_columns()
+
+        if error is not None:
+            self.malformed_rows += 1
+            # Counted in malformed_rows and reported once by the caller
+            self.logger.debug(f"Skipping malformed trade history: {error}")
+        return n
+
+    def feed_trades(self, port_id: str, trades: List[Dict]) -> int:
+        """
+        Append already-decoded trade dicts (e.g. from an exchange API) for one
+        portfolio, skipping the Trade_History text format
+        """
+        n = self._append_trades(trades)
+        if n > 0:
+            self.port_ids.append(port_id)
+            self.row_lengths.append(n)
+            self.n_trades += n
+            self._pad_columns()
+        return n
+
+    def _grammar(self, keys: Tuple[str, ...]) -> re.Pattern:
+        """
+        Compile (and cache) a full-match pattern for a list of dicts with these keys
+        """
+        pattern = self._grammars.get(keys)
+        if pattern is None:
+            pairs = r"\s*,\s*".join(rf"{re.escape(key)}\s*:\s*{_VALUE_TOKEN}" for key in keys)
+            trade = rf"\{{\s*{pairs}\s*\}}"
+            pattern = re.compile(rf"\[(?:{trade}(?:\s*,\s*{trade})*+)?\]")
+            self._grammars[keys] = pattern
+        return pattern
+
+    def _tokenize(self, text: str) -> Tuple[List[str], List[List[str]], int]:
+        """
+        Split a Trade_History string into raw value tokens per key
+        """
+        if text == '[]':
+            return [], [], 0
+
+        start = text.find('{')
+        end = text.find('}', start)
+        if start < 0 or end < 0:
+            raise _Fallback()
+
+        quoted_keys = tuple(key for key in _PAIR_RE.findall(text, start, end + 1))
+        if not quoted_keys or len(set(quoted_keys)) != len(quoted_keys):
+            raise _Fallback()
+        if not self._grammar(quoted_keys).fullmatch(text):
+            raise _Fallback()
+
+        values = _VALUE_RE.findall(text)
+        k = len(quoted_keys)
+        n = len(values) // k
+        if n * k != len(values):
+            raise _Fallback()
+
+        keys = [key[1:-1] for key in quoted_keys]
+        return keys, [values[i::k] for i in range(k)], n
+
+    def _register(self, key: str) -> None:
+        if key not in self.chunks:
+            self.columns.append(key)
+            self.chunks[key] = []
+            self.filled[key] = 0
+            if self.n_trades:
+                self._append_chunk(key, 'missing', self.n_trades)
+
+    def _convert_tokens(self, key: str, tokens: List[str]) -> Tuple[str, np.ndarray]:
+        """
+        Convert one column of raw tokens into a typed chunk
+        """
+        first = tokens[0]
+        if first[0] == "'":
+            uniques, inverse = np.unique(np.array(tokens), return_inverse=True)
+            lookup = np.empty(len(uniques), dtype=np.int32)
+            table = self.categories.setdefault(key, {})
+            for i, token in enumerate(uniques):
+                if token[0] != "'":
+                    raise _Fallback()
+                lookup[i] = table.setdefault(token[1:-1], len(table))
+            return 'codes', lookup[inverse.ravel()]
+
+        if first in ('True', 'False'):
+            values = np.array(tokens)
+            is_true = values == 'True'
+            if not np.all(is_true | (values == 'False')):
+                raise _Fallback()
+            return 'values', is_true
+
+        try:
+            return 'values', np.array(tokens, dtype=np.int64)
+        except ValueError:
+            pass
+        except OverflowError:
+            raise _Fallback()
+        try:
+            return 'values', np.array(tokens, dtype=np.float64)
+        except ValueError:
+            raise _Fallback()
+
+    def _append_fast(self, keys: List[str], columns: List[List[str]], n: int) -> None:
+        if n == 0:
+            return
+        converted = [self._convert_tokens(key, tokens) for key, tokens in zip(keys, columns)]
+        for key, chunk in zip(keys, converted):
+            self._register(key)
+            if key != 'Port_ID':
+                self._append_chunk(key, *chunk)
+        self._register('Port_ID')
+
+    def _append_literal(self, text: str) -> Tuple[int, Optional[Exception]]:
+        """
+        Slow path: evaluate the row with ast.literal_eval, mirroring the old loader
+        """
+        trade_list = ast.literal_eval(text)
+        trades = []
+        error = None
+        for trade in trade_list:
+            if not isinstance(trade, dict):
+                # The old loader kept the trades preceding a bad element
+                error = TypeError(f"'{type(trade).__name__}' object does not support item assignment")
+                break
+            trades.append(trade)
+        return self._append_trades(trades), error
+
+    def _append_trades(self, trades: List[Dict]) -> int:
+        """
+        Append a list of trade dicts column by column
+        """
+        keys = []
+        for trade in trades:
+            for key in trade:
+                self._register(key)
+                if key not in keys:
+                    keys.append(key)
+            self._register('Port_ID')
+
+        for key in keys:
+            if key == 'Port_ID':
+                continue
+            values = pd.Series([trade.get(key, np.nan) for trade in trades]).to_numpy()
+            if values.dtype == object and all(isinstance(value, str) for value in values):
+                table = self.categories.setdefault(key, {})
+                codes = np.fromiter((table.setdefault(value, len(table)) for value in values),
+                                    dtype=np.int32, count=len(values))
+                self._append_chunk(key, 'codes', codes)
+            else:
+                self._append_chunk(key, 'values', values)
+
+        return len(trades)
+
+    def _append_chunk(self, key: str, kind: str, chunk) -> None:
+        self.chunks[key].append((kind, chunk))
+        self.filled[key] += chunk if kind == 'missing' else len(chunk)
+
+    def _pad_columns(self) -> None:
+        for key in self.columns:
+            if key != 'Port_ID' and self.filled[key] < self.n_trades:
+                self._append_chunk(key, 'missing', self.n_trades - self.filled[key])
+
+    def _assemble(self, key: str) -> np.ndarray:
+        """
+        Concatenate a column's chunks into the array pandas would have inferred
+        """
+        chunks = self.chunks[key]
+        kinds = {kind for kind, _ in chunks}
+        categories = None
+        if key in self.categories:
+            categories = np.empty(len(self.categories[key]), dtype=object)
+            categories[:] = list(self.categories[key])
+
+        if kinds <= {'codes', 'missing'}:
+            parts = []
+            for kind, chunk in chunks:
+                if kind == 'codes':
+                    parts.append(categories[chunk])
+                else:
+                    parts.append(np.full(chunk, np.nan, dtype=object))
+            return np.concatenate(parts) if parts else np.empty(0, dtype=object)
+
+        arrays = [chunk for kind, chunk in chunks if kind == 'values']
+        numeric = 'codes' not in kinds and all(
+            array.dtype.kind in 'iuf' for array in arrays
+        )
+        if numeric:
+            parts = [chunk if kind == 'values' else np.full(chunk, np.nan) for kind, chunk in chunks]
+            return np.concatenate(parts)
+        if kinds == {'values'} and all(array.dtype == np.bool_ for array in arrays):
+            return np.concatenate(arrays)
+
+        # Mixed kinds: let pandas infer exactly as it does for a list of dicts
+        values = []
+        for kind, chunk in chunks:
+            if kind == 'codes':
+                values.extend(categories[chunk])
+            elif kind == 'missing':
+                values.extend([np.nan] * chunk)
+            else:
+                values.extend(chunk.tolist())
+        return pd.Series(values).to_numpy()
+
+    def port_id_column(self) -> np.ndarray:
+        """
+        Expand one Port_ID per row into one Port_ID per trade
+        """
+        try:
+            ids = np.array(self.port_ids, dtype=np.int64)
+        except (ValueError, OverflowError):
+            ids = np.array(self.port_ids, dtype=object)
+        return np.repeat(ids, self.row_lengths)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Build the flattened trade DataFrame from the accumulated chunks
+        """
+        data = {}
+        for key in self.columns:
+            data[key] = self.port_id_column() if key == 'Port_ID' else self._assemble(key)
+        return pd.DataFrame(data)
+
+
+def parse_rows(rows: List[Tuple[str, str]]) -> TradeHistoryParser:
+    """
+    Worker entry point: parse a batch of (Port_ID, Trade_History) rows
+    """
+    parser = TradeHistoryParser()
+    for port_id, trade_history in rows:
+        parser.feed_row(port_id, trade_history)
+    return parser
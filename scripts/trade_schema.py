@@ -0,0 +1,68 @@
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# int8 enum used for position_type in compact mode; index == code
+POSITION_TYPES = ['unknown', 'long_open', 'long_close', 'short_open', 'short_close']
+POSITION_CODES = {name: code for code, name in enumerate(POSITION_TYPES)}
+
+CATEGORY_COLUMNS = ['Port_ID', 'symbol', 'side', 'positionSide', 'baseAsset',
+                    'feeAsset', 'quantityAsset', 'realizedProfitAsset']
+# Asset columns that are dropped when they hold a single value for every trade
+ASSET_COLUMNS = ['feeAsset', 'quantityAsset', 'realizedProfitAsset']
+
+
+def position_codes(position_type: pd.Series) -> np.ndarray:
+    """
+    Return position_type as int8 codes whether it is stored as strings or codes
+    """
+    if position_type.dtype == np.int8:
+        return position_type.to_numpy()
+    codes = pd.Categorical(position_type, categories=POSITION_TYPES).codes
+    return np.where(codes < 0, POSITION_CODES['unknown'], codes).astype(np.int8)
+
+
+def position_mask(position_type: pd.Series, names: Iterable[str]) -> pd.Series:
+    """
+    Boolean mask of trades whose position_type is one of names, compared on codes
+    when the column is compact
+    """
+    if position_type.dtype == np.int8:
+        return position_type.isin([POSITION_CODES[name] for name in names])
+    return position_type.isin(list(names))
+
+
+def compact_trade_data(trade_data: pd.DataFrame,
+                       logger: Optional[logging.Logger] = None) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Convert string columns to categoricals, position_type to int8 codes and drop
+    constant asset columns. Returns the compact frame and a memory report.
+    """
+    logger = logger or logging.getLogger(__name__)
+    before = int(trade_data.memory_usage(deep=True).sum())
+
+    compact = trade_data.copy()
+    constants = {}
+    for column in ASSET_COLUMNS:
+        if column in compact.columns and compact[column].nunique(dropna=False) == 1:
+            constants[column] = compact[column].iloc[0]
+            compact.drop(columns=column, inplace=True)
+
+    for column in CATEGORY_COLUMNS:
+        if column in compact.columns and not isinstance(compact[column].dtype, pd.CategoricalDtype):
+            compact[column] = compact[column].astype('category')
+
+    if 'position_type' in compact.columns:
+        compact['position_type'] = position_codes(compact['position_type'])
+
+    after = int(compact.memory_usage(deep=True).sum())
+    report = {
+        'before_bytes': before,
+        'after_bytes': after,
+        'dropped_constant_columns': constants,
+    }
+    logger.info(f"Compacted trade data from {before / 1e6:.1f} MB to {after / 1e6:.1f} MB "
+                f"(dropped constant columns: {list(constants)})")
+    return compact, report
@@ -1,29 +1,95 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, List
 import logging
 from pathlib import Path
 import os
 import sys
 import datetime as datetime
-import ast
+from trade_parser import TradeHistoryParser
+from trade_cache import TradeCache
+from metrics_engine import compute_portfolio_metrics
+from trade_schema import POSITION_CODES, POSITION_TYPES, compact_trade_data, position_mask
+from incremental import IncrementalMetrics
+from ranking import rank_portfolios, rank_scenarios
+from time_index import TradeTimeIndex
+from rolling_metrics import DEFAULT_WINDOWS, daily_pnl_matrix, rolling_metrics
+from instrumentation import RunProfiler, instrumented
+
+# Optional stages (round trips, fill compaction, bootstrap, shards, column store,
+# row index, correlations, exchange fetch) import their modules when first used,
+# so a plain analyze run does not load them or their process pools
+if TYPE_CHECKING:
+    from column_store import ColumnStore
+    from exchange_fetcher import ExchangeFetcher
+
+# Project roots whose directories were already created in this process
+_PREPARED_ROOTS = set()
+
 class TradingAnalyzer:
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, trace_memory: bool = False, setup_dirs: bool = True):
         """
-        Initialize TradingAnalyzer with path to trade history data
+        Initialize TradingAnalyzer with path to trade history data.
+        Set trace_memory to record tracemalloc allocations per stage in the run profile.
+        Pass setup_dirs=False when the caller has already created the project directories.
         """
         self.data_path = Path(data_path)
+        self.profiler = RunProfiler(trace_memory)
+        self._results = None
+        self._incremental = None
+        self._time_index = None
+        self._daily_pnl = None
+        self._bootstrap = {}
+        self._pending_trades = []
+        self.shard_state = None
+        self.column_store = None
+        self.results_cache_hits = 0
+        self.results_cache_misses = 0
         self.trade_data = None
-        self.project_root = self.setup_project_structure()
+        self.project_root = self.setup_project_structure() if setup_dirs else Path(__file__).parent.parent
         self.metrics = {}
+        self.cache = None
+        self.compact = False
+        self.dropped_columns = {}
         self.logger = self.setup_logging()  # ✅ FIXED: Removed `_setup_logging()`
     
+    @property
+    def trade_data(self) -> pd.DataFrame:
+        if self._pending_trades:
+            # Batches from append_trades are only concatenated when the full
+            # table is actually needed
+            self._trade_data = pd.concat([self._trade_data] + self._pending_trades, ignore_index=True)
+            self._pending_trades = []
+            if self.compact:
+                self._trade_data, _ = compact_trade_data(self._trade_data, self.logger)
+        return self._trade_data
+
+    @trade_data.setter
+    def trade_data(self, value: pd.DataFrame) -> None:
+        self._pending_trades = []
+        self._trade_data = value
+        self.shard_state = None
+        self.column_store = None
+        self.invalidate_results()
+
+    def invalidate_results(self) -> None:
+        """
+        Drop memoized portfolio results; call after modifying trade_data in place
+        """
+        self._results = None
+        self._incremental = None
+        self._time_index = None
+        self._daily_pnl = None
+        self._bootstrap = {}
+
     def setup_project_structure(self):
         """
-        Create necessary project directories
+        Create necessary project directories (once per process)
         """
         try:
             project_root = Path(__file__).parent.parent
+            if project_root in _PREPARED_ROOTS:
+                return project_root
             
             directories = [
                 project_root / 'logs',
@@ -35,7 +101,7 @@ class TradingAnalyzer:
             
             for directory in directories:
                 directory.mkdir(parents=True, exist_ok=True)
-                print(f"Created directory: {directory}")
+            _PREPARED_ROOTS.add(project_root)
                 
             return project_root
 
@@ -49,13 +115,15 @@ class TradingAnalyzer:
         """
         try:
             log_file = self.project_root / 'logs' / 'trading_analysis.log'
+            configured = bool(logging.getLogger().handlers)
             logging.basicConfig(
                 filename=log_file, 
-                level=logging.DEBUG,
+                level=logging.INFO,
                 format='%(asctime)s - %(levelname)s - %(message)s'
             )
             logger = logging.getLogger(__name__)
-            print(f"Logging setup complete. Log file: {log_file}")
+            if not configured:
+                print(f"Logging setup complete. Log file: {log_file}")
             return logger  # ✅ FIXED: Logging correctly returned
 
         except Exception as e:
@@ -80,100 +148,255 @@ class TradingAnalyzer:
 
     
 
-    def load_data(self, data_path: Path) -> None:
+    @instrumented()
+    def load_data(self, data_path: Path, workers: int = 1, use_cache: bool = True,
+                  out_of_core: bool = False, memory_budget: int = None,
+                  port_ids: List = None) -> None:
         """
         Load and preprocess trade history data by flattening nested Trade_History.
+        Set workers > 1 (or 0 for all cores) to parse rows in a process pool.
+        The flattened table is cached under output/cache unless use_cache is False.
+        With out_of_core the trades are streamed into memory-mapped column files
+        under output/column_store instead (see load_column_store); with port_ids
+        only those portfolios are parsed (see load_portfolios).
         """
+        if port_ids is not None:
+            self.load_portfolios(data_path, port_ids)
+            return
+        if out_of_core:
+            self.load_column_store(data_path, workers, use_cache, memory_budget)
+            return
         try:
             self.logger.info(f"Loading data from {data_path}")
 
-            # Read CSV file
-            self.trade_data = pd.read_csv(data_path)
+            self.cache = None
+            if use_cache:
+                self.cache = TradeCache(data_path, self.project_root / 'output' / 'cache', self.logger)
+                cached = self.cache.load()
+                if cached is not None:
+                    self.trade_data = cached
+                    self.logger.info(f"Flattened data shape: {self.trade_data.shape}")
+                    return
 
-            # Log available columns
-            self.logger.info(f"Columns found in CSV: {list(self.trade_data.columns)}")
+            # Stream rows through the columnar Trade_History parser instead of
+            # literal-evaluating every row into a list of dicts
+            parser = TradeHistoryParser(self.logger)
+            self.trade_data = self._prepare_trades(parser, parser.parse_file(data_path, workers=workers))
 
-            # Remove leading/trailing spaces in column names
-            self.trade_data.columns = self.trade_data.columns.str.strip()
+            if self.cache is not None:
+                self.cache.store(self.trade_data)
 
-            # Rename 'Port_IDs' to 'Port_ID' for consistency
-            if 'Port_IDs' in self.trade_data.columns:
-                self.trade_data.rename(columns={"Port_IDs": "Port_ID"}, inplace=True)
-            else:
-                raise KeyError("Missing expected column 'Port_IDs' in CSV.")
-
-            # Check if 'Trade_History' column exists
-            if 'Trade_History' not in self.trade_data.columns:
-                raise KeyError("Column 'Trade_History' not found in dataset.")
-
-            # Flatten Trade_History (Convert JSON-like strings into dictionaries)
-            flattened_data = []
-
-            for _, row in self.trade_data.iterrows():
-                try:
-                    trade_list = ast.literal_eval(row["Trade_History"])  # Convert string to list of dicts
-                    for trade in trade_list:
-                        trade["Port_ID"] = row["Port_ID"]  # Now using correct 'Port_ID'
-                        flattened_data.append(trade)
-                except Exception as e:
-                    self.logger.warning(f"Skipping malformed trade history: {e}")
-
-            # Convert to DataFrame
-            self.trade_data = pd.DataFrame(flattened_data)
-
-            # Rename 'time' to 'timestamp' for consistency
-            if 'time' in self.trade_data.columns:
-                self.trade_data.rename(columns={"time": "timestamp"}, inplace=True)
-
-            # Log new structure
-            self.logger.info(f"Flattened data shape: {self.trade_data.shape}")
-            self.logger.info(f"Columns after flattening: {list(self.trade_data.columns)}")
-
-            # Convert timestamp to datetime format
-            if 'timestamp' in self.trade_data.columns:
-                self.trade_data['timestamp'] = pd.to_datetime(self.trade_data['timestamp'], unit='ms', errors='coerce')
-            else:
-                raise KeyError("Missing column 'timestamp' after processing.")
+            self.logger.info("Trade data successfully loaded and flattened.")
+
+        except Exception as e:
+            self.logger.error(f"Error loading data: {str(e)}")
+            raise
+
+    def _prepare_trades(self, parser: TradeHistoryParser, trade_data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Rename, convert and validate a freshly flattened trade table
+        """
+        if parser.malformed_rows:
+            self.logger.warning(f"Skipped {parser.malformed_rows} malformed trade history rows")
 
-            # Ensure all required columns exist before proceeding
-            required_columns = {"Port_ID", "timestamp", "side", "positionSide", "price", "quantity", "realizedProfit"}
-            missing_columns = required_columns - set(self.trade_data.columns)
+        # Rename 'time' to 'timestamp' for consistency
+        if 'time' in trade_data.columns:
+            trade_data.rename(columns={"time": "timestamp"}, inplace=True)
 
-            if missing_columns:
-                raise KeyError(f"Missing columns in data after flattening: {missing_columns}")
+        # Log new structure
+        self.logger.info(f"Flattened data shape: {trade_data.shape}")
+        self.logger.info(f"Columns after flattening: {list(trade_data.columns)}")
 
-            self.logger.info("Trade data successfully loaded and flattened.")
+        # Convert timestamp to datetime format
+        if 'timestamp' in trade_data.columns:
+            trade_data['timestamp'] = pd.to_datetime(trade_data['timestamp'], unit='ms', errors='coerce')
+        else:
+            raise KeyError("Missing column 'timestamp' after processing.")
+
+        # Ensure all required columns exist before proceeding
+        required_columns = {"Port_ID", "timestamp", "side", "positionSide", "price", "quantity", "realizedProfit"}
+        missing_columns = required_columns - set(trade_data.columns)
+
+        if missing_columns:
+            raise KeyError(f"Missing columns in data after flattening: {missing_columns}")
+        return trade_data
+
+    @instrumented()
+    def load_portfolios(self, data_path: Path, port_ids: List) -> pd.DataFrame:
+        """
+        Lazy load: parse only the rows of the given portfolios, located through the
+        byte-offset index under output/row_index (rebuilt when the CSV changes).
+        trade_data then holds just those portfolios, in file order.
+        """
+        from row_index import RowIndex
+
+        try:
+            self.logger.info(f"Loading {len(port_ids)} portfolio(s) from {data_path}")
+            # Position codes cached for the whole file do not apply to a subset
+            self.cache = None
+            index = RowIndex(data_path, self.project_root / 'output' / 'row_index', self.logger).ensure()
+            missing = [port_id for port_id in port_ids if port_id not in index]
+            if len(missing) == len(port_ids):
+                raise KeyError(f"Port_ID(s) not found in {data_path}: {missing}")
+            if missing:
+                self.logger.warning(f"Port_ID(s) not found in {data_path}: {missing}")
+
+            parser = TradeHistoryParser(self.logger)
+            for port_id, trade_history in index.read_rows(port_ids):
+                parser.feed_row(port_id, trade_history)
+            self.trade_data = self._prepare_trades(parser, parser.to_frame())
+            return self.trade_data
 
         except Exception as e:
-            self.logger.error(f"Error loading data: {str(e)}")
+            self.logger.error(f"Error loading portfolios: {str(e)}")
             raise
 
-    
+    @instrumented()
+    def fetch_trades(self, port_ids: List, fetcher: 'ExchangeFetcher') -> Dict:
+        """
+        Load trade_data from the exchange API instead of the CSV: every fetched
+        page goes straight into the columnar parser (see ExchangeFetcher).
+        Returns the fetch stats (trades/s, requests, retries, failed portfolios).
+        """
+        try:
+            self.logger.info(f"Fetching {len(port_ids)} portfolio(s) from {fetcher.base_url}")
+            self.cache = None
+            parser = fetcher.fetch(port_ids)
+            if parser.n_trades == 0:
+                raise ValueError(f"No trades fetched for {len(port_ids)} portfolio(s)")
+            self.trade_data = self._prepare_trades(parser, parser.to_frame())
+            self.profiler.count('fetch_requests', fetcher.stats['requests'])
+            self.profiler.count('fetch_retries', fetcher.stats['retries'])
+            return fetcher.stats
 
-    
+        except Exception as e:
+            self.logger.error(f"Error fetching trades: {str(e)}")
+            raise
+
+    @instrumented()
+    def load_column_store(self, data_path: Path, workers: int = 1, use_cache: bool = True,
+                          memory_budget: int = None) -> 'ColumnStore':
+        """
+        Out-of-core load: parse the CSV in batches sized from memory_budget (bytes,
+        DEFAULT_MEMORY_BUDGET of column_store when None)
+        into np.memmap column files partitioned by Port_ID. Position types and
+        metrics are then computed one partition of whole portfolios at a time, so
+        trade_data is never materialized. The store is reused while the CSV is
+        unchanged unless use_cache is False.
+        """
+        from column_store import DEFAULT_MEMORY_BUDGET, ColumnStore
+
+        if memory_budget is None:
+            memory_budget = DEFAULT_MEMORY_BUDGET
+        try:
+            self.logger.info(f"Loading data from {data_path} out of core "
+                             f"(budget {memory_budget / 2**20:.0f} MB)")
+            self.trade_data = None
+            self.cache = None
+            store = ColumnStore(data_path, self.project_root / 'output' / 'column_store', memory_budget, self.logger)
+            if use_cache and store.open():
+                self.logger.info(f"Reusing column store {store.store_dir}")
+            else:
+                store.build(workers)
+            self.column_store = store
+            self.logger.info(f"Column store holds {store.trades:,} trades for {len(store):,} portfolios")
+            return store
 
+        except Exception as e:
+            self.logger.error(f"Error loading data out of core: {str(e)}")
+            raise
+
+    @instrumented()
+    def compact_trade_data(self) -> Dict:
+        """
+        Switch trade_data to compact storage: categorical strings and Port_ID,
+        int8 position_type codes and no constant asset columns
+        """
+        try:
+            self.compact = True
+            self.trade_data, report = compact_trade_data(self.trade_data, self.logger)
+            self.dropped_columns = report['dropped_constant_columns']
+            return report
+
+        except Exception as e:
+            self.logger.error(f"Error compacting trade data: {str(e)}")
+            raise
 
-       
+    @instrumented()
+    def compact_fills(self) -> Dict:
+        """
+        Merge partial fills of the same order (Port_ID, timestamp, symbol, side,
+        positionSide, price) into single rows before calculate_position_type.
+        ROI, PnL, Sharpe ratio and profit factor are unchanged; MDD can differ in
+        the last bits because daily PnL is summed from order rows. Metrics that
+        count fills (Win_Rate, Total_Positions, Avg_Profit_Per_Trade) count orders.
+        Returns a report with the compression ratio.
+        """
+        from fill_compaction import compact_fills
 
+        try:
+            trade_data, report = compact_fills(self.trade_data, self.logger)
+            self.trade_data = trade_data
+            # The cached columns describe the unmerged fills
+            self.cache = None
+            self.profiler.count('merged_fills', report['fills'] - report['orders'])
+            return report
+
+        except Exception as e:
+            self.logger.error(f"Error compacting fills: {str(e)}")
+            raise
+
+    def position_codes_for(self, trades: pd.DataFrame) -> np.ndarray:
+        """
+        ट्रेड्ससाठी पोझिशन प्रकाराचे int8 कोड काढा (long_open, long_close, short_open, short_close)
+        """
+        # ट्रेड्सना पोझिशन प्रकारांमध्ये वर्गीकृत करण्यासाठी अटी सेट करा
+        conditions = [
+            (trades['side'] == 'BUY') & (trades['positionSide'] == 'LONG'),  # खरेदी आणि लाँग पोझिशन
+            (trades['side'] == 'SELL') & (trades['positionSide'] == 'LONG'),  # विक्री आणि लाँग पोझिशन
+            (trades['side'] == 'SELL') & (trades['positionSide'] == 'SHORT'),  # विक्री आणि शॉर्ट पोझिशन
+            (trades['side'] == 'BUY') & (trades['positionSide'] == 'SHORT')  # खरेदी आणि शॉर्ट पोझिशन
+        ]
+        # प्रत्येक अटीसाठी पोझिशन प्रकाराचा int8 कोड निवडा
+        choices = [POSITION_CODES[name] for name in ['long_open', 'long_close', 'short_open', 'short_close']]
+        # अटींनुसार पोझिशन प्रकार सेट करा, जर कोणतीही अट जुळली नाही तर 'unknown' सेट करा
+        return np.select(conditions, choices, default=POSITION_CODES['unknown']).astype(np.int8)
+
+    def _position_column(self, codes: np.ndarray) -> np.ndarray:
+        return codes if self.compact else np.array(POSITION_TYPES, dtype=object)[codes]
+
+    @instrumented()
     def calculate_position_type(self) -> None:
         """
         ट्रेड्सना पोझिशन प्रकारांमध्ये वर्गीकृत करा (long_open, long_close, short_open, short_close)
         """
         try:
-            # ट्रेड्सना पोझिशन प्रकारांमध्ये वर्गीकृत करण्यासाठी अटी सेट करा
-            conditions = [
-                (self.trade_data['side'] == 'BUY') & (self.trade_data['positionSide'] == 'LONG'),  # खरेदी आणि लाँग पोझिशन
-                (self.trade_data['side'] == 'SELL') & (self.trade_data['positionSide'] == 'LONG'),  # विक्री आणि लाँग पोझिशन
-                (self.trade_data['side'] == 'SELL') & (self.trade_data['positionSide'] == 'SHORT'),  # विक्री आणि शॉर्ट पोझिशन
-                (self.trade_data['side'] == 'BUY') & (self.trade_data['positionSide'] == 'SHORT')  # खरेदी आणि शॉर्ट पोझिशन
-            ]
-            # प्रत्येक अटीसाठी पोझिशन प्रकार निवडा
-            choices = ['long_open', 'long_close', 'short_open', 'short_close']
-            # अटींनुसार पोझिशन प्रकार सेट करा, जर कोणतीही अट जुळली नाही तर 'unknown' सेट करा
-            self.trade_data['position_type'] = np.select(conditions, choices, default='unknown')
+            # आउट-ऑफ-कोअर मोडमध्ये प्रत्येक पार्टिशनसाठी कोड थेट memmap फाईलमध्ये लिहा
+            if self.column_store is not None:
+                self.invalidate_results()
+                unknown_positions = self.column_store.write_position_codes(self.position_codes_for)
+                if unknown_positions > 0:
+                    self.logger.warning(f"Found {unknown_positions} trades with unknown position type")
+                self.logger.info("Position types calculated successfully")
+                return
+
+            # कॅशमध्ये आधीच गणना केलेले पोझिशन कोड असल्यास तेच वापरा
+            codes = self.cache.load_column('position_code') if self.cache is not None else None
+            if codes is None or len(codes) != len(self.trade_data):
+                codes = self.position_codes_for(self.trade_data)
+
+                # पुढील रनसाठी पोझिशन कोड कॅशमध्ये साठवा
+                if self.cache is not None:
+                    self.cache.store_column('position_code', codes)
+
+            # कॉम्पॅक्ट मोडमध्ये int8 कोड ठेवा, अन्यथा नावे
+            self.trade_data['position_type'] = self._position_column(codes)
+
+            # पोझिशन प्रकार बदलल्यामुळे आधीचे निकाल अवैध करा
+            self.invalidate_results()
             
             # पोझिशन प्रकारांची पडताळणी करा
-            unknown_positions = len(self.trade_data[self.trade_data['position_type'] == 'unknown'])
+            unknown_positions = int(position_mask(self.trade_data['position_type'], ['unknown']).sum())
             if unknown_positions > 0:
                 self.logger.warning(f"Found {unknown_positions} trades with unknown position type")  # अज्ञात पोझिशन प्रकार असलेल्या ट्रेड्सची संख्या लॉग करा
                 
@@ -191,15 +414,15 @@ class TradingAnalyzer:
             port_data = self.trade_data[self.trade_data['Port_ID'] == port_id].copy()
             
             if len(port_data) == 0:
-                self.logger.warning(f"No data found for portfolio {port_id}")
+                self.profiler.count('portfolios_without_data')
                 return None
             
             # Calculate basic metrics
-            total_positions = len(port_data[port_data['position_type'].isin(['long_close', 'short_close'])])
+            total_positions = len(port_data[position_mask(port_data['position_type'], ['long_close', 'short_close'])])
             win_positions = len(port_data[port_data['realizedProfit'] > 0])
             
             # Calculate ROI
-            total_investment = port_data[port_data['position_type'].isin(['long_open', 'short_open'])]['quantity'].sum()
+            total_investment = port_data[position_mask(port_data['position_type'], ['long_open', 'short_open'])]['quantity'].sum()
             total_profit = port_data['realizedProfit'].sum()
             roi = (total_profit / total_investment * 100) if total_investment != 0 else 0
             
@@ -246,87 +469,431 @@ class TradingAnalyzer:
                 'Profit_Factor': round(profit_factor, 2)
             }
             
-            self.logger.info(f"Calculated metrics for portfolio {port_id}")
+            self.profiler.count('portfolio_metrics_calculated')
             return metrics
             
         except Exception as e:
             self.logger.error(f"Error calculating metrics for portfolio {port_id}: {str(e)}")
             raise
 
+    def time_index(self) -> TradeTimeIndex:
+        """
+        Sorted (Port_ID, timestamp) index for date-range queries, built on first use
+        """
+        if self._time_index is None:
+            self._time_index = TradeTimeIndex(self.trade_data)
+            self.logger.info(f"Built time index over {len(self._time_index.ts):,} trades")
+        return self._time_index
+
+    def calculate_metrics_between(self, port_id: str, start=None, end=None) -> Dict:
+        """
+        Calculate trading metrics for a portfolio over trades with start <= timestamp <= end
+        """
+        try:
+            results = self.time_index().query([port_id], start, end)
+            if len(results) == 0:
+                self.logger.warning(f"No data found for portfolio {port_id} between {start} and {end}")
+                return None
+            return results.iloc[0].to_dict()
+
+        except Exception as e:
+            self.logger.error(f"Error calculating metrics for portfolio {port_id} between {start} and {end}: {str(e)}")
+            raise
+
+    @instrumented()
+    def analyze_portfolios_between(self, start=None, end=None, port_ids: List = None) -> pd.DataFrame:
+        """
+        Metrics for all (or the given) portfolios over a date range
+        """
+        try:
+            results_df = self.time_index().query(port_ids, start, end)
+            self.logger.info(f"Analyzed {len(results_df)} portfolios between {start} and {end}")
+            return results_df
+
+        except Exception as e:
+            self.logger.error(f"Error analyzing portfolios between {start} and {end}: {str(e)}")
+            raise
+
+    @instrumented()
+    def append_trades(self, new_trades: pd.DataFrame) -> pd.DataFrame:
+        """
+        Append a batch of new fills and refresh only the portfolios it touches.
+        Accepts flattened trades with either 'time' (ms) or 'timestamp'; returns
+        the updated metrics of the affected portfolios. Raises ValueError after
+        analyze_shards or an out-of-core load, which keep no trade table.
+
+        The memoized results are patched for those portfolios only and equal a
+        full finalize of the running aggregates. Against a full recompute of the
+        appended table every column but MDD matches after rounding; MDD (often far
+        beyond 1e2 in magnitude) differs by up to about 1e-15 relative for fills
+        in time order and about 4e-14 after late fills for earlier days, which
+        replay the portfolio's drawdown in another summation order.
+        """
+        try:
+            if self.trade_data is None:
+                if self.shard_state is not None:
+                    reason = "analyze_shards keeps only per-portfolio aggregates"
+                elif self.column_store is not None:
+                    reason = "the out-of-core load keeps trades in memory-mapped column files"
+                else:
+                    reason = "no trades are loaded"
+                raise ValueError(f"append_trades needs the trade table in memory: {reason}")
+            batch = new_trades.copy()
+            if 'timestamp' not in batch.columns and 'time' in batch.columns:
+                batch.rename(columns={"time": "timestamp"}, inplace=True)
+            if not pd.api.types.is_datetime64_any_dtype(batch['timestamp']):
+                batch['timestamp'] = pd.to_datetime(batch['timestamp'], unit='ms', errors='coerce')
+            batch['position_type'] = self._position_column(self.position_codes_for(batch))
+            batch.drop(columns=[c for c in self.dropped_columns if c in batch.columns], inplace=True)
+
+            # Seed the running aggregates from the current table once
+            if self._incremental is None:
+                self._incremental = IncrementalMetrics()
+                self._incremental.update(self.trade_data)
+
+            known = len(self._incremental)
+            touched = self._incremental.update(batch)
+            self._pending_trades.append(batch)
+            self._time_index = None
+            self._daily_pnl = None
+            self._bootstrap = {}
+            # The cached columns describe the source file, not the appended table
+            self.cache = None
+
+            refreshed = self._incremental.results(touched)
+            if self._results is None or len(self._results) != known:
+                self._results = self._incremental.results()
+            else:
+                self._results = self._patch_results(touched, refreshed, known)
+            self.logger.info(f"Appended {len(batch):,} trades touching {len(touched)} portfolios")
+            return refreshed
+
+        except Exception as e:
+            self.logger.error(f"Error appending trades: {str(e)}")
+            raise
+
+    def _patch_results(self, touched: np.ndarray, refreshed: pd.DataFrame, known: int) -> pd.DataFrame:
+        """
+        Memoized results (rows in portfolio code order) with the touched rows
+        replaced in place and portfolios first seen in the batch appended
+        """
+        results = self._results
+        existing = touched < known
+        rows = touched[existing]
+        for column in refreshed.columns.drop('Port_ID'):
+            values = refreshed[column].to_numpy()[existing]
+            # A column is int64 while every row takes calculate_metrics' int 0
+            # fallback; refreshed rows can only leave that fallback, so widen
+            dtype = np.result_type(results[column].dtype, values.dtype)
+            if results[column].dtype != dtype:
+                results[column] = results[column].astype(dtype)
+            results.iloc[rows, results.columns.get_loc(column)] = values
+        if not existing.all():
+            results = pd.concat([results, refreshed[~existing]], ignore_index=True)
+        return results
+
+    @instrumented()
     def analyze_all_portfolios(self) -> pd.DataFrame:
         """
-        Analyze all portfolios and return results as DataFrame
+        Analyze all portfolios and return results as DataFrame.
+        Results are memoized until trade_data changes.
         """
         try:
+            if self._results is not None:
+                self.results_cache_hits += 1
+                self.profiler.count('results_cache_hits')
+                self.logger.info(f"Portfolio results cache hit "
+                                 f"(hits={self.results_cache_hits}, misses={self.results_cache_misses})")
+                return self._results.copy()
+
+            self.results_cache_misses += 1
+            self.profiler.count('results_cache_misses')
             self.logger.info("Starting analysis of all portfolios")
-            results = []
-            
-            for port_id in self.trade_data['Port_ID'].unique():
-                metrics = self.calculate_metrics(port_id)
-                if metrics:
-                    results.append(metrics)
-                    
-            results_df = pd.DataFrame(results)
-            self.logger.info(f"Completed analysis of {len(results)} portfolios")
-            return results_df
+
+            # Sort once and reduce per portfolio instead of filtering the full
+            # frame for every Port_ID
+            if self.column_store is not None:
+                # Out of core: reduced partition by partition from the memmapped columns
+                results_df = self.column_store.portfolio_metrics()
+            else:
+                results_df = compute_portfolio_metrics(self.trade_data)
+            self._results = results_df
+            self.logger.info(f"Completed analysis of {len(results_df)} portfolios "
+                             f"(hits={self.results_cache_hits}, misses={self.results_cache_misses})")
+            return results_df.copy()
             
         except Exception as e:
             self.logger.error(f"Error analyzing portfolios: {str(e)}")
             raise
 
-    def get_top_portfolios(self, n: int = 20) -> pd.DataFrame:
+    @instrumented()
+    def analyze_shards(self, shard_paths: List, workers: int = 1, use_cache: bool = True) -> pd.DataFrame:
+        """
+        Analyze trade history split over several CSV shards, map-reduce style: each
+        shard is parsed and reduced to per-portfolio partial aggregates (in parallel
+        with workers > 1, 0 = all cores), and the partials are merged into the
+        metrics of the concatenated history. The results are memoized like
+        analyze_all_portfolios; trade_data itself is not loaded.
+        """
+        from sharding import reduce_shards
+
+        try:
+            self.logger.info(f"Analyzing {len(shard_paths)} trade history shard(s)")
+            self.trade_data = None
+            self.shard_state = reduce_shards(shard_paths, workers, use_cache, self.logger)
+            self._results = self.shard_state.metrics()
+            self.results_cache_misses += 1
+            self.profiler.count('results_cache_misses')
+            self.profiler.count('shards', len(shard_paths))
+            return self._results.copy()
+
+        except Exception as e:
+            self.logger.error(f"Error analyzing shards: {str(e)}")
+            raise
+
+    @instrumented()
+    def get_top_portfolios(self, n: int = 20, lower_bound: bool = False, max_correlation: float = None,
+                           **bootstrap_options) -> pd.DataFrame:
         """
-        Get top N portfolios based on weighted scoring
+        Get top N portfolios based on weighted scoring.
+        With lower_bound=True, Sharpe ratio and win rate are scored on their bootstrap
+        lower confidence bounds and the interval columns are appended.
+        With max_correlation, portfolios are taken in score order but skipped when
+        their daily PnL correlation with one already selected exceeds it.
         """
         try:
             results_df = self.analyze_all_portfolios()
-            
-            # Define weights for each metric
-            weights = {
-                'ROI': 0.3,
-                'Sharpe_Ratio': 0.25,
-                'Win_Rate': 0.2,
-                'MDD': 0.15,  # Note: Higher MDD is worse
-                'Profit_Factor': 0.1
-            }
-            
-            # Normalize metrics
-            for column in weights.keys():
-                if column != 'MDD':
-                    results_df[f'{column}_normalized'] = (results_df[column] - results_df[column].min()) / \
-                                                       (results_df[column].max() - results_df[column].min())
-                else:
-                    # Inverse normalization for MDD (lower is better)
-                    results_df[f'{column}_normalized'] = 1 - (results_df[column] - results_df[column].min()) / \
-                                                       (results_df[column].max() - results_df[column].min())
-            
-            # Calculate weighted score
-            results_df['total_score'] = sum(
-                results_df[f'{metric}_normalized'] * weight 
-                for metric, weight in weights.items()
-            )
-            
-            # Sort and get top N
-            top_portfolios = results_df.nlargest(n, 'total_score')
-            
-            # Select columns for output
-            output_columns = ['Port_ID', 'ROI', 'PnL', 'Sharpe_Ratio', 'MDD', 
-                            'Win_Rate', 'Win_Positions', 'Total_Positions', 
-                            'Avg_Profit_Per_Trade', 'Profit_Factor', 'total_score']
-            
-            self.logger.info(f"Generated top {n} portfolios ranking")
-            return top_portfolios[output_columns]
+
+            if lower_bound:
+                intervals = self.bootstrap_confidence_intervals(**bootstrap_options)
+                intervals = intervals.set_index('Port_ID').loc[results_df['Port_ID']].reset_index(drop=True)
+                scored = results_df.copy()
+                scored['Sharpe_Ratio'] = intervals['Sharpe_Ratio_Low'].to_numpy()
+                scored['Win_Rate'] = intervals['Win_Rate_Low'].to_numpy()
+                top_portfolios = self._select(scored, n, max_correlation)
+                # Report the point estimates next to their intervals
+                top_portfolios[['Sharpe_Ratio', 'Win_Rate']] = results_df.loc[top_portfolios.index, ['Sharpe_Ratio', 'Win_Rate']]
+                top_portfolios = top_portfolios.join(intervals)
+            else:
+                top_portfolios = self._select(results_df, n, max_correlation)
+
+            self.logger.info(f"Generated top {n} portfolios ranking"
+                             f"{' on lower confidence bounds' if lower_bound else ''}"
+                             f"{f' with correlation <= {max_correlation}' if max_correlation is not None else ''}")
+            return top_portfolios
             
         except Exception as e:
             self.logger.error(f"Error generating top portfolios: {str(e)}")
             raise
-    def save_results(self, output_path: Path) -> None:
+
+    def _select(self, scored: pd.DataFrame, n: int, max_correlation: float = None) -> pd.DataFrame:
+        """
+        rank_portfolios, or the greedy low-correlation top N over the full ranking
+        """
+        if max_correlation is None:
+            return rank_portfolios(scored, n)
+        from correlation import select_uncorrelated
+
+        ranked = rank_portfolios(scored, len(scored))
+        port_ids, _, matrix = self.daily_pnl_matrix()
+        # Portfolios without daily PnL get an all-NaN row, which never blocks
+        rows = pd.Index(port_ids).get_indexer(ranked['Port_ID'])
+        matrix = np.vstack([matrix, np.full((1, matrix.shape[1]), np.nan)])
+        kept = select_uncorrelated(matrix[rows], n, max_correlation)
+        self.profiler.count('correlated_portfolios_skipped', int(kept[-1]) + 1 - len(kept) if len(kept) else 0)
+        return ranked.iloc[kept]
+
+    def daily_pnl_matrix(self):
+        """
+        (port_ids, days, portfolio x day PnL matrix) of trade_data, built on first use
+        """
+        if self._daily_pnl is None:
+            self._daily_pnl = daily_pnl_matrix(self.trade_data)
+            self.logger.info(f"Built daily PnL matrix of {self._daily_pnl[2].shape[0]:,} portfolios "
+                             f"x {self._daily_pnl[2].shape[1]:,} days")
+        return self._daily_pnl
+
+    @instrumented()
+    def calculate_correlations(self, k: int = None, threshold: float = None, min_overlap: int = None):
+        """
+        Pairwise daily PnL correlations over the days both portfolios traded,
+        computed in row blocks so the full portfolio x portfolio matrix never
+        exists. Returns (peers, clusters): the top-k most correlated peers per
+        portfolio and the clusters of portfolios linked by correlation >= threshold.
+        Parameters left as None take the defaults of the correlation module.
+        """
+        from correlation import DEFAULT_CLUSTER_THRESHOLD, DEFAULT_MIN_OVERLAP, DEFAULT_TOP_K, correlation_peers
+
+        k = DEFAULT_TOP_K if k is None else k
+        threshold = DEFAULT_CLUSTER_THRESHOLD if threshold is None else threshold
+        min_overlap = DEFAULT_MIN_OVERLAP if min_overlap is None else min_overlap
+        try:
+            port_ids, _, matrix = self.daily_pnl_matrix()
+            peers, clusters = correlation_peers(port_ids, matrix, k, threshold, min_overlap)
+            self.logger.info(f"Calculated top {k} correlated peers of {len(port_ids):,} portfolios, "
+                             f"{clusters['cluster'].nunique():,} clusters at correlation >= {threshold}")
+            return peers, clusters
+
+        except Exception as e:
+            self.logger.error(f"Error calculating correlations: {str(e)}")
+            raise
+
+    @instrumented()
+    def save_correlations(self, output_dir: Path, k: int = None, threshold: float = None) -> None:
+        """
+        Save correlation_peers.csv and correlation_clusters.csv
+        """
+        try:
+            output_dir = Path(output_dir)
+            output_dir.mkdir(parents=True, exist_ok=True)
+            peers, clusters = self.calculate_correlations(k, threshold)
+            peers.to_csv(output_dir / 'correlation_peers.csv', index=False)
+            clusters.to_csv(output_dir / 'correlation_clusters.csv', index=False)
+            self.logger.info(f"Correlations saved to {output_dir}")
+
+        except Exception as e:
+            self.logger.error(f"Error saving correlations: {str(e)}")
+            raise
+
+    @instrumented()
+    def bootstrap_confidence_intervals(self, n_resamples: int = 2000, confidence: float = 0.95,
+                                       seed: int = 0, workers: int = 1) -> pd.DataFrame:
+        """
+        Bootstrap confidence intervals for Sharpe ratio and win rate of every portfolio.
+        Memoized per (n_resamples, confidence, seed) until trade_data changes.
+        """
+        from bootstrap import bootstrap_confidence_intervals
+
+        try:
+            key = (n_resamples, confidence, seed)
+            if key not in self._bootstrap:
+                start = datetime.datetime.now()
+                self._bootstrap[key] = bootstrap_confidence_intervals(
+                    self.trade_data, n_resamples, confidence, seed, workers)
+                elapsed = (datetime.datetime.now() - start).total_seconds()
+                self.logger.info(f"Bootstrapped {len(self._bootstrap[key])} portfolios with "
+                                 f"{n_resamples} resamples in {elapsed:.2f}s")
+            return self._bootstrap[key].copy()
+
+        except Exception as e:
+            self.logger.error(f"Error bootstrapping confidence intervals: {str(e)}")
+            raise
+
+    @instrumented()
+    def rank_scenarios(self, scenarios, n: int = 20) -> pd.DataFrame:
         """
-        Save analysis results to CSV
+        Rank portfolios under many weight scenarios at once (list of weight dicts
+        or a scenarios x metrics array); returns the top N per scenario
         """
         try:
-            # Get top portfolios
-            top_portfolios = self.get_top_portfolios()
+            results_df = self.analyze_all_portfolios()
+            ranking = rank_scenarios(results_df, scenarios, n)
+            self.logger.info(f"Ranked {len(results_df)} portfolios under {len(scenarios)} scenarios")
+            return ranking
+
+        except Exception as e:
+            self.logger.error(f"Error ranking weight scenarios: {str(e)}")
+            raise
+
+    @instrumented()
+    def calculate_rolling_metrics(self, windows=DEFAULT_WINDOWS) -> pd.DataFrame:
+        """
+        Rolling Sharpe and MDD for every portfolio as a long table
+        (Port_ID, date, window, Sharpe_Ratio, MDD)
+        """
+        try:
+            rolling_df = rolling_metrics(self.trade_data, windows)
+            self.logger.info(f"Calculated {len(rolling_df):,} rolling metric rows for windows {list(windows)}")
+            return rolling_df
+
+        except Exception as e:
+            self.logger.error(f"Error calculating rolling metrics: {str(e)}")
+            raise
+
+    @instrumented()
+    def save_rolling_metrics(self, output_path: Path, windows=DEFAULT_WINDOWS) -> None:
+        """
+        Save rolling metrics to CSV for eda.py
+        """
+        try:
+            output_path = Path(output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            self.calculate_rolling_metrics(windows).to_csv(output_path, index=False)
+            self.logger.info(f"Rolling metrics saved to {output_path}")
+
+        except Exception as e:
+            self.logger.error(f"Error saving rolling metrics: {str(e)}")
+            raise
+
+    @instrumented()
+    def reconstruct_round_trips(self, by_position: bool = False) -> pd.DataFrame:
+        """
+        FIFO round trips per (Port_ID, symbol, positionSide): one row per matched
+        open/close lot with entry/exit time, holding period, qty and realized PnL,
+        or one row per flat-to-flat position with by_position
+        """
+        from round_trips import positions, round_trips
+
+        try:
+            trips = round_trips(self.trade_data)
+            self.logger.info(f"Reconstructed {len(trips):,} round-trip lots from {len(self.trade_data):,} fills")
+            if by_position:
+                trips = positions(trips)
+                self.logger.info(f"Collapsed round trips into {len(trips):,} positions")
+            return trips
+
+        except Exception as e:
+            self.logger.error(f"Error reconstructing round trips: {str(e)}")
+            raise
+
+    @instrumented()
+    def save_round_trips(self, output_dir: Path) -> None:
+        """
+        Save round_trips.csv (lots) and positions.csv (flat-to-flat positions)
+        """
+        from round_trips import positions
+
+        try:
+            output_dir = Path(output_dir)
+            output_dir.mkdir(parents=True, exist_ok=True)
+            trips = self.reconstruct_round_trips()
+            trips.to_csv(output_dir / 'round_trips.csv', index=False)
+            positions(trips).to_csv(output_dir / 'positions.csv', index=False)
+            self.logger.info(f"Round trips saved to {output_dir}")
+
+        except Exception as e:
+            self.logger.error(f"Error saving round trips: {str(e)}")
+            raise
+
+    @instrumented()
+    def write_run_profile(self, output_path: Path) -> Path:
+        """
+        Write the per-stage timing/memory profile and counters as JSON
+        """
+        try:
+            path = self.profiler.write(output_path, {'trade_rows': len(self.trade_data) if self.trade_data is not None else 0})
+            self.logger.info(f"Run profile saved to {path}")
+            return path
+
+        except Exception as e:
+            self.logger.error(f"Error writing run profile: {str(e)}")
+            raise
+
+    @instrumented()
+    def save_results(self, output_path: Path, lower_bound: bool = False, max_correlation: float = None,
+                     ranked_path: Path = None, **bootstrap_options) -> None:
+        """
+        Save analysis results to CSV: the top 20 to output_path and, if ranked_path
+        is given, the full ranking (every scored portfolio) to ranked_path
+        """
+        try:
+            output_path = Path(output_path)
+
+            # Get top portfolios, ranked from one scoring of all of them
+            n = len(self.analyze_all_portfolios()) if ranked_path is not None else 20
+            ranking = self.get_top_portfolios(n, lower_bound=lower_bound, max_correlation=max_correlation,
+                                              **bootstrap_options)
+            top_portfolios = ranking.head(20)
             
             # Create output directory if it doesn't exist
             output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -334,21 +901,61 @@ class TradingAnalyzer:
             # Save results
             top_portfolios.to_csv(output_path, index=False)
             self.logger.info(f"Results saved to {output_path}")
+            if ranked_path is not None:
+                ranking.to_csv(ranked_path, index=False)
+                self.logger.info(f"Full ranking of {len(ranking):,} portfolios saved to {ranked_path}")
             
             # Generate and save summary report
             self.generate_summary_report()
+
+            self.logger.info(f"Portfolio metrics computed {self.results_cache_misses} time(s), "
+                             f"served from cache {self.results_cache_hits} time(s)")
             
         except Exception as e:
             self.logger.error(f"Error saving results: {str(e)}")
             raise
     
 
+    def summary_stats(self, results_df: pd.DataFrame = None) -> Dict:
+        """
+        Dataset overview and averages over all portfolios, as shown in the summary report
+        """
+        if results_df is None:
+            results_df = self.analyze_all_portfolios()
+        if self.trade_data is not None:
+            total_trades = len(self.trade_data)
+            first_trade, last_trade = self.trade_data['timestamp'].min(), self.trade_data['timestamp'].max()
+        else:
+            # Sharded or out-of-core run: trade_data was never loaded
+            state = self.shard_state if self.shard_state is not None else self.column_store
+            total_trades = state.trades
+            first_trade, last_trade = state.first_trade, state.last_trade
+        profitable = int((results_df['PnL'] > 0).sum())
+        return {
+            'total_trades': total_trades,
+            'first_trade': first_trade,
+            'last_trade': last_trade,
+            'portfolios': len(results_df),
+            'profitable_portfolios': profitable,
+            'profitable_pct': profitable / len(results_df) * 100,
+            'avg_roi': results_df['ROI'].mean(),
+            'avg_win_rate': results_df['Win_Rate'].mean(),
+            'avg_sharpe_ratio': results_df['Sharpe_Ratio'].mean(),
+            'avg_mdd': results_df['MDD'].mean(),
+            'best_roi': results_df['ROI'].max(),
+            'worst_roi': results_df['ROI'].min(),
+            'best_win_rate': results_df['Win_Rate'].max(),
+            'avg_profit_per_trade': results_df['Avg_Profit_Per_Trade'].mean(),
+        }
+
+    @instrumented()
     def generate_summary_report(self) -> str:
         """
         Generate a detailed summary report of the analysis
         """
         try:
             results_df = self.analyze_all_portfolios()
+            stats = self.summary_stats(results_df)
             
             report = f"""
     Trading Analysis Summary Report
@@ -357,17 +964,17 @@ class TradingAnalyzer:
 
     Dataset Overview:
     ---------------
-    Total Trades Analyzed: {len(self.trade_data):,}
-    Date Range: {self.trade_data['timestamp'].min().strftime('%Y-%m-%d')} to {self.trade_data['timestamp'].max().strftime('%Y-%m-%d')}
-    Total Portfolios: {len(results_df):,}
+    Total Trades Analyzed: {stats['total_trades']:,}
+    Date Range: {stats['first_trade'].strftime('%Y-%m-%d')} to {stats['last_trade'].strftime('%Y-%m-%d')}
+    Total Portfolios: {stats['portfolios']:,}
 
     Overall Performance:
     -----------------
-    Total Profitable Portfolios: {len(results_df[results_df['PnL'] > 0]):,} ({len(results_df[results_df['PnL'] > 0]) / len(results_df) * 100:.1f}%)
-    Average ROI: {results_df['ROI'].mean():.2f}%
-    Average Win Rate: {results_df['Win_Rate'].mean():.2f}%
-    Average Sharpe Ratio: {results_df['Sharpe_Ratio'].mean():.2f}
-    Average Maximum Drawdown: {results_df['MDD'].mean():.2f}%
+    Total Profitable Portfolios: {stats['profitable_portfolios']:,} ({stats['profitable_pct']:.1f}%)
+    Average ROI: {stats['avg_roi']:.2f}%
+    Average Win Rate: {stats['avg_win_rate']:.2f}%
+    Average Sharpe Ratio: {stats['avg_sharpe_ratio']:.2f}
+    Average Maximum Drawdown: {stats['avg_mdd']:.2f}%
 
     Top 5 Portfolios by ROI:
     ----------------------
@@ -379,10 +986,10 @@ class TradingAnalyzer:
 
     Portfolio Statistics:
     ------------------
-    Best ROI: {results_df['ROI'].max():.2f}%
-    Worst ROI: {results_df['ROI'].min():.2f}%
-    Best Win Rate: {results_df['Win_Rate'].max():.2f}%
-    Average Profit per Trade: ${results_df['Avg_Profit_Per_Trade'].mean():.2f}
+    Best ROI: {stats['best_roi']:.2f}%
+    Worst ROI: {stats['worst_roi']:.2f}%
+    Best Win Rate: {stats['best_win_rate']:.2f}%
+    Average Profit per Trade: ${stats['avg_profit_per_trade']:.2f}
     """
             
             # Save report